@@ -0,0 +1,75 @@
+"""
+Server-sent events of the steps of a workflow, so clients can follow a running
+step without polling its status files.
+
+Job callbacks publish events from the job executor's threads, and each subscriber,
+a streaming response, receives them on its event loop.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+
+_logger = logging.getLogger("api")
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get("CLINVAR_INGEST_SSE_KEEPALIVE_INTERVAL", 15))
+# Events buffered for a subscriber that is not reading them, after which they are dropped
+SSE_MAX_BUFFERED = 1000
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Formats a server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StepEventBroker:
+    """
+    Passes the events of each workflow execution to the subscribers of that
+    execution. Events are (event, data) tuples.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, workflow_execution_id: str) -> asyncio.Queue:
+        """
+        Returns a queue receiving the events of `workflow_execution_id` published
+        from now on. Must be called on the event loop reading the queue.
+        """
+        queue = asyncio.Queue(maxsize=SSE_MAX_BUFFERED)
+        with self.lock:
+            self.subscribers.setdefault(workflow_execution_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, workflow_execution_id: str, queue: asyncio.Queue):
+        with self.lock:
+            subscribers = self.subscribers.get(workflow_execution_id, [])
+            subscribers[:] = [(loop, q) for loop, q in subscribers if q is not queue]
+            if not subscribers:
+                self.subscribers.pop(workflow_execution_id, None)
+
+    def publish(self, workflow_execution_id: str, event: str, data: dict):
+        """
+        Sends an event to the subscribers of `workflow_execution_id`. Can be
+        called from any thread.
+        """
+        with self.lock:
+            subscribers = list(self.subscribers.get(workflow_execution_id, []))
+        for loop, queue in subscribers:
+            # The loop of a subscriber that is going away may have closed
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(self._put, queue, (event, data))
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, item: tuple[str, dict]):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            _logger.warning(f"Dropping {item[0]} event for a subscriber that is not reading them")
@@ -0,0 +1,408 @@
+"""
+Runs the long steps of a workflow, like copies and parses, as jobs outside of the
+API server's event loop.
+
+Steps started from BackgroundTasks run in the server process for hours, holding the
+GIL and starving the event loop, so the server stops answering status requests
+(see misc/bin/async-request-handling.py). Each job here runs in its own spawned
+process, and the server only keeps a registry of the jobs, their progress and state.
+
+At most `max_jobs` jobs run at once, and the CPUs they ask for add up to at most
+`max_cpus`, so concurrent parses do not oversubscribe the CPUs. Jobs wait in the
+order they were submitted for capacity, and can be cancelled while waiting or
+running. When a job ends its `on_done` callback is run in the server, e.g. to
+write the status of the step.
+
+    executor = JobExecutor()
+    job = executor.submit(parse_step, ..., step=StepName.PARSE, cpus=4, on_done=write_status)
+    executor.cancel(job.job_id)
+"""
+
+import contextlib
+import datetime
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Any
+
+from clinvar_ingest.api import metrics
+
+_logger = logging.getLogger("api")
+
+# Jobs run at once, and the CPUs the running jobs can ask for in total
+MAX_JOBS = int(os.environ.get("CLINVAR_INGEST_MAX_JOBS", 2))
+MAX_JOB_CPUS = int(os.environ.get("CLINVAR_INGEST_JOB_CPUS", os.cpu_count() or 1))
+# "process" to run each job in its own process, or "thread" to run it in a thread
+# of the server, e.g. for tests that patch the step functions
+JOB_WORKER_TYPE = os.environ.get("CLINVAR_INGEST_JOB_WORKER_TYPE", "process")
+# Finished jobs kept in the registry
+JOB_HISTORY = int(os.environ.get("CLINVAR_INGEST_JOB_HISTORY", 100))
+# Seconds between checks that a job is still running
+JOB_POLL_INTERVAL = 0.5
+
+
+class JobState(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATES = {JobState.SUCCEEDED, JobState.FAILED, JobState.CANCELLED}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.UTC).isoformat()
+
+
+@dataclass
+class Job:
+    """
+    A step run by a JobExecutor. `result` is what the step function returned if
+    it succeeded, and `error` why it did not. `progress` is the last progress the
+    step reported.
+    """
+
+    job_id: str
+    step: str
+    workflow_execution_id: str | None
+    cpus: int
+    state: JobState = JobState.QUEUED
+    submitted_at: str = field(default_factory=_now)
+    started_at: str | None = None
+    finished_at: str | None = None
+    progress: dict | None = None
+    result: Any = None
+    error: str | None = None
+    fn: Callable = field(default=None, repr=False)
+    args: tuple = field(default=(), repr=False)
+    kwargs: dict = field(default_factory=dict, repr=False)
+    on_progress: Callable[["Job", dict], None] | None = field(default=None, repr=False)
+    on_done: Callable[["Job"], None] | None = field(default=None, repr=False)
+    runner: multiprocessing.process.BaseProcess | threading.Thread | None = field(default=None, repr=False)
+    cancel_requested: bool = field(default=False, repr=False)
+    start_time: float = field(default=0.0, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "step": self.step,
+            "workflow_execution_id": self.workflow_execution_id,
+            "cpus": self.cpus,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+            "error": self.error,
+        }
+
+
+class ProgressReporter:
+    """
+    Passed to a step function as `report_progress`, to send its progress to the
+    server. Can be pickled into the job's process.
+    """
+
+    def __init__(self, job_id: str, events: "queue.Queue | multiprocessing.Queue"):
+        self.job_id = job_id
+        self.events = events
+
+    def __call__(self, progress: dict):
+        self.events.put(("progress", self.job_id, progress))
+
+
+def _raise_cancelled(signum, frame):  # noqa: ARG001
+    # Unwinds the step so its finally blocks run, e.g. to stop parse workers
+    raise SystemExit(f"Cancelled by signal {signum}")
+
+
+def _run_job(fn: Callable, args: tuple, kwargs: dict, conn, events, in_process: bool):
+    """
+    Runs a step function in the job's process or thread, sending back its outcome
+    on `conn`, as ("ok", result) or ("error", message).
+    """
+    if in_process:
+        signal.signal(signal.SIGTERM, _raise_cancelled)
+        # Log records are handled by the server's handlers
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(events)]
+        root.setLevel(logging.INFO)
+    try:
+        result = fn(*args, **kwargs)
+        conn.send(("ok", result))
+    except BaseException as e:  # noqa: BLE001
+        _logger.error(f"Job {fn.__name__} failed:\n{traceback.format_exc()}")
+        conn.send(("error", str(e) or type(e).__name__))
+    finally:
+        conn.close()
+
+
+class JobExecutor:
+    """
+    Runs jobs with at most `max_jobs` at once and `max_cpus` CPUs between them,
+    in spawned processes, or threads if `worker_type` is "thread". Defaults are
+    read from the CLINVAR_INGEST_MAX_JOBS, _JOB_CPUS, _JOB_WORKER_TYPE and
+    _JOB_HISTORY environment variables.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int | None = None,
+        max_cpus: int | None = None,
+        worker_type: str | None = None,
+        history: int | None = None,
+    ):
+        max_jobs = max_jobs or MAX_JOBS
+        max_cpus = max_cpus or MAX_JOB_CPUS
+        worker_type = worker_type or JOB_WORKER_TYPE
+        history = JOB_HISTORY if history is None else history
+        if worker_type not in ("process", "thread"):
+            raise ValueError(f"Unknown job worker type: {worker_type}")
+        self.max_jobs = max_jobs
+        self.max_cpus = max_cpus
+        self.worker_type = worker_type
+        self.history = history
+        self.jobs: dict[str, Job] = {}
+        self.queued: list[Job] = []
+        self.running: dict[str, Job] = {}
+        self.lock = threading.Lock()
+        self.watchers: list[threading.Thread] = []
+        self.ctx = multiprocessing.get_context("spawn")
+        self.events = self.ctx.Queue() if worker_type == "process" else queue.Queue()
+        self.event_thread = threading.Thread(target=self._handle_events, name="job-events", daemon=True)
+        self.event_thread.start()
+
+    def submit(
+        self,
+        fn: Callable,
+        *args,
+        step: str,
+        workflow_execution_id: str | None = None,
+        cpus: int = 1,
+        on_progress: Callable[[Job, dict], None] | None = None,
+        on_done: Callable[[Job], None] | None = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queues `fn(*args, **kwargs)` to run as a job, which is started once there
+        is capacity for it. `fn` and its arguments are pickled into the job's
+        process, so `fn` must be a module level function. If `on_progress` is given,
+        `fn` is passed a `report_progress` callable, and `on_progress` is called in
+        the server with each progress it reports.
+        """
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            step=step,
+            workflow_execution_id=workflow_execution_id,
+            cpus=max(1, min(cpus, self.max_cpus)),
+            fn=fn,
+            args=args,
+            kwargs=kwargs,
+            on_progress=on_progress,
+            on_done=on_done,
+        )
+        if on_progress is not None:
+            job.kwargs["report_progress"] = ProgressReporter(job.job_id, self.events)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self.queued.append(job)
+            metrics.jobs_queued.inc()
+            self._schedule()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> list[Job]:
+        with self.lock:
+            return list(self.jobs.values())
+
+    def active_jobs(self, workflow_execution_id: str) -> list[Job]:
+        """
+        Returns the jobs of `workflow_execution_id` that are queued, running, or
+        still having their completion recorded.
+        """
+        with self.lock:
+            return [
+                job
+                for job in self.jobs.values()
+                if job.workflow_execution_id == workflow_execution_id and job.finished_at is None
+            ]
+
+    def cpus_in_use(self) -> int:
+        return sum(job.cpus for job in self.running.values())
+
+    def _schedule(self):
+        # Called with the lock held. Jobs start in order, so a large job at the
+        # head of the queue is not passed over by smaller ones.
+        while self.queued and len(self.running) < self.max_jobs:
+            job = self.queued[0]
+            if self.running and self.cpus_in_use() + job.cpus > self.max_cpus:
+                break
+            self.queued.pop(0)
+            metrics.jobs_queued.dec()
+            self._start(job)
+
+    def _start(self, job: Job):
+        recv_conn, send_conn = self.ctx.Pipe(duplex=False)
+        in_process = self.worker_type == "process"
+        run_args = (job.fn, job.args, job.kwargs, send_conn, self.events, in_process)
+        if in_process:
+            job.runner = self.ctx.Process(target=_run_job, args=run_args, name=f"job-{job.job_id}")
+        else:
+            job.runner = threading.Thread(target=_run_job, args=run_args, name=f"job-{job.job_id}", daemon=True)
+        job.state = JobState.RUNNING
+        job.started_at = _now()
+        job.start_time = time.monotonic()
+        self.running[job.job_id] = job
+        metrics.background_tasks_in_progress.inc(step=job.step)
+        job.runner.start()
+        if in_process:
+            # The job's process holds the other end, so the pipe ends when it does
+            send_conn.close()
+        _logger.info(f"Job {job.job_id} for {job.step} started with {job.cpus} CPUs")
+        watcher = threading.Thread(target=self._watch, args=(job, recv_conn), name=f"job-watcher-{job.job_id}")
+        watcher.start()
+        self.watchers = [w for w in self.watchers if w.is_alive()] + [watcher]
+
+    def _watch(self, job: Job, conn):
+        outcome = None
+        while not conn.poll(JOB_POLL_INTERVAL):
+            # Processes killed outright, or whose children still hold the pipe
+            if not job.runner.is_alive() and not conn.poll():
+                break
+        if conn.poll():
+            with contextlib.suppress(EOFError):
+                outcome = conn.recv()
+        conn.close()
+        job.runner.join()
+
+        # A job which returned its result before it could be stopped succeeded
+        if outcome is not None and outcome[0] == "ok":
+            state, error = JobState.SUCCEEDED, None
+            job.result = outcome[1]
+        elif job.cancel_requested:
+            state, error = JobState.CANCELLED, "Cancelled"
+        elif outcome is None:
+            exitcode = getattr(job.runner, "exitcode", None)
+            state, error = JobState.FAILED, f"Job ended without a result, exit code {exitcode}"
+        else:
+            state, error = JobState.FAILED, outcome[1]
+        # Finished after the progress the job reported before it ended, which
+        # is ahead of this in the queue
+        self.events.put(("finished", job.job_id, state, error))
+
+    def _finish(self, job: Job, state: JobState, error: str | None):
+        job.state = state
+        job.error = error
+        if job.start_time:
+            metrics.background_tasks_in_progress.dec(step=job.step)
+            metrics.background_task_duration.observe(time.monotonic() - job.start_time, step=job.step)
+        _logger.info(f"Job {job.job_id} for {job.step} {state}{f': {error}' if error else ''}")
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception:
+                _logger.exception(f"Completion callback of job {job.job_id} failed")
+        # Set after on_done, so a job is not seen as finished before its
+        # completion has been recorded
+        job.finished_at = _now()
+        with self.lock:
+            finished = [j for j in self.jobs.values() if j.state in FINISHED_STATES]
+            for old in finished[: max(0, len(finished) - self.history)]:
+                del self.jobs[old.job_id]
+
+    def _handle_events(self):
+        # Progress reported by jobs, jobs finishing, and log records from job processes
+        while (event := self.events.get()) is not None:
+            if isinstance(event, logging.LogRecord):
+                logging.getLogger(event.name).handle(event)
+                continue
+            kind, job_id, *rest = event
+            job = self.get(job_id)
+            if job is None:
+                continue
+            if kind == "finished":
+                with self.lock:
+                    self.running.pop(job_id, None)
+                self._finish(job, *rest)
+                with self.lock:
+                    self._schedule()
+                continue
+            job.progress = rest[0]
+            if job.on_progress is not None:
+                try:
+                    job.on_progress(job, job.progress)
+                except Exception:
+                    _logger.exception(f"Progress callback of job {job_id} failed")
+
+    def cancel(self, job_id: str) -> Job:
+        """
+        Cancels a job. Queued jobs are dropped, and running jobs are sent SIGTERM.
+        Raises KeyError if there is no such job, and ValueError if it has finished
+        or is running in a thread, which cannot be stopped.
+        """
+        with self.lock:
+            job = self.jobs[job_id]
+            if job.state in FINISHED_STATES:
+                raise ValueError(f"Job {job_id} has already {job.state}")
+            if job.state == JobState.QUEUED:
+                self.queued.remove(job)
+                metrics.jobs_queued.dec()
+                dequeued = True
+            else:
+                if not isinstance(job.runner, multiprocessing.process.BaseProcess):
+                    raise ValueError(f"Job {job_id} is running in a thread and cannot be cancelled")
+                job.cancel_requested = True
+                dequeued = False
+        if dequeued:
+            self._finish(job, JobState.CANCELLED, "Cancelled")
+        else:
+            _logger.info(f"Cancelling job {job_id}")
+            job.runner.terminate()
+        return job
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the queued and running jobs to finish. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                if not self.queued and not self.running:
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+
+    def shutdown(self, cancel: bool = True):
+        """
+        Stops the executor, cancelling its queued and running jobs unless `cancel`
+        is False, in which case they are waited for.
+        """
+        if cancel:
+            with self.lock:
+                jobs = [*self.queued, *self.running.values()]
+            for job in jobs:
+                with contextlib.suppress(KeyError, ValueError):
+                    self.cancel(job.job_id)
+        self.wait()
+        with self.lock:
+            watchers = list(self.watchers)
+        for watcher in watchers:
+            watcher.join()
+        self.events.put(None)
+        self.event_thread.join()
@@ -1,53 +1,67 @@
+import asyncio
 import datetime
+import json
 import logging
+import os
+import time
 from contextlib import asynccontextmanager
 from pathlib import PurePosixPath
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 import clinvar_ingest.config
-from clinvar_ingest.api.middleware import LogRequests
+from clinvar_ingest.api import metrics
+from clinvar_ingest.api.events import SSE_KEEPALIVE_INTERVAL, StepEventBroker, format_sse
+from clinvar_ingest.api.jobs import FINISHED_STATES, Job, JobExecutor, JobState
+from clinvar_ingest.api.middleware import LogRequests, RecordRequestMetrics
 from clinvar_ingest.api.model.requests import (
     BigqueryDatasetId,
     ClinvarFTPWatcherRequest,
-    CopyResponse,
     CreateExternalTablesRequest,
     CreateExternalTablesResponse,
     GetStepStatusResponse,
     InitializeStepRequest,
     InitializeStepResponse,
     InitializeWorkflowResponse,
+    JobResponse,
     ParseRequest,
-    ParseResponse,
     StepStartedResponse,
     TodoRequest,
 )
 from clinvar_ingest.api.status_file import (
+    STATUS_PRECEDENCE,
     StepStatus,
     get_status_file,
+    list_step_statuses,
+    lookup_step_status,
     write_status_file,
 )
+from clinvar_ingest.api.steps import copy_step, parse_step
 from clinvar_ingest.cloud.bigquery.create_tables import run_create_external_tables
-from clinvar_ingest.cloud.gcs import (
-    _get_gcs_client,
-    copy_file_to_bucket,
-    http_download_curl,
-)
-from clinvar_ingest.parse import parse_and_write_files
-from clinvar_ingest.status import StepName
+from clinvar_ingest.progress import ParseProgress
+from clinvar_ingest.status import StatusValue, StepName
 
 logger = logging.getLogger("api")
 
+# Seconds between IN_PROGRESS status files of a running parse. Progress is
+# reported more often than this to step event subscribers.
+PROGRESS_STATUS_INTERVAL = float(os.environ.get("CLINVAR_INGEST_PROGRESS_STATUS_INTERVAL", 60))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.env = clinvar_ingest.config.get_env()
+    app.jobs = JobExecutor()
+    app.step_events = StepEventBroker()
     logger.info("Server starting up")
     yield
+    app.jobs.shutdown()
 
 
 app = FastAPI(lifespan=lifespan, openapi_url="/openapi.json", docs_url="/api")
 app.add_middleware(LogRequests)
+app.add_middleware(RecordRequestMetrics)
 
 
 @app.get("/health", status_code=status.HTTP_200_OK)
@@ -55,6 +69,11 @@ async def health():
     return {"health": "ok!"}
 
 
+@app.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post(
     "/create_workflow_execution_id/{initial_id}",
     status_code=status.HTTP_201_CREATED,
@@ -120,45 +139,17 @@ async def get_step_status(
     file_prefix = f"{env.executions_output_prefix}/{workflow_execution_id}"
     logger.debug("Reading %s status from %s", step_name, file_prefix)
 
-    # Cannot get status of step that has not started. Raise 404.
+    # Lists the step's status files once and reads the latest, cached briefly
+    # for workflows polling the status. Raise 404 if the step has not started.
     try:
-        status_value = get_status_file(
+        status_value = lookup_step_status(
             bucket=env.bucket_name,
             file_prefix=file_prefix,
             step=step_name,
-            status=StepStatus.STARTED,
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e)) from e
 
-    try:
-        status_value = get_status_file(
-            bucket=env.bucket_name,
-            file_prefix=file_prefix,
-            step=step_name,
-            status=StepStatus.SUCCEEDED,
-        )
-    except ValueError as _:
-        logger.info(
-            "Step %s in execution %s started and has not succeeded",
-            step_name,
-            workflow_execution_id,
-        )
-
-    try:
-        status_value = get_status_file(
-            bucket=env.bucket_name,
-            file_prefix=file_prefix,
-            step=step_name,
-            status=StepStatus.FAILED,
-        )
-    except ValueError as _:
-        logger.info(
-            "Step %s in execution %s started and still running",
-            step_name,
-            workflow_execution_id,
-        )
-
     return GetStepStatusResponse(
         workflow_execution_id=workflow_execution_id,
         step_name=step_name,
@@ -200,7 +191,7 @@ async def fake_step(
             "Fake %s for workflow %s succeeded", step_name, workflow_execution_id
         )
 
-    background_tasks.add_task(task)
+    background_tasks.add_task(metrics.track_background_task(step_name, task))
     logger.info("Fake %s background task added", step_name)
 
     logger.info("Fake %s returning", step_name)
@@ -211,6 +202,141 @@ async def fake_step(
     )
 
 
+@app.get("/step_events/{workflow_execution_id}", status_code=status.HTTP_200_OK)
+async def step_events(request: Request, workflow_execution_id: str):
+    """
+    Streams the status and progress of the steps of a workflow as server-sent
+    events, "status" events with the fields of a step status response, and
+    "progress" events with the latest progress of a running step.
+
+    The stream starts with the current status of each step that has started,
+    from its status files, so a late subscriber still gets the final status of
+    a step that has finished. It ends once a step has finished and the workflow
+    has no running steps, so a stream opened before a step's job is submitted
+    waits for that step to finish.
+    """
+    env: clinvar_ingest.config.Env = request.app.env
+    file_prefix = f"{env.executions_output_prefix}/{workflow_execution_id}"
+    broker: StepEventBroker = request.app.step_events
+    # Subscribed before reading the status files, so no events are missed in between
+    queue = broker.subscribe(workflow_execution_id)
+
+    def current_statuses() -> list[StatusValue]:
+        # One listing of the status files, and a download of the latest status
+        # of each step that has started
+        steps = list_step_statuses(env.bucket_name, file_prefix)
+        return [
+            get_status_file(env.bucket_name, file_prefix, step, max(steps[step], key=STATUS_PRECEDENCE.index))
+            for step in StepName
+            if StepStatus.STARTED in steps.get(step, set())
+        ]
+
+    # Steps whose final status has been sent
+    finished_steps = set()
+
+    def running() -> bool:
+        return any(
+            not (job.state in FINISHED_STATES and job.step in finished_steps)
+            for job in request.app.jobs.active_jobs(workflow_execution_id)
+        )
+
+    async def stream():
+        try:
+            for status_value in await asyncio.to_thread(current_statuses):
+                if status_value.status in (StepStatus.SUCCEEDED, StepStatus.FAILED):
+                    finished_steps.add(status_value.step)
+                yield format_sse("status", _status_event(workflow_execution_id, status_value))
+            while running() or not finished_steps or not queue.empty():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if event == "status" and data["step_status"] in (StepStatus.SUCCEEDED, StepStatus.FAILED):
+                    finished_steps.add(data["step_name"])
+                yield format_sse(event, data)
+        finally:
+            broker.unsubscribe(workflow_execution_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/jobs", status_code=status.HTTP_200_OK, response_model=list[JobResponse])
+async def list_jobs(request: Request):
+    return [JobResponse(**job.as_dict()) for job in request.app.jobs.list_jobs()]
+
+
+@app.get("/jobs/{job_id}", status_code=status.HTTP_200_OK, response_model=JobResponse)
+async def get_job(request: Request, job_id: str):
+    job = request.app.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No job {job_id}")
+    return JobResponse(**job.as_dict())
+
+
+@app.delete("/jobs/{job_id}", status_code=status.HTTP_200_OK, response_model=JobResponse)
+async def cancel_job(request: Request, job_id: str):
+    """
+    Cancels a queued or running job. The job's step is marked FAILED once it has stopped.
+    """
+    try:
+        job = request.app.jobs.cancel(job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No job {job_id}") from e
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from e
+    return JobResponse(**job.as_dict())
+
+
+def write_step_status(
+    app: FastAPI,
+    workflow_execution_id: str,
+    step_name: StepName,
+    step_status: StepStatus,
+    message: str | None = None,
+) -> StatusValue:
+    """
+    Writes a status file of a step, and sends the status to the subscribers of
+    the workflow's step events.
+    """
+    env: clinvar_ingest.config.Env = app.env
+    status_value = write_status_file(
+        env.bucket_name,
+        f"{env.executions_output_prefix}/{workflow_execution_id}",
+        step_name,
+        step_status,
+        message=message,
+        timestamp=datetime.datetime.now(datetime.UTC).isoformat(),
+    )
+    app.step_events.publish(workflow_execution_id, "status", _status_event(workflow_execution_id, status_value))
+    return status_value
+
+
+def _status_event(workflow_execution_id: str, status_value: StatusValue) -> dict:
+    return GetStepStatusResponse(
+        workflow_execution_id=workflow_execution_id,
+        step_name=status_value.step,
+        step_status=status_value.status,
+        timestamp=status_value.timestamp,
+        message=status_value.message,
+    ).model_dump(mode="json")
+
+
+def publish_progress(app: FastAPI, job: Job, progress: dict):
+    app.step_events.publish(
+        job.workflow_execution_id,
+        "progress",
+        {
+            "workflow_execution_id": job.workflow_execution_id,
+            "step_name": job.step,
+            "job_id": job.job_id,
+            "progress": progress,
+        },
+    )
+
+
 @app.post(
     "/copy/{workflow_execution_id}",
     status_code=status.HTTP_201_CREATED,
@@ -220,7 +346,6 @@ async def copy(
     request: Request,
     workflow_execution_id: str,
     payload: ClinvarFTPWatcherRequest,
-    background_tasks: BackgroundTasks,
 ):
     env: clinvar_ingest.config.Env = request.app.env
     step_name = StepName.COPY
@@ -240,53 +365,35 @@ async def copy(
 
     logger.info(f"Copying {ftp_path} to {gcs_path}")
 
-    start_status = write_status_file(
-        env.bucket_name,
-        f"{env.executions_output_prefix}/{workflow_execution_id}",
-        step_name,
-        StepStatus.STARTED,
-    )
+    start_status = write_step_status(request.app, workflow_execution_id, step_name, StepStatus.STARTED)
     logger.info("%s step for workflow %s started", step_name, workflow_execution_id)
 
-    def task():
-        try:
-
-            # Download to local file
-            http_download_curl(
-                http_uri=ftp_path, local_path=ftp_file, file_size=ftp_file_size
-            )
-
-            # Upload local file to bucket
-            copy_file_to_bucket(
-                local_file_uri=ftp_file,
-                remote_blob_uri=gcs_path,
-                client=_get_gcs_client(),
-            )
+    def on_progress(job: Job, progress: dict):
+        publish_progress(request.app, job, progress)
 
-            write_status_file(
-                env.bucket_name,
-                f"{env.executions_output_prefix}/{workflow_execution_id}",
-                step_name,
-                StepStatus.SUCCEEDED,
-                message=CopyResponse(
-                    ftp_path=ftp_path,
-                    gcs_path=gcs_path,
-                ).model_dump_json(),
-            )
-
-        except Exception as e:  # pylint: disable=W0718
+    def on_done(job: Job):
+        if job.state == JobState.SUCCEEDED:
+            write_step_status(request.app, workflow_execution_id, step_name, StepStatus.SUCCEEDED, message=job.result)
+        else:
             msg = f"Failed to copy {ftp_path}"
-            logger.exception(msg)
-            write_status_file(
-                env.bucket_name,
-                f"{env.executions_output_prefix}/{workflow_execution_id}",
-                step_name,
-                StepStatus.FAILED,
-                message=f"{msg}: {e}",
+            logger.error(f"{msg}: {job.error}")
+            write_step_status(
+                request.app, workflow_execution_id, step_name, StepStatus.FAILED, message=f"{msg}: {job.error}"
             )
 
-    background_tasks.add_task(task)
-    logger.info("%s step task for workflow %s added", step_name, workflow_execution_id)
+    # Run in a job process, so the copy does not hold up the event loop
+    job = request.app.jobs.submit(
+        copy_step,
+        ftp_path,
+        gcs_path,
+        ftp_file_size,
+        f"{gcs_base}/copy-checkpoint.json",
+        step=step_name,
+        workflow_execution_id=workflow_execution_id,
+        on_progress=on_progress,
+        on_done=on_done,
+    )
+    logger.info("%s step job %s for workflow %s submitted", step_name, job.job_id, workflow_execution_id)
 
     logger.info(
         "%s step task for workflow %s returning", step_name, workflow_execution_id
@@ -295,6 +402,7 @@ async def copy(
         workflow_execution_id=workflow_execution_id,
         step_name=step_name,
         timestamp=start_status.timestamp,
+        job_id=job.job_id,
     )
 
 
@@ -307,7 +415,6 @@ async def parse(
     request: Request,
     workflow_execution_id: str,
     payload: ParseRequest,
-    background_tasks: BackgroundTasks,
 ):
     env: clinvar_ingest.config.Env = request.app.env
     step_name = StepName.PARSE
@@ -315,44 +422,59 @@ async def parse(
     parse_output_path = (
         f"gs://{env.bucket_name}/{execution_prefix}/{env.parse_output_prefix}"
     )
-    start_status = write_status_file(
-        env.bucket_name,
-        execution_prefix,
-        step_name,
-        StepStatus.STARTED,
-    )
+    start_status = write_step_status(request.app, workflow_execution_id, step_name, StepStatus.STARTED)
     logger.info("%s step for workflow %s started", step_name, workflow_execution_id)
 
-    def task():
-        try:
-            output_files = parse_and_write_files(
-                payload.input_path,
-                parse_output_path,
-                disassemble=payload.disassemble,
-                jsonify_content=payload.jsonify_content,
-            )
+    last_status_time = 0.0
+
+    def on_progress(job: Job, progress: dict):
+        nonlocal last_status_time
+        metrics.record_parse_progress(workflow_execution_id, ParseProgress.from_dict(progress))
+        publish_progress(request.app, job, progress)
+        # Progress is streamed as it is reported, and written to the status
+        # file less often for clients polling the status
+        now = time.monotonic()
+        if now - last_status_time >= PROGRESS_STATUS_INTERVAL or progress.get("done"):
+            last_status_time = now
             write_status_file(
                 env.bucket_name,
-                f"{env.executions_output_prefix}/{workflow_execution_id}",
+                execution_prefix,
                 step_name,
-                StepStatus.SUCCEEDED,
-                message=ParseResponse(parsed_files=output_files).model_dump_json(),
+                StepStatus.IN_PROGRESS,
+                message=json.dumps(progress),
+                timestamp=datetime.datetime.now(datetime.UTC).isoformat(),
             )
-        except Exception as e:
+
+    def on_done(job: Job):
+        metrics.clear_parse_progress(workflow_execution_id)
+        if job.state == JobState.SUCCEEDED:
+            write_step_status(request.app, workflow_execution_id, step_name, StepStatus.SUCCEEDED, message=job.result)
+        else:
             msg = (
                 f"Failed to parse {payload.input_path} and write to {parse_output_path}"
             )
-            logger.exception(msg)
-            write_status_file(
-                env.bucket_name,
-                execution_prefix,
-                step_name,
-                StepStatus.FAILED,
-                message=f"{msg}: {e}",
+            logger.error(f"{msg}: {job.error}")
+            write_step_status(
+                request.app, workflow_execution_id, step_name, StepStatus.FAILED, message=f"{msg}: {job.error}"
             )
 
-    background_tasks.add_task(task)
-    logger.info("%s step task for workflow %s added", step_name, workflow_execution_id)
+    # The parse takes as many of the job CPUs as it has workers, so parses
+    # started together wait their turn instead of sharing the CPUs
+    job = request.app.jobs.submit(
+        parse_step,
+        payload.input_path,
+        parse_output_path,
+        payload.disassemble,
+        payload.jsonify_content,
+        payload.workers,
+        payload.ordered,
+        step=step_name,
+        workflow_execution_id=workflow_execution_id,
+        cpus=payload.workers,
+        on_progress=on_progress,
+        on_done=on_done,
+    )
+    logger.info("%s step job %s for workflow %s submitted", step_name, job.job_id, workflow_execution_id)
 
     logger.info(
         "%s step task for workflow %s returning", step_name, workflow_execution_id
@@ -361,6 +483,7 @@ async def parse(
         workflow_execution_id=workflow_execution_id,
         step_name=step_name,
         timestamp=start_status.timestamp,
+        job_id=job.job_id,
     )
 
 
@@ -424,7 +547,7 @@ async def create_external_tables(
                 message=f"{msg}: {e}",
             )
 
-    background_tasks.add_task(task)
+    background_tasks.add_task(metrics.track_background_task(step_name, task))
     logger.info("%s step task for workflow %s added", step_name, workflow_execution_id)
 
     logger.info(
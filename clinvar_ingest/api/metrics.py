@@ -0,0 +1,286 @@
+"""
+Metrics for the API service, exposed in the OpenMetrics text format at /metrics.
+
+A small in-process implementation of counters, gauges and histograms, covering
+what the service needs without adding a client library dependency.
+See https://github.com/OpenObservability/OpenMetrics/blob/main/specification/OpenMetrics.md
+"""
+
+import bisect
+import functools
+import math
+import threading
+import time
+from collections.abc import Callable, Sequence
+
+from clinvar_ingest.progress import ParseProgress
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Background task duration buckets, in seconds. Steps take minutes to hours.
+TASK_DURATION_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class of a metric family with a fixed set of label names.
+    """
+
+    metric_type = "unknown"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} has labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels: str):
+        """
+        Removes the series with `labels`. Given only some of the label names,
+        removes every series with those values.
+        """
+        if not set(labels) <= set(self.labelnames):
+            raise ValueError(f"Metric {self.name} has labels {self.labelnames}, got {sorted(labels)}")
+        indexes = {self.labelnames.index(name): str(value) for name, value in labels.items()}
+        with self._lock:
+            for key in [k for k in self._values if all(k[i] == value for i, value in indexes.items())]:
+                del self._values[key]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# TYPE {self.name} {self.metric_type}", f"# HELP {self.name} {_escape(self.documentation)}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(
+    Histogram(
+        "clinvar_ingest_http_request_duration_seconds",
+        "Time to handle HTTP requests, by route",
+        ["method", "route", "status_code"],
+    )
+)
+background_tasks_in_progress = REGISTRY.register(
+    Gauge("clinvar_ingest_background_tasks_in_progress", "Background step tasks currently running", ["step"])
+)
+background_task_duration = REGISTRY.register(
+    Histogram(
+        "clinvar_ingest_background_task_duration_seconds",
+        "Time taken by background step tasks",
+        ["step"],
+        buckets=TASK_DURATION_BUCKETS,
+    )
+)
+jobs_queued = REGISTRY.register(Gauge("clinvar_ingest_jobs_queued", "Step jobs waiting for capacity to run"))
+parse_input_bytes = REGISTRY.register(
+    Gauge("clinvar_ingest_parse_input_bytes", "Bytes of the input file read by a parse", ["workflow_execution_id"])
+)
+parse_input_size_bytes = REGISTRY.register(
+    Gauge("clinvar_ingest_parse_input_size_bytes", "Size of the input file of a parse", ["workflow_execution_id"])
+)
+parse_records = REGISTRY.register(
+    Gauge("clinvar_ingest_parse_records", "Top level records read by a parse", ["workflow_execution_id"])
+)
+parse_bytes_per_second = REGISTRY.register(
+    Gauge(
+        "clinvar_ingest_parse_input_bytes_per_second",
+        "Smoothed rate of reading the input file of a parse",
+        ["workflow_execution_id"],
+    )
+)
+parse_records_per_second = REGISTRY.register(
+    Gauge(
+        "clinvar_ingest_parse_records_per_second",
+        "Smoothed rate of reading top level records in a parse",
+        ["workflow_execution_id"],
+    )
+)
+parse_eta_seconds = REGISTRY.register(
+    Gauge("clinvar_ingest_parse_eta_seconds", "Estimated time remaining of a parse", ["workflow_execution_id"])
+)
+parse_entity_rows = REGISTRY.register(
+    Gauge(
+        "clinvar_ingest_parse_entity_rows",
+        "Rows written by a parse, by entity type",
+        ["workflow_execution_id", "entity_type"],
+    )
+)
+parse_queue_depth = REGISTRY.register(
+    Gauge(
+        "clinvar_ingest_parse_queue_depth",
+        "Batches waiting in the queues of a parallel parse",
+        ["workflow_execution_id", "queue"],
+    )
+)
+
+
+PARSE_GAUGES = (
+    parse_input_bytes,
+    parse_input_size_bytes,
+    parse_records,
+    parse_bytes_per_second,
+    parse_records_per_second,
+    parse_eta_seconds,
+    parse_entity_rows,
+    parse_queue_depth,
+)
+
+
+def record_parse_progress(workflow_execution_id: str, progress: ParseProgress):
+    """
+    Sets the parse gauges of `workflow_execution_id` from a progress report.
+    """
+    labels = {"workflow_execution_id": workflow_execution_id}
+    parse_input_bytes.set(progress.input_bytes, **labels)
+    if progress.input_size is not None:
+        parse_input_size_bytes.set(progress.input_size, **labels)
+    parse_records.set(progress.records, **labels)
+    parse_bytes_per_second.set(progress.bytes_per_second, **labels)
+    parse_records_per_second.set(progress.records_per_second, **labels)
+    if progress.eta_seconds is not None:
+        parse_eta_seconds.set(progress.eta_seconds, **labels)
+    for entity_type, rows in progress.entity_rows.items():
+        parse_entity_rows.set(rows, entity_type=entity_type, **labels)
+    for queue_name, depth in progress.queue_depths.items():
+        parse_queue_depth.set(depth, queue=queue_name, **labels)
+
+
+def clear_parse_progress(workflow_execution_id: str):
+    """
+    Removes the parse gauges of `workflow_execution_id`, once its parse has
+    finished, so series of past parses do not accumulate.
+    """
+    for gauge in PARSE_GAUGES:
+        gauge.remove(workflow_execution_id=workflow_execution_id)
+
+
+def track_background_task(step: str, fn: Callable) -> Callable:
+    """
+    Wraps a background task function to count it as in progress while it runs,
+    and record its duration.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        background_tasks_in_progress.inc(step=step)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            background_task_duration.observe(time.perf_counter() - start, step=step)
+            background_tasks_in_progress.dec(step=step)
+
+    return wrapper
@@ -4,7 +4,9 @@ import uuid
 from collections.abc import Callable
 
 from starlette.middleware.base import BaseHTTPMiddleware, Request, Response
+from starlette.routing import Match
 
+from clinvar_ingest.api import metrics
 from clinvar_ingest.api.constants import MS_PER_S
 
 logger = logging.getLogger("api")
@@ -13,14 +15,41 @@ logger = logging.getLogger("api")
 class LogRequests(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         request_id = uuid.uuid4()
-        start_ms = int(time.time())
+        start_ms = int(time.time() * MS_PER_S)
+        start = time.perf_counter()
         logger.info(
             f"{request.method} {request.url.path} id={request_id} start_ms={start_ms}"
         )
         response = await call_next(request)
-        elapsed_ms = int((time.time() - start_ms) * MS_PER_S)
+        elapsed_ms = int((time.perf_counter() - start) * MS_PER_S)
         logger.info(
             f"{request.method} {request.url.path} id={request_id} "
             f"elapsed_ms={elapsed_ms} status_code={response.status_code}"
         )
         return response
+
+
+def _route_path(request: Request) -> str:
+    """
+    Returns the path template of the route matching the request, e.g.
+    /step_status/{workflow_execution_id}/{step_name}, so metrics are not labeled
+    with every distinct path.
+    """
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class RecordRequestMetrics(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        start = time.perf_counter()
+        response = await call_next(request)
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=_route_path(request),
+            status_code=str(response.status_code),
+        )
+        return response
@@ -123,12 +123,32 @@ class ClinvarFTPWatcherRequest(BaseModel):
 class CopyResponse(BaseModel):
     ftp_path: str
     gcs_path: str
+    # Hex digests of the copied file, verified against those GCS computed
+    crc32c: str | None = None
+    md5: str | None = None
 
 
 class ParseRequest(BaseModel):
     input_path: str
     disassemble: bool = Field(default=True)
     jsonify_content: bool = Field(default=True)
+    workers: Annotated[
+        int,
+        Field(
+            ge=1,
+            description=(
+                "Number of worker processes to parse with. "
+                "With more than 1, each type is written to a part file per worker."
+            ),
+        ),
+    ] = 1
+    ordered: bool = Field(
+        default=False,
+        description=(
+            "With more than 1 worker, write each type to a single file in input order, "
+            "identical to parsing with 1 worker."
+        ),
+    )
 
 
 class GcsBlobPath(RootModel):
@@ -168,6 +188,8 @@ class ParseResponse(BaseModel):
     """
 
     parsed_files: dict[str, GcsBlobPath | PurePathStr]
+    # Summary of the time spent in each stage of the parse, see clinvar_ingest.stats
+    stats: dict | None = None
 
     @field_serializer("parsed_files", when_used="always")
     def _serialize(self, v):
@@ -302,11 +324,29 @@ class StepStartedResponse(BaseModel):
     timestamp: datetime
     step_status: Literal[StepStatus.STARTED] = StepStatus.STARTED
     message: str | None = None
+    job_id: str | None = None
 
     @field_serializer("timestamp", when_used="always")
     def _timestamp_serializer(self, v: datetime):
         return v.isoformat()
 
 
+class JobResponse(BaseModel):
+    """
+    Defines the response from the jobs endpoints, for a job running a step.
+    """
+
+    job_id: str
+    step: str
+    workflow_execution_id: str | None = None
+    cpus: int
+    state: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    submitted_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    progress: dict[str, Any] | None = None
+    error: str | None = None
+
+
 class TodoRequest(BaseModel):  # A shim to get the workflow pieced together
     todo: str
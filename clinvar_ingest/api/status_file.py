@@ -1,20 +1,38 @@
 """
 This module is for creating and writing messages to status files for workflow jobs so that external
-services can monitor the status of the workflow jobs. The status files are written to a GCS bucket.
+services can monitor the status of the workflow jobs. The status files are written to a GCS bucket,
+or to its stand-in when gs:// URIs are redirected, see `clinvar_ingest.storage`.
 """
 
 import datetime
 import json
 import logging
+import os
+import re
+import threading
+import time
 
-from google.cloud.storage import Blob
-from google.cloud.storage import Client as GCSClient
-
-from clinvar_ingest.cloud.gcs import blob_writer
 from clinvar_ingest.status import StatusValue, StepName, StepStatus
+from clinvar_ingest.storage import get_backend
 
 _logger = logging.getLogger("clinvar_ingest")
 
+# Seconds the status of a step is cached by lookup_step_status, so that polling
+# does not list the bucket on every request
+STATUS_CACHE_TTL = float(os.environ.get("CLINVAR_INGEST_STATUS_CACHE_TTL", 5))
+
+# The status of a step is the last of these it has a status file for
+STATUS_PRECEDENCE = [
+    StepStatus.STARTED,
+    StepStatus.IN_PROGRESS,
+    StepStatus.SUCCEEDED,
+    StepStatus.FAILED,
+]
+
+# (bucket, file_prefix, step) to the time the entry expires and the step's status
+_status_cache: dict[tuple[str, str, StepName], tuple[float, StatusValue]] = {}
+_status_cache_lock = threading.Lock()
+
 
 def write_status_file(
     bucket: str,
@@ -32,8 +50,6 @@ def write_status_file(
         "message": "All files copied successfully",
         "timestamp": "2021-06-24T16:12:00.000000"
     }
-
-    TODO maybe make a way to run this locally for testing, not writing to a bucket.
     """
     status_value = StatusValue(
         status=status, step=step, timestamp=timestamp, message=message
@@ -41,14 +57,13 @@ def write_status_file(
 
     gcs_uri = f"gs://{bucket}/{file_prefix}/{step}-{status}.json"
     _logger.debug(f"Writing status file to {gcs_uri} with content: {status_value}")
-    with blob_writer(gcs_uri) as writer:
-        writer.write(json.dumps(vars(status_value)).encode("utf-8"))
+    get_backend(gcs_uri).write_bytes(gcs_uri, json.dumps(vars(status_value)).encode("utf-8"))
+    # Statuses written by this process are seen by the next lookup
+    with _status_cache_lock:
+        _status_cache.pop((bucket, file_prefix, step), None)
     return status_value
 
 
-# TODO an improvement here for performance reasons in the status check endpoint
-# would be to make blob existence knowable without necessarily downloading the blob
-# a finished workflow step would not need to download the started file to know it's finished
 def get_status_file(
     bucket: str,
     file_prefix: str,
@@ -65,14 +80,64 @@ def get_status_file(
         StepName.COPY,
         StepStatus.STARTED)
     """
-    # https://cloud.google.com/python/docs/reference/storage/latest/google.cloud.storage.bucket.Bucket#google_cloud_storage_bucket_Bucket_list_blobs
-    client = GCSClient()
-    bucket = client.bucket(bucket)
-    blob: Blob = bucket.get_blob(f"{file_prefix}/{step}-{status}.json")
-    if blob is None:
+    gcs_uri = f"gs://{bucket}/{file_prefix}/{step}-{status}.json"
+    try:
+        content = get_backend(gcs_uri).read_bytes(gcs_uri)
+    except FileNotFoundError as e:
         raise ValueError(
             f"Could not find status file for step {step} with status {status} "
             f"in bucket {bucket} and file prefix {file_prefix}"
-        )
-    content = blob.download_as_string()
+        ) from e
     return StatusValue(**json.loads(content))
+
+
+def list_step_statuses(bucket: str, file_prefix: str) -> dict[StepName, set[StepStatus]]:
+    """
+    Returns the statuses each step has a status file for in `file_prefix`,
+    from one listing of the file names, without downloading the files.
+    """
+    prefix_uri = f"gs://{bucket}/{file_prefix}/"
+    pattern = re.compile(rf"({'|'.join(StepName)})-({'|'.join(StepStatus)})\.json")
+    statuses = {}
+    for uri in get_backend(prefix_uri).list_uris(prefix_uri):
+        match = pattern.fullmatch(uri[len(prefix_uri) :])
+        if match is not None:
+            statuses.setdefault(StepName(match.group(1)), set()).add(StepStatus(match.group(2)))
+    return statuses
+
+
+def lookup_step_status(
+    bucket: str,
+    file_prefix: str,
+    step: StepName,
+    ttl: float = STATUS_CACHE_TTL,
+) -> StatusValue:
+    """
+    Returns the current status of `step`, the contents of its status file
+    latest in STATUS_PRECEDENCE. Lists the status files once, and downloads
+    only that one. The status is cached for `ttl` seconds.
+
+    Raises ValueError if the step has not started.
+    """
+    key = (bucket, file_prefix, step)
+    now = time.monotonic()
+    with _status_cache_lock:
+        cached = _status_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    statuses = list_step_statuses(bucket, file_prefix).get(step, set())
+    # Cannot get status of step that has not started
+    if StepStatus.STARTED not in statuses:
+        raise ValueError(
+            f"Could not find status file for step {step} with status {StepStatus.STARTED} "
+            f"in bucket {bucket} and file prefix {file_prefix}"
+        )
+    latest = max(statuses, key=STATUS_PRECEDENCE.index)
+    status_value = get_status_file(bucket, file_prefix, step, latest)
+
+    with _status_cache_lock:
+        for expired in [k for k, (expires, _) in _status_cache.items() if expires <= now]:
+            del _status_cache[expired]
+        _status_cache[key] = (now + ttl, status_value)
+    return status_value
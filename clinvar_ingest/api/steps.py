@@ -0,0 +1,92 @@
+"""
+The work of the long running workflow steps, run as jobs by `clinvar_ingest.api.jobs`.
+
+These are module level functions of plain arguments, so they can be pickled into
+a job's process. They return the message of the step's SUCCEEDED status, or raise,
+and the server writes the status when the job ends.
+"""
+
+import os
+import time
+from collections.abc import Callable
+
+from clinvar_ingest.api.model.requests import CopyResponse, ParseResponse
+from clinvar_ingest.cloud.gcs import http_get_md5
+from clinvar_ingest.cloud.streaming import stream_copy
+from clinvar_ingest.parse import parse_and_write_files
+from clinvar_ingest.progress import ParseProgress
+
+# Seconds between progress reports of a running step
+STEP_PROGRESS_INTERVAL = float(os.environ.get("CLINVAR_INGEST_STEP_PROGRESS_INTERVAL", 5))
+
+
+def copy_step(
+    ftp_path: str,
+    gcs_path: str,
+    size: int,
+    checkpoint_uri: str,
+    report_progress: Callable[[dict], None] | None = None,
+) -> str:
+    start_time = time.monotonic()
+    last_report = start_time
+
+    def on_chunk(offset: int, chunk: memoryview):
+        nonlocal last_report
+        now = time.monotonic()
+        copied = offset + len(chunk)
+        if report_progress is not None and (now - last_report >= STEP_PROGRESS_INTERVAL or copied == size):
+            last_report = now
+            elapsed = now - start_time
+            report_progress(
+                {
+                    "bytes_copied": copied,
+                    "size": size,
+                    "percent": 100.0 * copied / size if size else None,
+                    "elapsed_seconds": elapsed,
+                    "bytes_per_second": copied / elapsed if elapsed > 0 else 0.0,
+                }
+            )
+
+    # Stream the file into the bucket, resuming a previous attempt
+    # from its checkpoint
+    copy_result = stream_copy(
+        source_uri=ftp_path,
+        destination_uri=gcs_path,
+        size=size,
+        checkpoint_uri=checkpoint_uri,
+        on_chunk=on_chunk,
+        expected_md5=http_get_md5(f"{ftp_path}.md5"),
+    )
+    return CopyResponse(
+        ftp_path=ftp_path,
+        gcs_path=gcs_path,
+        crc32c=copy_result.crc32c,
+        md5=copy_result.md5,
+    ).model_dump_json()
+
+
+def parse_step(
+    input_path: str,
+    output_path: str,
+    disassemble: bool,
+    jsonify_content: bool,
+    workers: int,
+    ordered: bool,
+    report_progress: Callable[[dict], None] | None = None,
+) -> str:
+    def progress_callback(progress: ParseProgress):
+        if report_progress is not None:
+            report_progress(progress.as_dict())
+
+    output_files, stats = parse_and_write_files(
+        input_path,
+        output_path,
+        disassemble=disassemble,
+        jsonify_content=jsonify_content,
+        workers=workers,
+        ordered=ordered,
+        return_stats=True,
+        progress_callback=progress_callback,
+        progress_interval=STEP_PROGRESS_INTERVAL,
+    )
+    return ParseResponse(parsed_files=output_files, stats=stats).model_dump_json()
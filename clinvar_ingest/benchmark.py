@@ -0,0 +1,412 @@
+"""
+Benchmarks of the parse pipeline, per stage.
+
+Each input file is run through the stages of a parse one at a time, and the
+time spent in each stage is reported as records/s and MB/s of uncompressed XML:
+
+    decompress   reading the decompressed input
+    frame        splitting the XML into records (excluding decompress)
+    dict-convert parsing a record's XML into a dict, as the parse reads it for
+                 the file format, e.g. only the parts of an RCV record it needs
+    from_xml     constructing the model object from the dict
+    disassemble  disassembling the model object into its output objects
+    dictify      converting the output objects to dicts
+    jsonify      JSON encoding the content fields of the dicts
+    encode       encoding the dicts as NDJSON lines
+    compress     gzip compressing the lines of each output type
+    write        writing the compressed bytes to a file per output type
+    end-to-end   parse_and_write_files, for comparison with the sum of the above
+
+Each input is benchmarked in its own forked process, so the reported peak RSS
+is that of the input alone.
+
+Results are written as JSON, and can be compared with the results of an earlier run:
+
+    python -m clinvar_ingest.benchmark -o results.json --baseline baseline.json
+
+Larger inputs can be generated with `clinvar_ingest.synthetic`, e.g. with
+`--synthetic-size 1G` to also benchmark a synthetic VCV and RCV release of 1 GiB each.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+from clinvar_ingest.model.common import dictify
+from clinvar_ingest.parse import (
+    GZIP_COMPRESSLEVEL,
+    WRITE_BLOCK_SIZE,
+    _open,
+    _st_size,
+    jsonify_fields,
+    parse_and_write_files,
+)
+from clinvar_ingest.reader import (
+    RECORD_DICT_READERS,
+    RECORD_TAGS,
+    construct_model,
+    frame_clinvar_xml_records,
+)
+from clinvar_ingest.synthetic import parse_size, write_synthetic_release
+from clinvar_ingest.utils import ClinVarIngestFileFormat, peak_rss_bytes
+
+_logger = logging.getLogger("clinvar_ingest")
+
+STAGES = [
+    "decompress",
+    "frame",
+    "dict-convert",
+    "from_xml",
+    "disassemble",
+    "dictify",
+    "jsonify",
+    "encode",
+    "compress",
+    "write",
+    "end-to-end",
+]
+
+DEFAULT_INPUTS = [
+    "test/data/OriginalTestDataSet.xml.gz",
+    "test/data/VCV*.xml",
+    "test/data/combined.xml.gz",
+    "test/data/rcv/RCV*.xml",
+    "test/data/rcv/combined.xml.gz",
+]
+
+READ_CHUNK_SIZE = 1024 * 1024
+# Placeholder release date for the encode stage, which does not read it from the file
+BENCHMARK_RELEASE_DATE = "2000-01-01"
+
+
+def detect_file_format(path: str) -> ClinVarIngestFileFormat:
+    """
+    Returns the format of a ClinVar XML file from its root element.
+    """
+    with _open(path) as f:
+        head = f.read(4096)
+    if b"<ClinVarVariationRelease" in head:
+        return ClinVarIngestFileFormat.VCV
+    if b"<ReleaseSet" in head:
+        return ClinVarIngestFileFormat.RCV
+    raise ValueError(f"Could not detect file format of {path}")
+
+
+class StageTimer:
+    """
+    Cumulative wall clock time per stage.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+
+def _read_all(path: str) -> int:
+    """
+    Reads the decompressed contents of `path`, returning the number of bytes.
+    """
+    size = 0
+    with _open(path) as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            size += len(chunk)
+    return size
+
+
+def _records(path: str, tag: str) -> Iterator[bytes]:
+    with _open(path) as f:
+        yield from frame_clinvar_xml_records(f, tag)
+
+
+def _run_stages(path: str, file_format: ClinVarIngestFileFormat, output_dir: str) -> dict:
+    """
+    Runs the stages of a parse over `path` once, returning the times and counts.
+    """
+    tag = RECORD_TAGS[str(file_format)]
+    record_dict = RECORD_DICT_READERS[str(file_format)]
+    timer = StageTimer()
+
+    with timer.time("decompress"):
+        xml_bytes = _read_all(path)
+
+    record_count = 0
+    with timer.time("frame"):
+        for _ in _records(path, tag):
+            record_count += 1
+    # Framing reads the decompressed input, which is timed separately
+    timer.seconds["frame"] = max(timer.seconds["frame"] - timer.seconds["decompress"], 0.0)
+
+    compressors = {}
+    files = {}
+    row_counts = {}
+    # Rows are compressed and written in blocks, as by the parse's output files
+    blocks = {}
+    block_sizes = {}
+
+    def write_block(entity_type: str):
+        with timer.time("compress"):
+            data = compressors[entity_type].compress(b"".join(blocks[entity_type]))
+        with timer.time("write"):
+            files[entity_type].write(data)
+        blocks[entity_type] = []
+        block_sizes[entity_type] = 0
+    try:
+        for record in _records(path, tag):
+            with timer.time("dict-convert"):
+                record_tag, contents = next(iter(record_dict(record).items()))
+            with timer.time("from_xml"):
+                model_obj = construct_model(record_tag, contents)
+            with timer.time("disassemble"):
+                objs = list(model_obj.disassemble())
+            with timer.time("dictify"):
+                obj_dicts = [dictify(obj) for obj in objs]
+            with timer.time("jsonify"):
+                for obj, obj_dict in zip(objs, obj_dicts, strict=True):
+                    jsonify_fields(obj, obj_dict)
+            with timer.time("encode"):
+                lines = []
+                for obj_dict in obj_dicts:
+                    obj_dict["release_date"] = BENCHMARK_RELEASE_DATE
+                    lines.append(json.dumps(obj_dict).encode("utf-8") + b"\n")
+            for obj, line in zip(objs, lines, strict=True):
+                entity_type = obj.entity_type
+                if entity_type not in compressors:
+                    # wbits=31 writes a gzip header, as gzip.open does
+                    compressors[entity_type] = zlib.compressobj(GZIP_COMPRESSLEVEL, zlib.DEFLATED, 31)
+                    files[entity_type] = open(  # noqa: SIM115
+                        os.path.join(output_dir, f"{entity_type}.ndjson.gz"), "wb"
+                    )
+                    row_counts[entity_type] = 0
+                    blocks[entity_type] = []
+                    block_sizes[entity_type] = 0
+                row_counts[entity_type] += 1
+                blocks[entity_type].append(line)
+                block_sizes[entity_type] += len(line)
+                if block_sizes[entity_type] >= WRITE_BLOCK_SIZE:
+                    write_block(entity_type)
+        for entity_type, compressor in compressors.items():
+            write_block(entity_type)
+            with timer.time("compress"):
+                data = compressor.flush()
+            with timer.time("write"):
+                files[entity_type].write(data)
+                files[entity_type].flush()
+    finally:
+        for f in files.values():
+            f.close()
+
+    with timer.time("end-to-end"):
+        parse_and_write_files(path, os.path.join(output_dir, "end-to-end"), file_format=file_format)
+
+    return {
+        "xml_bytes": xml_bytes,
+        "records": record_count,
+        "rows": row_counts,
+        "seconds": timer.seconds,
+    }
+
+
+def benchmark_file(path: str, file_format: ClinVarIngestFileFormat | None = None, repeat: int = 1) -> dict:
+    """
+    Benchmarks the parse stages over `path`, keeping the fastest time of each
+    stage over `repeat` runs. Returns a JSON serializable dict of the results.
+    """
+    if file_format is None:
+        file_format = detect_file_format(path)
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as output_dir:
+            run = _run_stages(path, file_format, output_dir)
+        if best is None:
+            best = run
+        else:
+            best["seconds"] = {
+                stage: min(seconds, run["seconds"][stage]) for stage, seconds in best["seconds"].items()
+            }
+
+    mb = best["xml_bytes"] / 1e6
+    stages = {}
+    for stage, seconds in best["seconds"].items():
+        stages[stage] = {
+            "seconds": seconds,
+            "records_per_s": best["records"] / seconds if seconds else None,
+            "mb_per_s": mb / seconds if seconds else None,
+        }
+    return {
+        "path": path,
+        "file_format": str(file_format),
+        "input_bytes": _st_size(path),
+        "xml_bytes": best["xml_bytes"],
+        "records": best["records"],
+        "rows": sum(best["rows"].values()),
+        "stages": stages,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def run_benchmarks(paths: list[str], repeat: int = 1) -> list[dict]:
+    """
+    Benchmarks each of `paths` in its own process. An input which cannot be parsed
+    is reported with an `error` instead of its results.
+    """
+    results = []
+    for path in paths:
+        _logger.info(f"Benchmarking {path}")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            try:
+                result = executor.submit(benchmark_file, path, repeat=repeat).result()
+            except Exception as e:  # noqa: BLE001
+                _logger.warning(f"Benchmark of {path} failed: {e!r}")
+                result = {"path": path, "error": repr(e)}
+        results.append(result)
+    return results
+
+
+def compare_to_baseline(results: list[dict], baseline: list[dict]) -> list[dict]:
+    """
+    Compares the records/s of each stage of each input with the baseline results
+    of the same input. Returns a list of comparisons, where `ratio` is the current
+    records/s divided by the baseline records/s, so less than 1 is slower.
+    """
+    baseline_by_path = {b["path"]: b for b in baseline if "error" not in b}
+    comparisons = []
+    for result in results:
+        base = baseline_by_path.get(result["path"])
+        if base is None or "error" in result:
+            continue
+        for stage, current in result["stages"].items():
+            base_rate = base["stages"].get(stage, {}).get("records_per_s")
+            rate = current["records_per_s"]
+            if not base_rate or not rate:
+                continue
+            comparisons.append(
+                {
+                    "path": result["path"],
+                    "stage": stage,
+                    "baseline_records_per_s": base_rate,
+                    "records_per_s": rate,
+                    "ratio": rate / base_rate,
+                }
+            )
+    return comparisons
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            _logger.warning(f"No files match {pattern}")
+        paths.extend(matches)
+    return paths
+
+
+def _print_results(results: list[dict]):
+    for result in results:
+        if "error" in result:
+            print(f"{result['path']}: {result['error']}")
+            continue
+        print(
+            f"{result['path']} ({result['file_format']}): {result['records']} records, "
+            f"{result['xml_bytes'] / 1e6:.2f} MB XML, peak RSS {result['peak_rss_bytes'] / 1e6:.1f} MB"
+        )
+        for stage, s in result["stages"].items():
+            if s["records_per_s"] is None:
+                continue
+            print(f"  {stage:<13} {s['records_per_s']:>12.1f} records/s {s['mb_per_s']:>10.2f} MB/s")
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the parse stages over ClinVar XML files")
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=DEFAULT_INPUTS,
+        help="Input files or glob patterns (default: the files in test/data)",
+    )
+    parser.add_argument("-o", "--output", help="File to write the JSON results to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=None,
+        help=(
+            "Exit with an error if any stage is this fraction slower than the baseline, "
+            "e.g. 0.2 for 20%% slower"
+        ),
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per input, keeping the fastest (default: 1)")
+    parser.add_argument(
+        "--synthetic-size",
+        type=parse_size,
+        default=None,
+        help="Also benchmark synthetic VCV and RCV releases of this uncompressed size, e.g. 1G",
+    )
+    parser.add_argument("--synthetic-seed", type=int, default=0, help="Seed of the synthetic releases (default: 0)")
+    return parser.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        if args.synthetic_size:
+            for file_format in [ClinVarIngestFileFormat.VCV, ClinVarIngestFileFormat.RCV]:
+                path = os.path.join(
+                    synthetic_dir, f"synthetic-{file_format}-{args.synthetic_size}-{args.synthetic_seed}.xml.gz"
+                )
+                write_synthetic_release(path, args.synthetic_size, file_format=file_format, seed=args.synthetic_seed)
+                paths.append(path)
+        results = run_benchmarks(paths, repeat=args.repeat)
+    _print_results(results)
+
+    output = {
+        "created": datetime.now(UTC).isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparisons = compare_to_baseline(results, baseline["results"])
+        slower = []
+        for c in comparisons:
+            print(f"{c['path']} {c['stage']:<13} {c['ratio']:.2f}x baseline records/s")
+            if args.max_slowdown is not None and c["ratio"] < 1 - args.max_slowdown:
+                slower.append(c)
+        if slower:
+            print(f"{len(slower)} stages slower than baseline by more than {args.max_slowdown:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,6 +38,23 @@ def parse_args(argv):
         default="vcv",
         help="Format of input file (default: vcv)",
     )
+    parse_sp.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes to parse with (default: 1). "
+            "With more than 1, each worker writes its own part files for each type"
+        ),
+    )
+    parse_sp.add_argument(
+        "--ordered",
+        action="store_true",
+        help=(
+            "With --workers, write the output files in input order, "
+            "identical to parsing with a single worker"
+        ),
+    )
 
     # UPLOAD
     upload_sp = subparsers.add_parser("upload")
@@ -62,10 +79,31 @@ def parse_args(argv):
         required=True,
         help="Local directory to upload",
     )
+    upload_sp.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=(
+            "Number of files to upload at once. Large files are also uploaded "
+            "in parts this many at once "
+            "(default: environment variable CLINVAR_INGEST_UPLOAD_CONCURRENCY, or 8)"
+        ),
+    )
+    upload_sp.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="Number of times to try uploading each file on transient errors (default: 3)",
+    )
 
     # CREATE TABLES
     create_table_sp = subparsers.add_parser("create-tables")
     create_table_sp.add_argument("--destination-dataset", type=str, required=True)
     create_table_sp.add_argument("--source-table-paths", type=json.loads, required=True)
 
+    # LOAD TABLES
+    load_table_sp = subparsers.add_parser("load-tables")
+    load_table_sp.add_argument("--destination-dataset", type=str, required=True)
+    load_table_sp.add_argument("--source-table-paths", type=json.loads, required=True)
+
     return parser.parse_args(argv)
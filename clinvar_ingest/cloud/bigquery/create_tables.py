@@ -75,6 +75,9 @@ def create_table(
 ) -> bigquery.Table:
     """
     Creates a table in the given dataset, using the given bucket and path.
+
+    `blob_uri` may contain a wildcard to use multiple files, such as the part
+    files of each type written by a parallel parse (e.g. `.../gene/part-*.ndjson.gz`).
     """
     table_ref = dataset.table(table_name)
     external_config = bigquery.ExternalConfig(
@@ -158,6 +161,70 @@ def run_create_external_tables(
     return outputs
 
 
+def get_query_for_copy(
+    source_table_ref: bigquery.TableReference,
+    dest_table_ref: bigquery.TableReference,
+) -> tuple[str, bool]:
+    """
+    Returns the query creating `dest_table_ref` from `source_table_ref`, and
+    whether it is a plain copy. Tables of entities repeated across records,
+    like genes and submitters, are deduplicated, joining tables which must
+    already have been created.
+    """
+    dedupe_queries = {
+        "gene": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
+        f"SELECT * EXCEPT (vcv_id, row_num) from "
+        f"(SELECT ge.*, ROW_NUMBER() OVER (PARTITION BY ge.id "
+        f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
+        f"FROM `{source_table_ref}` AS ge "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
+        f"ON ge.vcv_id = vcv.id) where row_num = 1",
+        "submission": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
+        f"SELECT * EXCEPT (scv_id, row_num) from "
+        f"(SELECT se.*, ROW_NUMBER() OVER (PARTITION BY se.id "
+        f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
+        f"FROM `{source_table_ref}` AS se "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.clinical_assertion` AS scv "
+        f"ON se.scv_id = scv.id "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
+        f"ON scv.variation_archive_id = vcv.id) "
+        f"where row_num = 1",
+        "submitter": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
+        f"SELECT * EXCEPT (scv_id, row_num) from "
+        f"(SELECT se.*, ROW_NUMBER() OVER (PARTITION BY se.id "
+        f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
+        f"FROM `{source_table_ref}` AS se "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.clinical_assertion` AS scv "
+        f"ON se.scv_id = scv.id "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
+        f"ON scv.variation_archive_id = vcv.id) "
+        f"where row_num = 1",
+        "trait": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
+        f"SELECT * EXCEPT (rcv_id, row_num) from "
+        f"(SELECT te.*, ROW_NUMBER() OVER (PARTITION BY te.id "
+        f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
+        f"FROM `{source_table_ref}` AS te "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.rcv_accession` AS rcv "
+        f"ON te.rcv_id = rcv.id "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
+        f"ON rcv.variation_archive_id = vcv.id) "
+        f"where row_num = 1",
+        "trait_set": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
+        f"SELECT * EXCEPT (rcv_id, row_num) from "
+        f"(SELECT tse.*, ROW_NUMBER() OVER (PARTITION BY tse.id "
+        f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
+        f"FROM `{source_table_ref}` AS tse "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.rcv_accession` AS rcv "
+        f"ON tse.rcv_id = rcv.id "
+        f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
+        f"ON rcv.variation_archive_id = vcv.id) "
+        f"where row_num = 1",
+    }
+    default_query = f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS SELECT * from `{source_table_ref}`"  # noqa: S608
+    query = dedupe_queries.get(dest_table_ref.table_id, default_query)
+    return query, query == default_query
+
+
 def create_internal_tables(
     args: CreateInternalTablesRequest,
 ) -> CreateInternalTablesRequest:
@@ -168,63 +235,6 @@ def create_internal_tables(
 
     """
 
-    def get_query_for_copy(
-        source_table_ref: bigquery.TableReference,
-        dest_table_ref: bigquery.TableReference,
-    ) -> tuple[str, bool]:
-        dedupe_queries = {
-            "gene": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
-            f"SELECT * EXCEPT (vcv_id, row_num) from "
-            f"(SELECT ge.*, ROW_NUMBER() OVER (PARTITION BY ge.id "
-            f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
-            f"FROM `{source_table_ref}` AS ge "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
-            f"ON ge.vcv_id = vcv.id) where row_num = 1",
-            "submission": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
-            f"SELECT * EXCEPT (scv_id, row_num) from "
-            f"(SELECT se.*, ROW_NUMBER() OVER (PARTITION BY se.id "
-            f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
-            f"FROM `{source_table_ref}` AS se "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.clinical_assertion` AS scv "
-            f"ON se.scv_id = scv.id "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
-            f"ON scv.variation_archive_id = vcv.id) "
-            f"where row_num = 1",
-            "submitter": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
-            f"SELECT * EXCEPT (scv_id, row_num) from "
-            f"(SELECT se.*, ROW_NUMBER() OVER (PARTITION BY se.id "
-            f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
-            f"FROM `{source_table_ref}` AS se "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.clinical_assertion` AS scv "
-            f"ON se.scv_id = scv.id "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
-            f"ON scv.variation_archive_id = vcv.id) "
-            f"where row_num = 1",
-            "trait": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
-            f"SELECT * EXCEPT (rcv_id, row_num) from "
-            f"(SELECT te.*, ROW_NUMBER() OVER (PARTITION BY te.id "
-            f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
-            f"FROM `{source_table_ref}` AS te "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.rcv_accession` AS rcv "
-            f"ON te.rcv_id = rcv.id "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
-            f"ON rcv.variation_archive_id = vcv.id) "
-            f"where row_num = 1",
-            "trait_set": f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS "  # noqa: S608
-            f"SELECT * EXCEPT (rcv_id, row_num) from "
-            f"(SELECT tse.*, ROW_NUMBER() OVER (PARTITION BY tse.id "
-            f"ORDER BY vcv.date_last_updated DESC, vcv.id DESC) row_num "
-            f"FROM `{source_table_ref}` AS tse "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.rcv_accession` AS rcv "
-            f"ON tse.rcv_id = rcv.id "
-            f"JOIN `{dest_table_ref.project}.{dest_table_ref.dataset_id}.variation_archive` AS vcv "
-            f"ON rcv.variation_archive_id = vcv.id) "
-            f"where row_num = 1",
-        }
-        default_query = f"CREATE OR REPLACE TABLE `{dest_table_ref}` AS SELECT * from `{source_table_ref}`"  # noqa: S608
-        query = dedupe_queries.get(dest_table_ref.table_id, default_query)
-        return query, query == default_query
-
     env = get_env()
     table_map = args.source_dest_table_map
     # Initial validation
@@ -0,0 +1,212 @@
+"""
+Loads the parsed files of each entity type into native BigQuery tables with load
+jobs, instead of creating external tables and copying them with queries.
+
+The load jobs of all tables are submitted at once and polled together, so the
+tables load concurrently. Tables of entities repeated across records, which are
+deduplicated by `create_tables.get_query_for_copy`, are loaded into staging tables
+first, and deduplicated into their final tables once the tables they join have
+loaded, after which the staging tables are dropped.
+
+Files are loaded as NDJSON, or Parquet if their names end in .parquet, with the
+schemas in bq_json_schemas.
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from google.cloud import bigquery, storage
+
+from clinvar_ingest.api.model.requests import CreateExternalTablesRequest
+from clinvar_ingest.cloud.bigquery.create_tables import (
+    ensure_dataset_exists,
+    get_query_for_copy,
+    schema_file_path_for_table,
+)
+from clinvar_ingest.cloud.gcs import parse_blob_uri
+from clinvar_ingest.config import get_env
+
+_logger = logging.getLogger("clinvar_ingest")
+
+# Seconds between polls of the running load and query jobs
+LOAD_POLL_INTERVAL = float(os.environ.get("CLINVAR_INGEST_BQ_LOAD_POLL_INTERVAL", 5))
+# Suffix of the tables loaded before deduplication
+STAGING_SUFFIX = "_staging"
+
+
+@dataclass
+class TableLoad:
+    """
+    The outcome of loading, or deduplicating into, a table. `seconds` is the
+    time the job ran for, as reported by BigQuery.
+    """
+
+    table_name: str
+    table_id: str
+    job_id: str
+    seconds: float | None = None
+    input_bytes: int | None = None
+    output_bytes: int | None = None
+    output_rows: int | None = None
+    error: str | None = None
+
+
+def source_format_for_uri(uri: str) -> str:
+    if uri.endswith(".parquet"):
+        return bigquery.SourceFormat.PARQUET
+    return bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+
+
+def start_load_job(
+    client: bigquery.Client,
+    dataset: bigquery.Dataset,
+    table_name: str,
+    source_uri: str,
+    schema_table_name: str | None = None,
+    write_disposition: str = bigquery.WriteDisposition.WRITE_TRUNCATE,
+) -> bigquery.LoadJob:
+    """
+    Submits a job loading `source_uri` into `table_name`, with the schema of
+    `schema_table_name`, by default `table_name`. `source_uri` may contain a
+    wildcard, e.g. for the part files of a parallel parse.
+    """
+    job_config = bigquery.LoadJobConfig(
+        source_format=source_format_for_uri(source_uri),
+        schema=client.schema_from_json(schema_file_path_for_table(schema_table_name or table_name)),
+        write_disposition=write_disposition,
+    )
+    _logger.info(f"Loading {source_uri} into {dataset.dataset_id}.{table_name}")
+    return client.load_table_from_uri(source_uri, dataset.table(table_name), job_config=job_config)
+
+
+def _job_seconds(job) -> float | None:
+    if job.started is None or job.ended is None:
+        return None
+    return (job.ended - job.started).total_seconds()
+
+
+def _table_load(table_name: str, job: bigquery.LoadJob | bigquery.QueryJob) -> TableLoad:
+    load = TableLoad(
+        table_name=table_name,
+        table_id=str(job.destination if job.job_type == "load" else job.ddl_target_table),
+        job_id=job.job_id,
+        seconds=_job_seconds(job),
+        error=job.error_result["message"] if job.error_result else None,
+    )
+    if job.job_type == "load":
+        load.input_bytes = job.input_file_bytes
+        load.output_bytes = job.output_bytes
+        load.output_rows = job.output_rows
+    else:
+        load.input_bytes = job.total_bytes_processed
+    return load
+
+
+def wait_for_jobs(
+    jobs: dict[str, bigquery.LoadJob | bigquery.QueryJob],
+    poll_interval: float = LOAD_POLL_INTERVAL,
+) -> dict[str, TableLoad]:
+    """
+    Polls the jobs of each table together until all have finished, logging each
+    as it finishes. Raises RuntimeError naming the tables that failed, once all
+    have finished.
+    """
+    pending = dict(jobs)
+    loads = {}
+    while pending:
+        for table_name, job in list(pending.items()):
+            if not job.done():
+                continue
+            del pending[table_name]
+            load = _table_load(table_name, job)
+            loads[table_name] = load
+            if load.error is not None:
+                _logger.error(f"Job {job.job_id} for {load.table_id} failed: {load.error}")
+            else:
+                _logger.info(
+                    f"Job {job.job_id} for {load.table_id} done in {load.seconds}s:"
+                    f" {load.input_bytes} input bytes, {load.output_rows} rows, {load.output_bytes} bytes"
+                )
+        if pending:
+            time.sleep(poll_interval)
+
+    failed = sorted(name for name, load in loads.items() if load.error is not None)
+    if failed:
+        raise RuntimeError(f"Failed to load tables {failed}: " + "; ".join(loads[name].error for name in failed))
+    return {table_name: loads[table_name] for table_name in jobs}
+
+
+def load_tables(
+    client: bigquery.Client,
+    dataset: bigquery.Dataset,
+    source_table_paths: dict[str, str],
+    poll_interval: float = LOAD_POLL_INTERVAL,
+) -> dict[str, TableLoad]:
+    """
+    Loads the files of each table in `source_table_paths` into `dataset`,
+    replacing the tables if they exist. Returns the job of each table by table
+    name: a load, or for deduplicated tables the deduplicating query, with the
+    load of its staging table under the staging table's name.
+    """
+    started = time.monotonic()
+    staged = {}
+    load_jobs = {}
+    for table_name, source_uri in source_table_paths.items():
+        table_ref = dataset.table(table_name)
+        _, plain_copy = get_query_for_copy(dataset.table(table_name + STAGING_SUFFIX), table_ref)
+        load_name = table_name if plain_copy else table_name + STAGING_SUFFIX
+        if not plain_copy:
+            staged[table_name] = dataset.table(load_name)
+        load_jobs[load_name] = start_load_job(client, dataset, load_name, source_uri, schema_table_name=table_name)
+    try:
+        loads = wait_for_jobs(load_jobs, poll_interval=poll_interval)
+        query_jobs = {}
+        for table_name, staging_ref in staged.items():
+            query, _ = get_query_for_copy(staging_ref, dataset.table(table_name))
+            _logger.info(f"Deduplicating {staging_ref} into {table_name}")
+            query_jobs[table_name] = client.query(query)
+        loads.update(wait_for_jobs(query_jobs, poll_interval=poll_interval))
+    finally:
+        for staging_ref in staged.values():
+            client.delete_table(staging_ref, not_found_ok=True)
+
+    total_bytes = sum(loads[load_name].input_bytes or 0 for load_name in load_jobs)
+    _logger.info(
+        f"Loaded {len(source_table_paths)} tables into {dataset.dataset_id} from {total_bytes} input bytes"
+        f" in {time.monotonic() - started:.2f} seconds"
+    )
+    return loads
+
+
+def run_load_tables(
+    args: CreateExternalTablesRequest,
+    client: bigquery.Client | None = None,
+    gcs_client: storage.Client | None = None,
+) -> dict[str, TableLoad]:
+    """
+    Loads the tables of a CreateExternalTablesRequest into native tables, in a
+    dataset created in the location of the source bucket if needed.
+    """
+    if client is None:
+        client = bigquery.Client()
+    if gcs_client is None:
+        gcs_client = storage.Client()
+    env = get_env()
+
+    source_buckets = {parse_blob_uri(path.root, gcs_client).bucket.name for path in args.source_table_paths.values()}
+    if len(source_buckets) != 1:
+        raise ValueError(
+            f"All source paths must be in the same bucket. Got: [{source_buckets}]. "
+            f"source_table_paths: {args.source_table_paths}"
+        )
+    bucket_location = gcs_client.get_bucket(source_buckets.pop()).location
+
+    dataset = ensure_dataset_exists(
+        client,
+        project=env.bq_dest_project or client.project,
+        dataset_id=args.destination_dataset,
+        location=bucket_location,
+    )
+    return load_tables(client, dataset, {name: path.root for name, path in args.source_table_paths.items()})
@@ -1,19 +1,66 @@
+import base64
+import collections
+import hashlib
+import io
+import json
 import logging
+import os
 import queue
+import re
 import subprocess
 import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from io import TextIOWrapper
 from pathlib import Path, PurePath
 
+import google_crc32c
 import requests
+from google.api_core import exceptions as api_exceptions
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from google.cloud.storage.fileio import BlobReader, BlobWriter
 
 from clinvar_ingest.utils import make_progress_logger
 
 _logger = logging.getLogger("clinvar_ingest")
 
+# Number of files uploaded at once by upload_files
+UPLOAD_CONCURRENCY = int(os.environ.get("CLINVAR_INGEST_UPLOAD_CONCURRENCY", 8))
+# Files are uploaded with resumable uploads in chunks of this size, which must
+# be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.environ.get("CLINVAR_INGEST_UPLOAD_CHUNK_SIZE", 32 * 1024 * 1024))
+# Files at least this large are instead uploaded in chunks concurrently, with
+# a multipart upload
+UPLOAD_MULTIPART_THRESHOLD = int(
+    os.environ.get("CLINVAR_INGEST_UPLOAD_MULTIPART_THRESHOLD", 256 * 1024 * 1024)
+)
+
+# Number of connections http_download_ranges downloads with
+DOWNLOAD_CONNECTIONS = int(os.environ.get("CLINVAR_INGEST_DOWNLOAD_CONNECTIONS", 8))
+# Size of each byte range http_download_ranges requests
+DOWNLOAD_RANGE_SIZE = int(os.environ.get("CLINVAR_INGEST_DOWNLOAD_RANGE_SIZE", 64 * 1024 * 1024))
+# Size of the reads from each response. A failed range is resumed from the
+# last complete read.
+DOWNLOAD_READ_SIZE = 64 * 1024
+
+# Size of each ranged read of PrefetchingBlobReader
+PREFETCH_CHUNK_SIZE = int(os.environ.get("CLINVAR_INGEST_PREFETCH_CHUNK_SIZE", 16 * 1024 * 1024))
+# Number of ranged reads PrefetchingBlobReader keeps in flight
+PREFETCH_DEPTH = int(os.environ.get("CLINVAR_INGEST_PREFETCH_DEPTH", 4))
+
+# Errors after which an upload is retried
+RETRYABLE_UPLOAD_ERRORS = (
+    api_exceptions.ServerError,
+    api_exceptions.TooManyRequests,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
 
 def _get_gcs_client() -> storage.Client:
     if getattr(_get_gcs_client, "client", None) is None:
@@ -47,6 +94,152 @@ def copy_file_to_bucket(
     _logger.info(f"Finished uploading {local_file_uri} to {remote_blob_uri}")
 
 
+@dataclass
+class UploadResult:
+    local_file_uri: str
+    remote_blob_uri: str
+    size: int
+    seconds: float
+    attempts: int
+
+
+def _size_connection_pool(client: storage.Client, pool_size: int):
+    """
+    Mounts an adapter on the client's session which keeps up to `pool_size`
+    connections open, so that threads sharing the client reuse connections
+    instead of opening and discarding them.
+    """
+    http = getattr(client, "_http", None)
+    if isinstance(http, requests.Session):
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        http.mount("https://", adapter)
+
+
+def _upload_file(
+    local_file_uri: str,
+    remote_blob_uri: str,
+    client: storage.Client,
+    chunk_size: int,
+    multipart_threshold: int,
+    multipart_workers: int,
+) -> int:
+    """
+    Uploads one file, returning its size. Files of at least `multipart_threshold`
+    bytes are uploaded in chunks concurrently, others with a resumable upload.
+    """
+    blob = parse_blob_uri(remote_blob_uri, client=client)
+    size = os.path.getsize(local_file_uri)
+    if size >= multipart_threshold:
+        transfer_manager.upload_chunks_concurrently(
+            local_file_uri,
+            blob,
+            chunk_size=chunk_size,
+            max_workers=multipart_workers,
+            worker_type=transfer_manager.THREAD,
+        )
+    else:
+        blob.chunk_size = chunk_size
+        # The CRC32C is computed as the file is uploaded, and the upload fails
+        # if it does not match the one GCS computed
+        blob.upload_from_filename(client=client, filename=local_file_uri, checksum="crc32c")
+    return size
+
+
+def _upload_file_with_retry(
+    local_file_uri: str,
+    remote_blob_uri: str,
+    client: storage.Client,
+    max_attempts: int,
+    retry_delay: float,
+    **upload_kwargs,
+) -> UploadResult:
+    start = time.monotonic()
+    attempt = 1
+    while True:
+        try:
+            size = _upload_file(local_file_uri, remote_blob_uri, client, **upload_kwargs)
+            break
+        except RETRYABLE_UPLOAD_ERRORS as e:
+            if attempt >= max_attempts:
+                raise
+            delay = retry_delay * 2 ** (attempt - 1)
+            _logger.warning(
+                f"Attempt {attempt} of uploading {local_file_uri} to {remote_blob_uri} failed: {e!r}. "
+                f"Retrying in {delay:.1f} seconds"
+            )
+            time.sleep(delay)
+            attempt += 1
+    return UploadResult(
+        local_file_uri=local_file_uri,
+        remote_blob_uri=remote_blob_uri,
+        size=size,
+        seconds=time.monotonic() - start,
+        attempts=attempt,
+    )
+
+
+def upload_files(
+    files: list[tuple[str, str]],
+    client: storage.Client = None,
+    concurrency: int = UPLOAD_CONCURRENCY,
+    max_attempts: int = 3,
+    retry_delay: float = 1.0,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    multipart_threshold: int = UPLOAD_MULTIPART_THRESHOLD,
+) -> list[UploadResult]:
+    """
+    Uploads each (local file, remote blob URI) pair in `files`, `concurrency`
+    files at a time on threads sharing one client.
+
+    Each upload is retried up to `max_attempts` times on server, rate limit and
+    connection errors, waiting `retry_delay` seconds, doubled after each attempt.
+    If an upload still fails, the uploads not yet started are cancelled and the
+    error is raised.
+
+    Returns the results of the uploads in the order they finished, and logs the
+    aggregate throughput.
+    """
+    if client is None:
+        client = _get_gcs_client()
+    # Large files are uploaded in parts by `concurrency` threads each, as well
+    _size_connection_pool(client, concurrency * concurrency)
+    upload_kwargs = {
+        "chunk_size": chunk_size,
+        "multipart_threshold": multipart_threshold,
+        "multipart_workers": concurrency,
+    }
+
+    _logger.info(f"Uploading {len(files)} files with concurrency {concurrency}")
+    start = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                _upload_file_with_retry, local, remote, client, max_attempts, retry_delay, **upload_kwargs
+            ): local
+            for local, remote in files
+        }
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                _logger.info(
+                    f"Uploaded {result.local_file_uri} to {result.remote_blob_uri} "
+                    f"({result.size} bytes in {result.seconds:.2f} seconds)"
+                )
+                results.append(result)
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    elapsed = time.monotonic() - start
+    total_bytes = sum(r.size for r in results)
+    _logger.info(
+        f"Uploaded {len(results)} files, {total_bytes} bytes in {elapsed:.2f} seconds "
+        f"({total_bytes / max(elapsed, 1e-9) / 1024 / 1024:.2f} MiB/s)"
+    )
+    return results
+
+
 def blob_writer(
     blob_uri: str, client: storage.Client = None, binary=True
 ) -> BlobWriter | TextIOWrapper:
@@ -71,6 +264,87 @@ def blob_reader(
     return blob.open("rb" if binary else "r")
 
 
+class PrefetchingBlobReader(io.RawIOBase):
+    """
+    Reads a blob with ranged reads of `chunk_size` bytes, keeping `depth` of them
+    in flight ahead of the reader on background threads, so that GCS round trips
+    overlap with the reader's processing of the bytes it already has.
+
+    The generation of the blob when it is opened is read, so a blob replaced
+    while it is being read fails rather than mixing versions.
+    """
+
+    def __init__(self, blob: storage.Blob, chunk_size: int = PREFETCH_CHUNK_SIZE, depth: int = PREFETCH_DEPTH):
+        super().__init__()
+        blob.reload()
+        self.blob = blob
+        self.name = f"gs://{blob.bucket.name}/{blob.name}"
+        self.size = blob.size
+        self.generation = blob.generation
+        self.chunk_size = chunk_size
+        self.depth = depth
+        self._executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="gcs-prefetch")
+        self._pending = collections.deque()
+        self._next_start = 0
+        self._chunk = memoryview(b"")
+        self._position = 0
+        self._prefetch()
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        # Raw, so the bytes are as stored, as in blob.size
+        data = self.blob.download_as_bytes(
+            start=start, end=end, raw_download=True, if_generation_match=self.generation, checksum=None
+        )
+        if len(data) != end - start + 1:
+            raise RuntimeError(f"Requested bytes {start}-{end} of {self.name}, got {len(data)} bytes")
+        return data
+
+    def _prefetch(self):
+        while len(self._pending) < self.depth and self._next_start < self.size:
+            end = min(self._next_start + self.chunk_size, self.size) - 1
+            self._pending.append(self._executor.submit(self._fetch, self._next_start, end))
+            self._next_start = end + 1
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._chunk:
+            if not self._pending:
+                return 0
+            self._chunk = memoryview(self._pending.popleft().result())
+            self._prefetch()
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        self._position += n
+        return n
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+
+def prefetching_blob_reader(
+    blob_uri: str,
+    client: storage.Client = None,
+    chunk_size: int = PREFETCH_CHUNK_SIZE,
+    depth: int = PREFETCH_DEPTH,
+) -> PrefetchingBlobReader:
+    """
+    Returns a binary file-like object reading the blob at `blob_uri` ahead of
+    the caller. See `PrefetchingBlobReader`.
+    """
+    if client is None:
+        client = _get_gcs_client()
+    blob = parse_blob_uri(blob_uri, client=client)
+    return PrefetchingBlobReader(blob, chunk_size=chunk_size, depth=depth)
+
+
 def blob_size(blob_uri: str, client: storage.Client = None) -> int:
     """
     Returns the size of the blob in bytes if it exists. Raises an error if it does not.
@@ -82,18 +356,33 @@ def blob_size(blob_uri: str, client: storage.Client = None) -> int:
     return blob.size
 
 
+def blob_checksums(blob: storage.Blob) -> tuple[str | None, str | None]:
+    """
+    Returns the hex MD5 and CRC32C digests GCS computed of `blob`, from its
+    loaded metadata. Composite objects have no MD5.
+    """
+    md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+    crc32c = base64.b64decode(blob.crc32c).hex() if blob.crc32c else None
+    return md5, crc32c
+
+
 def http_download_requests(
     http_uri: str,
     local_path: PurePath,
     file_size: int,
     chunk_size=8 * 1024 * 1024,
+    expected_md5: str | None = None,
 ):
     """
     Download the contents of `http_uri` to `local_path` using requests.get
+
+    The MD5 of the file is computed as it is downloaded, and if `expected_md5`
+    is given and does not match, the file is deleted and an error raised.
     """
     _logger.info(f"Downloading {http_uri} to {local_path}")
 
     bytes_read = 0
+    checksums = StreamChecksums()
     response = requests.get(http_uri, stream=True, timeout=10)
     response.raise_for_status()
     opened_file_size = int(response.headers.get("Content-Length"))
@@ -117,6 +406,7 @@ def http_download_requests(
 
             if len(chunk) > 0:
                 f_out.write(chunk)
+                checksums.update(chunk)
 
             if len(chunk) == 0:
                 wait_time = 10
@@ -125,9 +415,287 @@ def http_download_requests(
                 )
                 time.sleep(wait_time)
 
+    if expected_md5 is not None:
+        if checksums.md5 != expected_md5:
+            Path(local_path).unlink()
+            raise RuntimeError(f"MD5 mismatch for {local_path}. Expected {expected_md5} but got {checksums.md5}.")
+        _logger.info(f"Verified MD5 of {local_path}: {checksums.md5}")
     return Path(local_path)
 
 
+def _http_validator(headers) -> str | None:
+    """
+    Returns the strong ETag, or else the Last-Modified date, from response
+    `headers`, for use in If-Range headers.
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _read_download_state(state_path: Path, validator: str | None, file_size: int) -> set[int]:
+    """
+    Returns the start offsets of the ranges downloaded by an earlier attempt,
+    if it was of the same version of the file.
+    """
+    if validator is None or not state_path.exists():
+        return set()
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("validator") != validator or state.get("size") != file_size:
+        _logger.info(f"Not resuming from {state_path}, the source file has changed")
+        return set()
+    return set(state["done"])
+
+
+def _write_download_state(state_path: Path, validator: str | None, file_size: int, done: set[int]):
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"validator": validator, "size": file_size, "done": sorted(done)}, f)
+    tmp_path.replace(state_path)
+
+
+def _is_retryable_http_error(e: requests.exceptions.RequestException) -> bool:
+    if isinstance(e, requests.exceptions.HTTPError):
+        status_code = e.response.status_code
+        return status_code >= 500 or status_code == 429  # noqa: PLR2004
+    return True
+
+
+def _download_range(  # noqa: PLR0913
+    session: requests.Session,
+    http_uri: str,
+    write: Callable[[int, bytes], None],
+    start: int,
+    end: int,
+    validator: str | None,
+    on_bytes: Callable[[int], None],
+    timeout: float,
+    max_attempts: int,
+    retry_delay: float,
+):
+    """
+    Downloads bytes `start` to `end` inclusive of `http_uri`, calling `write`
+    with the offset and bytes of each read. A failed request is retried from
+    the last byte received.
+    """
+    offset = start
+    attempt = 1
+    while offset <= end:
+        headers = {"Range": f"bytes={offset}-{end}"}
+        if validator is not None:
+            headers["If-Range"] = validator
+        try:
+            with session.get(http_uri, headers=headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                # Servers send the whole file instead of the range if it no
+                # longer matches the validator
+                content_range = response.headers.get("Content-Range", "")
+                if response.status_code != 206 or not content_range.startswith(f"bytes {offset}-{end}/"):  # noqa: PLR2004
+                    raise RuntimeError(
+                        f"Requested bytes {offset}-{end} of {http_uri} but got status "
+                        f"{response.status_code} with Content-Range '{content_range}'. "
+                        "The file may have changed."
+                    )
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_READ_SIZE):
+                    write(offset, chunk)
+                    offset += len(chunk)
+                    on_bytes(len(chunk))
+            if offset <= end:
+                raise requests.exceptions.ConnectionError(
+                    f"Connection closed at byte {offset} of range {start}-{end}"
+                )
+        except requests.exceptions.RequestException as e:
+            if attempt >= max_attempts or not _is_retryable_http_error(e):
+                raise
+            delay = retry_delay * 2 ** (attempt - 1)
+            _logger.warning(
+                f"Attempt {attempt} of downloading bytes {start}-{end} of {http_uri} failed "
+                f"at byte {offset}: {e!r}. Retrying in {delay:.1f} seconds"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+class StreamChecksums:
+    """
+    MD5 and CRC32C of a stream of bytes, updated with each chunk as it passes
+    through. The CRC32C can be continued from the value of an earlier part of
+    the stream, but the MD5 cannot, so it is only computed when `md5` is true.
+    """
+
+    def __init__(self, crc32c: int = 0, md5: bool = True):
+        self.crc32c_value = crc32c
+        self._md5 = hashlib.md5() if md5 else None  # noqa: S324
+
+    def update(self, data: bytes):
+        self.crc32c_value = google_crc32c.extend(self.crc32c_value, data)
+        if self._md5 is not None:
+            self._md5.update(data)
+
+    @property
+    def crc32c(self) -> str:
+        return f"{self.crc32c_value:08x}"
+
+    @property
+    def md5(self) -> str | None:
+        return self._md5.hexdigest() if self._md5 is not None else None
+
+
+def file_md5(path: PurePath, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """
+    Returns the hex MD5 digest of the file at `path`.
+    """
+    md5 = hashlib.md5()  # noqa: S324
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def http_get_md5(md5_uri: str) -> str | None:
+    """
+    Returns the digest in the checksum file at `md5_uri`, such as the `.md5`
+    files published alongside ClinVar releases, or None if it does not exist.
+    """
+    response = requests.get(md5_uri, timeout=10)
+    if response.status_code == 404:  # noqa: PLR2004
+        return None
+    response.raise_for_status()
+    match = re.search(r"\b[0-9a-fA-F]{32}\b", response.text)
+    if match is None:
+        raise ValueError(f"No MD5 digest in {md5_uri}: {response.text[:100]!r}")
+    return match.group(0).lower()
+
+
+def http_download_ranges(  # noqa: PLR0913
+    http_uri: str,
+    local_path: PurePath,
+    file_size: int,
+    expected_md5: str | None = None,
+    connections: int = DOWNLOAD_CONNECTIONS,
+    range_size: int = DOWNLOAD_RANGE_SIZE,
+    timeout: float = 60,
+    max_attempts: int = 5,
+    retry_delay: float = 1.0,
+) -> Path:
+    """
+    Download the contents of `http_uri` to `local_path` with HTTP Range requests
+    of `range_size` bytes, over `connections` connections at once.
+
+    Failed requests are retried from the last byte received. The ranges which
+    have been downloaded are recorded in `<local_path>.ranges.json`, so that
+    when a download fails, calling this again resumes it, as long as the source
+    file has the same ETag or Last-Modified date. Each range is requested with
+    an If-Range header, so if the file changes during the download it fails
+    rather than mixing versions.
+
+    The file is verified against `file_size`, and `expected_md5` if given.
+    Falls back to `http_download_requests` if the server does not support ranges.
+    """
+    head = requests.head(http_uri, allow_redirects=True, timeout=timeout)
+    head.raise_for_status()
+    content_length = int(head.headers.get("Content-Length", -1))
+    if content_length != file_size:
+        raise RuntimeError(f"File size mismatch. Expected {file_size} but got {content_length}.")
+    ranged = head.headers.get("Accept-Ranges") == "bytes"
+    if not ranged:
+        _logger.info(f"{http_uri} does not support range requests, downloading over one connection")
+        # The MD5 is verified as the file is downloaded
+        local_path = http_download_requests(http_uri, local_path, file_size, expected_md5=expected_md5)
+    else:
+        _download_ranges(
+            head.url,
+            Path(local_path),
+            file_size,
+            _http_validator(head.headers),
+            connections=connections,
+            range_size=range_size,
+            timeout=timeout,
+            max_attempts=max_attempts,
+            retry_delay=retry_delay,
+        )
+
+    local_path = Path(local_path)
+    if local_path.stat().st_size != file_size:
+        raise RuntimeError(
+            f"File size mismatch. Expected {file_size} but got {local_path.stat().st_size}."
+        )
+    # Ranges are written out of order, so their MD5 is computed once they all are
+    if expected_md5 is not None and ranged:
+        actual_md5 = file_md5(local_path)
+        if actual_md5 != expected_md5:
+            local_path.unlink()
+            raise RuntimeError(f"MD5 mismatch for {local_path}. Expected {expected_md5} but got {actual_md5}.")
+        _logger.info(f"Verified MD5 of {local_path}: {actual_md5}")
+    return local_path
+
+
+def _download_ranges(
+    http_uri: str,
+    local_path: Path,
+    file_size: int,
+    validator: str | None,
+    connections: int,
+    range_size: int,
+    **range_kwargs,
+):
+    state_path = local_path.with_name(local_path.name + ".ranges.json")
+    done = _read_download_state(state_path, validator, file_size)
+    starts = [start for start in range(0, file_size, range_size) if start not in done]
+    _logger.info(
+        f"Downloading {http_uri} to {local_path} in {len(starts)} ranges over {connections} connections. "
+        f"{len(done)} ranges were already downloaded."
+    )
+
+    lock = threading.Lock()
+    bytes_read = sum(min(range_size, file_size - start) for start in done)
+    log_progress = make_progress_logger(
+        logger=_logger,
+        fmt="Read {elapsed_value} bytes in {elapsed:.2f} seconds. Total bytes read: {current_value}/{max_value}.",
+        max_value=file_size,
+    )
+    log_progress(bytes_read)
+
+    def on_bytes(n: int):
+        nonlocal bytes_read
+        with lock:
+            bytes_read += n
+            log_progress(bytes_read)
+
+    # requests Sessions are not thread safe, so each thread has its own
+    sessions = threading.local()
+
+    def download(start: int):
+        if getattr(sessions, "session", None) is None:
+            sessions.session = requests.Session()
+        end = min(start + range_size, file_size) - 1
+        _download_range(sessions.session, http_uri, write, start, end, validator, on_bytes, **range_kwargs)
+        with lock:
+            done.add(start)
+            _write_download_state(state_path, validator, file_size, done)
+
+    def write(offset: int, data: bytes):
+        os.pwrite(fd, data, offset)
+
+    fd = os.open(local_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, file_size)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [executor.submit(download, start) for start in starts]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+    finally:
+        os.close(fd)
+    log_progress(bytes_read, force=True)
+    state_path.unlink(missing_ok=True)
+
+
 def http_download_curl(
     http_uri: str,
     local_path: PurePath,
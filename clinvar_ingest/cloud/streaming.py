@@ -0,0 +1,772 @@
+"""
+Copies a file from an HTTP server or GCS bucket to a GCS blob without staging it
+on local disk.
+
+The source is read in chunks into a fixed pool of buffers by one thread while
+another uploads the filled buffers to a GCS resumable upload session, so reading
+and uploading overlap and memory use is bounded by the size of the pool. HTTP
+sources which support Range requests are read into several buffers at once,
+each over its own connection, as a single connection to the FTP server is
+slower than the upload.
+
+Progress is checkpointed to a JSON file, so that when a copy fails, calling
+`stream_copy` again with the same checkpoint continues the upload session from
+the last byte GCS has persisted, re-reading the source from that offset.
+
+The MD5 and CRC32C of the source are computed as it is read, and compared with
+those GCS computed of the uploaded blob and with any published checksum of the
+source, so a corrupt copy fails the copy rather than a later step.
+
+Copies to a storage backend standing in for GCS, see `clinvar_ingest.storage`,
+are written through the backend instead, without checkpoints.
+
+`stream_copy_and_parse` also parses the file from the same stream as it is
+copied, instead of reading it again after the copy.
+"""
+
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import PurePosixPath
+from typing import Any, BinaryIO
+
+import requests
+import urllib3
+from google.api_core import exceptions as api_exceptions
+from google.cloud import storage
+
+from clinvar_ingest.cloud.gcs import (
+    StreamChecksums,
+    _download_range,
+    _get_gcs_client,
+    _http_validator,
+    blob_checksums,
+    parse_blob_uri,
+)
+from clinvar_ingest.fs import BinaryOpenMode, ChunkPipe, fs_open
+from clinvar_ingest.storage import GCSBackend, get_backend
+from clinvar_ingest.utils import make_progress_logger
+
+_logger = logging.getLogger("clinvar_ingest")
+
+# Size of each chunk read from the source and uploaded. Must be a multiple of
+# 256 KiB, which GCS requires of all but the last chunk of a resumable upload.
+COPY_CHUNK_SIZE = int(os.environ.get("CLINVAR_INGEST_COPY_CHUNK_SIZE", 16 * 1024 * 1024))
+# Number of chunk buffers shared by the reading and uploading threads
+COPY_BUFFERS = int(os.environ.get("CLINVAR_INGEST_COPY_BUFFERS", 4))
+# Number of chunks read at once from an HTTP source with Range requests, at
+# most the number of buffers
+COPY_CONNECTIONS = int(os.environ.get("CLINVAR_INGEST_COPY_CONNECTIONS", 4))
+# Bytes uploaded between checkpoints
+CHECKPOINT_INTERVAL = 256 * 1024 * 1024
+
+UPLOAD_CHUNK_ALIGNMENT = 256 * 1024
+
+# Errors after which reading the source is retried from the same offset
+SOURCE_READ_ERRORS = (
+    requests.exceptions.RequestException,
+    urllib3.exceptions.HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# HTTP status of a resumable upload chunk which was persisted, when the upload is incomplete
+RESUME_INCOMPLETE = 308
+
+
+@dataclass
+class CopyCheckpoint:
+    source_uri: str
+    destination_uri: str
+    size: int
+    session_url: str
+    # ETag or Last-Modified date of an HTTP source, or generation of a GCS source
+    source_validator: str | None
+    # Bytes uploaded
+    offset: int = 0
+    # CRC32C of the bytes uploaded
+    crc32c: int = 0
+
+
+@dataclass
+class StreamCopyResult:
+    source_uri: str
+    destination_uri: str
+    size: int
+    seconds: float
+    # Offset the copy was resumed from, 0 if it was not resumed
+    resumed_from: int
+    # Hex digests of the copied bytes, verified against those GCS computed
+    crc32c: str | None = None
+    md5: str | None = None
+
+
+def _read_checkpoint(checkpoint_uri: str) -> CopyCheckpoint | None:
+    if checkpoint_uri.startswith("gs://"):
+        blob = parse_blob_uri(checkpoint_uri)
+        if not blob.exists():
+            return None
+        text = blob.download_as_text()
+    else:
+        if not os.path.exists(checkpoint_uri):
+            return None
+        with open(checkpoint_uri, encoding="utf-8") as f:
+            text = f.read()
+    return CopyCheckpoint(**json.loads(text))
+
+
+def _write_checkpoint(checkpoint_uri: str, checkpoint: CopyCheckpoint):
+    text = json.dumps(asdict(checkpoint))
+    if checkpoint_uri.startswith("gs://"):
+        parse_blob_uri(checkpoint_uri).upload_from_string(text, content_type="application/json")
+    else:
+        with fs_open(checkpoint_uri, mode=BinaryOpenMode.WRITE) as f:
+            f.write(text.encode("utf-8"))
+
+
+def _delete_checkpoint(checkpoint_uri: str):
+    if checkpoint_uri.startswith("gs://"):
+        blob = parse_blob_uri(checkpoint_uri)
+        if blob.exists():
+            blob.delete()
+    elif os.path.exists(checkpoint_uri):
+        os.remove(checkpoint_uri)
+
+
+def _source_info(source_uri: str) -> tuple[str | None, bool]:
+    """
+    Returns the validator of the current version of `source_uri`, and whether
+    it can be read with Range requests.
+    """
+    if source_uri.startswith("gs://"):
+        blob = parse_blob_uri(source_uri)
+        blob.reload()
+        return str(blob.generation), False
+    response = requests.head(source_uri, allow_redirects=True, timeout=60)
+    response.raise_for_status()
+    return _http_validator(response.headers), response.headers.get("Accept-Ranges") == "bytes"
+
+
+def _open_source(source_uri: str, offset: int, validator: str | None, chunk_size: int) -> BinaryIO:
+    """
+    Returns a file-like object reading `source_uri` from byte `offset`, which
+    fails if the source no longer matches `validator`.
+    """
+    if source_uri.startswith("gs://"):
+        blob = parse_blob_uri(source_uri)
+        kwargs = {"if_generation_match": int(validator)} if validator is not None else {}
+        f = blob.open("rb", chunk_size=chunk_size, **kwargs)
+        f.seek(offset)
+        return f
+
+    # The bytes are copied as they are, without decoding any transfer compression
+    headers = {"Accept-Encoding": "identity"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        if validator is not None:
+            headers["If-Range"] = validator
+    response = requests.get(source_uri, headers=headers, stream=True, timeout=60)
+    response.raise_for_status()
+    if offset > 0 and (
+        response.status_code != 206  # noqa: PLR2004
+        or not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+    ):
+        response.close()
+        raise RuntimeError(
+            f"Could not resume reading {source_uri} from byte {offset}, "
+            f"got status {response.status_code}. The file may have changed."
+        )
+    return response.raw
+
+
+def _read_full(f: BinaryIO, buf: memoryview) -> int:
+    """
+    Reads from `f` until `buf` is full or `f` is exhausted. Returns the number of bytes read.
+    """
+    n = 0
+    while n < len(buf):
+        data = f.read(len(buf) - n)
+        if not data:
+            break
+        buf[n : n + len(data)] = data
+        n += len(data)
+    return n
+
+
+def _create_upload_session(destination_uri: str, size: int, client: storage.Client) -> str:
+    blob = parse_blob_uri(destination_uri, client=client)
+    return blob.create_resumable_upload_session(size=size, client=client)
+
+
+def _verify_copy(
+    blob_uri: str, checksums: StreamChecksums, expected_md5: str | None, client: storage.Client
+) -> tuple[str, str | None]:
+    """
+    Compares the checksums computed as the source was read with those GCS
+    computed of the blob at `blob_uri`, and with `expected_md5` if given.
+    Deletes the blob and raises an error if any differ. Returns the hex CRC32C
+    and MD5 of the blob.
+    """
+    blob = parse_blob_uri(blob_uri, client=client)
+    blob.reload()
+    blob_md5, blob_crc32c = blob_checksums(blob)
+    # The MD5 of a resumed copy is not computed, but GCS computes it of the
+    # whole blob, which matches the source when the CRC32C does
+    md5 = checksums.md5 or blob_md5
+    mismatches = []
+    if blob_crc32c != checksums.crc32c:
+        mismatches.append(f"CRC32C of source {checksums.crc32c}, of blob {blob_crc32c}")
+    if checksums.md5 is not None and blob_md5 is not None and blob_md5 != checksums.md5:
+        mismatches.append(f"MD5 of source {checksums.md5}, of blob {blob_md5}")
+    if expected_md5 is not None and md5 != expected_md5:
+        mismatches.append(f"MD5 expected {expected_md5}, of copy {md5}")
+    if mismatches:
+        blob.delete()
+        raise RuntimeError(f"Checksum mismatch for {blob_uri}, deleted it. {'. '.join(mismatches)}.")
+    _logger.info(f"Verified checksums of {blob_uri}: CRC32C {checksums.crc32c}, MD5 {md5}")
+    return checksums.crc32c, md5
+
+
+def existing_copy_checksums(
+    source_uri: str,
+    destination_uri: str,
+    size: int,
+    expected_md5: str | None = None,
+    client: storage.Client = None,
+) -> tuple[str | None, str | None] | None:
+    """
+    Returns the hex CRC32C and MD5 of the blob `destination_uri` if it is a
+    complete copy of `source_uri`, or else None. Its size must be `size`, its
+    MD5 `expected_md5` if given, and if the source is a GCS blob, its CRC32C
+    that of the source.
+    """
+    backend = get_backend(destination_uri)
+    if not isinstance(backend, GCSBackend):
+        if not backend.exists(destination_uri):
+            return None
+        checksums = StreamChecksums()
+        with backend.open_read(destination_uri) as f:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                checksums.update(chunk)
+        blob_size, crc32c, md5 = backend.size(destination_uri), checksums.crc32c, checksums.md5
+    else:
+        blob = parse_blob_uri(destination_uri, client=client)
+        try:
+            blob.reload()
+        except api_exceptions.NotFound:
+            return None
+        blob_size = blob.size
+        md5, crc32c = blob_checksums(blob)
+    mismatches = []
+    if blob_size != size:
+        mismatches.append(f"size {blob_size}, expected {size}")
+    if expected_md5 is not None and md5 != expected_md5:
+        mismatches.append(f"MD5 {md5}, expected {expected_md5}")
+    if source_uri.startswith("gs://") and isinstance(backend, GCSBackend):
+        source_blob = parse_blob_uri(source_uri, client=client)
+        source_blob.reload()
+        _, source_crc32c = blob_checksums(source_blob)
+        if crc32c != source_crc32c:
+            mismatches.append(f"CRC32C {crc32c}, expected {source_crc32c}")
+    if mismatches:
+        _logger.info(f"{destination_uri} is not a copy of {source_uri}: {', '.join(mismatches)}")
+        return None
+    return crc32c, md5
+
+
+def _persisted_offset(response: requests.Response) -> int:
+    # Range is absent when no bytes have been persisted
+    persisted = response.headers.get("Range")
+    return int(persisted.split("-")[1]) + 1 if persisted else 0
+
+
+class _ResumableUpload:
+    """
+    Uploads chunks to a GCS resumable upload session, following the protocol in
+    https://cloud.google.com/storage/docs/performing-resumable-uploads
+    """
+
+    def __init__(self, session: requests.Session, session_url: str, size: int, max_attempts: int, retry_delay: float):
+        self.session = session
+        self.session_url = session_url
+        self.size = size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Bytes GCS had persisted when the upload was resumed
+        self.persisted = 0
+
+    def query_offset(self) -> int:
+        """
+        Returns the number of bytes persisted by GCS. Returns `size` if the
+        upload is complete.
+        """
+        response = self.session.put(
+            self.session_url, headers={"Content-Range": f"bytes */{self.size}"}, timeout=60
+        )
+        if response.status_code in (200, 201):
+            return self.size
+        if response.status_code != RESUME_INCOMPLETE:
+            response.raise_for_status()
+        return _persisted_offset(response)
+
+    def put(self, offset: int, data: memoryview) -> int:
+        """
+        Uploads `data` to the session starting at byte `offset`. Returns the new
+        number of bytes persisted. Failed requests are retried from the last
+        byte GCS persisted.
+        """
+        end = offset + len(data)
+        # A resumed upload may have persisted part of the source after the checkpoint
+        if end <= self.persisted:
+            return end
+        if offset < self.persisted:
+            data = data[self.persisted - offset :]
+            offset = self.persisted
+        attempt = 1
+        while offset < end:
+            try:
+                response = self.session.put(
+                    self.session_url,
+                    data=bytes(data[len(data) - (end - offset) :]),
+                    headers={"Content-Range": f"bytes {offset}-{end - 1}/{self.size}"},
+                    timeout=120,
+                )
+                if response.status_code in (200, 201):
+                    return self.size
+                if response.status_code != RESUME_INCOMPLETE:
+                    response.raise_for_status()
+                offset = _persisted_offset(response)
+            except requests.exceptions.RequestException as e:
+                if attempt >= self.max_attempts:
+                    raise
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                _logger.warning(
+                    f"Attempt {attempt} of uploading bytes {offset}-{end - 1} failed: {e!r}. "
+                    f"Retrying in {delay:.1f} seconds"
+                )
+                time.sleep(delay)
+                attempt += 1
+                offset = self.query_offset()
+        return offset
+
+
+class _SourceReader(threading.Thread):
+    """
+    Reads `source_uri` from byte `offset` into buffers taken from `free`, and
+    puts (offset, buffer, length, crc32c) tuples on `filled`, followed by None
+    at the end of the source, or the exception which stopped it. `checksums`
+    is updated with each buffer, and crc32c is its CRC32C value after it.
+
+    With more than one of `connections`, buffers are filled at once with Range
+    requests, see `gcs._download_range`, and put on `filled` in order. Otherwise
+    the source is read over one connection, and failed reads are retried by
+    reopening the source at the start of the buffer.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        source_uri: str,
+        offset: int,
+        size: int,
+        validator: str | None,
+        checksums: StreamChecksums,
+        free: queue.Queue,
+        filled: queue.Queue,
+        chunk_size: int,
+        max_attempts: int,
+        retry_delay: float,
+        connections: int = 1,
+    ):
+        super().__init__(name="stream-copy-reader", daemon=True)
+        self.source_uri = source_uri
+        self.offset = offset
+        self.size = size
+        self.validator = validator
+        self.checksums = checksums
+        self.free = free
+        self.filled = filled
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.connections = connections
+        self.stop = threading.Event()
+        self.f = None
+        # requests Sessions are not thread safe, so each range thread has its own
+        self._sessions = threading.local()
+
+    def run(self):
+        try:
+            if self.connections > 1:
+                self._read_ranges()
+            else:
+                self._read_stream()
+        except BaseException as e:  # noqa: BLE001
+            self.filled.put(e)
+        finally:
+            if self.f is not None:
+                self.f.close()
+
+    def _put_filled(self, buf: bytearray, n: int):
+        # Hashed on this thread, so it overlaps with uploading the previous buffer
+        self.checksums.update(bytes(memoryview(buf)[:n]))
+        self.filled.put((self.offset, buf, n, self.checksums.crc32c_value))
+        self.offset += n
+
+    def _read_stream(self):
+        while self.offset < self.size:
+            buf = self.free.get()
+            if self.stop.is_set():
+                return
+            view = memoryview(buf)[: min(self.chunk_size, self.size - self.offset)]
+            n = self._read_with_retry(view)
+            if n == 0:
+                raise RuntimeError(f"{self.source_uri} ended at byte {self.offset}, expected {self.size} bytes")
+            self._put_filled(buf, n)
+        self.filled.put(None)
+
+    def _read_ranges(self):
+        # (offset, buffer, length, future) of each range being read, in order
+        pending = collections.deque()
+        next_offset = self.offset
+        executor = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="stream-copy-range")
+        try:
+            while self.offset < self.size:
+                # Starts a range for each free buffer, only waiting for one if none are being read
+                while next_offset < self.size and len(pending) < self.connections:
+                    try:
+                        buf = self.free.get(block=not pending)
+                    except queue.Empty:
+                        break
+                    if self.stop.is_set():
+                        return
+                    n = min(self.chunk_size, self.size - next_offset)
+                    pending.append((next_offset, buf, n, executor.submit(self._read_range, buf, next_offset, n)))
+                    next_offset += n
+                _, buf, n, future = pending.popleft()
+                future.result()
+                self._put_filled(buf, n)
+            self.filled.put(None)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _read_range(self, buf: bytearray, start: int, n: int):
+        if getattr(self._sessions, "session", None) is None:
+            self._sessions.session = requests.Session()
+        view = memoryview(buf)
+
+        def write(offset: int, data: bytes):
+            view[offset - start : offset - start + len(data)] = data
+
+        _download_range(
+            self._sessions.session,
+            self.source_uri,
+            write,
+            start,
+            start + n - 1,
+            self.validator,
+            on_bytes=lambda _n: None,
+            timeout=60,
+            max_attempts=self.max_attempts,
+            retry_delay=self.retry_delay,
+        )
+
+    def _read_with_retry(self, view: memoryview) -> int:
+        attempt = 1
+        while True:
+            try:
+                if self.f is None:
+                    self.f = _open_source(self.source_uri, self.offset, self.validator, self.chunk_size)
+                return _read_full(self.f, view)
+            except SOURCE_READ_ERRORS as e:
+                if self.f is not None:
+                    self.f.close()
+                    self.f = None
+                if attempt >= self.max_attempts:
+                    raise
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                _logger.warning(
+                    f"Attempt {attempt} of reading {self.source_uri} failed at byte {self.offset}: {e!r}. "
+                    f"Retrying in {delay:.1f} seconds"
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def close(self):
+        self.stop.set()
+        # Unblock the reader if it is waiting for a buffer
+        self.free.put(bytearray(0))
+        self.join()
+
+
+def _start_upload(  # noqa: PLR0913
+    source_uri: str,
+    destination_uri: str,
+    size: int,
+    validator: str | None,
+    checkpoint_uri: str | None,
+    client: storage.Client,
+    max_attempts: int,
+    retry_delay: float,
+) -> tuple[CopyCheckpoint, _ResumableUpload]:
+    """
+    Returns the checkpoint and upload session to continue from `checkpoint_uri`
+    if it is of the same copy, or else of a new upload session.
+    """
+    checkpoint = _read_checkpoint(checkpoint_uri) if checkpoint_uri else None
+    if checkpoint is not None:
+        if (checkpoint.source_uri, checkpoint.destination_uri, checkpoint.size, checkpoint.source_validator) == (
+            source_uri,
+            destination_uri,
+            size,
+            validator,
+        ):
+            upload = _ResumableUpload(client._http, checkpoint.session_url, size, max_attempts, retry_delay)
+            try:
+                # The source is re-read from the checkpoint, to continue its
+                # checksums, but only bytes GCS has not persisted are uploaded
+                upload.persisted = upload.query_offset()
+                _logger.info(f"Resuming copy of {source_uri} to {destination_uri} from byte {checkpoint.offset}")
+                return checkpoint, upload
+            except requests.exceptions.HTTPError as e:
+                # Sessions expire after a week
+                _logger.info(f"Not resuming from checkpoint {checkpoint_uri}, its upload session has expired: {e!r}")
+        else:
+            _logger.info(f"Not resuming from checkpoint {checkpoint_uri}, it is for a different copy or source version")
+
+    session_url = _create_upload_session(destination_uri, size, client)
+    checkpoint = CopyCheckpoint(source_uri, destination_uri, size, session_url, validator)
+    if checkpoint_uri:
+        _write_checkpoint(checkpoint_uri, checkpoint)
+    return checkpoint, _ResumableUpload(client._http, session_url, size, max_attempts, retry_delay)
+
+
+def _copy_to_backend(
+    source_uri: str,
+    destination_uri: str,
+    size: int,
+    chunk_size: int,
+    on_chunk: Callable[[int, memoryview], None] | None,
+    expected_md5: str | None,
+) -> StreamCopyResult:
+    """
+    Copies `source_uri` to `destination_uri` through its storage backend, for
+    destinations other than GCS.
+    """
+    backend = get_backend(destination_uri)
+    checksums = StreamChecksums()
+    start_time = time.monotonic()
+    offset = 0
+    if source_uri.startswith(("http://", "https://")):
+        source = _open_source(source_uri, 0, None, chunk_size)
+    else:
+        source = get_backend(source_uri).open_read(source_uri, prefetch=True)
+    with source, backend.open_write(destination_uri) as f_out:
+        buf = bytearray(chunk_size)
+        while n := _read_full(source, memoryview(buf)):
+            chunk = memoryview(buf)[:n]
+            checksums.update(bytes(chunk))
+            f_out.write(chunk)
+            if on_chunk is not None:
+                on_chunk(offset, chunk)
+            offset += n
+    mismatches = []
+    if offset != size:
+        mismatches.append(f"copied {offset} bytes, expected {size}")
+    if expected_md5 is not None and checksums.md5 != expected_md5:
+        mismatches.append(f"MD5 expected {expected_md5}, of copy {checksums.md5}")
+    if mismatches:
+        backend.delete(destination_uri)
+        raise RuntimeError(
+            f"Copy of {source_uri} to {destination_uri} failed verification, deleted it. {'. '.join(mismatches)}."
+        )
+    seconds = time.monotonic() - start_time
+    _logger.info(f"Copied {source_uri} to {destination_uri}: {size} bytes in {seconds:.2f} seconds")
+    return StreamCopyResult(
+        source_uri, destination_uri, size, seconds, 0, crc32c=checksums.crc32c, md5=checksums.md5
+    )
+
+
+def stream_copy(  # noqa: PLR0912, PLR0913
+    source_uri: str,
+    destination_uri: str,
+    size: int,
+    checkpoint_uri: str | None = None,
+    client: storage.Client = None,
+    chunk_size: int = COPY_CHUNK_SIZE,
+    buffers: int = COPY_BUFFERS,
+    connections: int = COPY_CONNECTIONS,
+    max_attempts: int = 5,
+    retry_delay: float = 1.0,
+    on_chunk: Callable[[int, memoryview], None] | None = None,
+    expected_md5: str | None = None,
+) -> StreamCopyResult:
+    """
+    Copies `size` bytes from `source_uri`, an http(s):// or gs:// URI, to the
+    GCS blob `destination_uri`.
+
+    If `checkpoint_uri` (a local path or gs:// URI) is given, progress is
+    checkpointed there, and a copy of the same source and destination in an
+    existing checkpoint is resumed. The checkpoint is deleted once the copy
+    succeeds.
+
+    An HTTP source which supports Range requests is read `connections` chunks
+    at a time, up to the number of `buffers`.
+
+    `on_chunk`, if given, is called on the uploading thread with the offset and
+    bytes of each chunk of the source after it is uploaded. The bytes are only
+    valid during the call.
+
+    The CRC32C and MD5 of the source are computed as it is read, and compared
+    with those GCS computed of the uploaded blob, and with `expected_md5` if
+    given. If any differ, the blob is deleted and an error raised. The MD5 of a
+    resumed copy is not computed, but taken from GCS once the CRC32C matches.
+
+    If gs:// URIs are redirected to a stand-in for GCS, the copy is written
+    through its storage backend, and `checkpoint_uri` is ignored.
+    """
+    if chunk_size % UPLOAD_CHUNK_ALIGNMENT != 0:
+        raise ValueError(f"chunk_size must be a multiple of {UPLOAD_CHUNK_ALIGNMENT}")
+    if not isinstance(get_backend(destination_uri), GCSBackend):
+        return _copy_to_backend(source_uri, destination_uri, size, chunk_size, on_chunk, expected_md5)
+    if client is None:
+        client = _get_gcs_client()
+
+    validator, ranged = _source_info(source_uri)
+    checkpoint, upload = _start_upload(
+        source_uri, destination_uri, size, validator, checkpoint_uri, client, max_attempts, retry_delay
+    )
+    resumed_from = checkpoint.offset
+    checksums = StreamChecksums(crc32c=checkpoint.crc32c, md5=resumed_from == 0)
+    start_time = time.monotonic()
+    log_progress = make_progress_logger(
+        logger=_logger,
+        fmt="Copied {elapsed_value} bytes in {elapsed:.2f} seconds. Total bytes copied: {current_value}/{max_value}.",
+        max_value=size,
+    )
+    log_progress(resumed_from)
+
+    # Buffers cycle from `free` to the reader, through `filled` to the uploader
+    # and back to `free`
+    free = queue.Queue()
+    for _ in range(buffers):
+        free.put(bytearray(chunk_size))
+    filled = queue.Queue()
+    reader = _SourceReader(
+        source_uri,
+        resumed_from,
+        size,
+        validator,
+        checksums,
+        free,
+        filled,
+        chunk_size,
+        max_attempts,
+        retry_delay,
+        connections=min(connections, buffers) if ranged else 1,
+    )
+    reader.start()
+    last_checkpoint = resumed_from
+    try:
+        while (item := filled.get()) is not None:
+            if isinstance(item, BaseException):
+                raise item
+            offset, buf, n, crc32c = item
+            chunk = memoryview(buf)[:n]
+            checkpoint.offset = upload.put(offset, chunk)
+            checkpoint.crc32c = crc32c
+            if on_chunk is not None:
+                on_chunk(offset, chunk)
+            free.put(buf)
+            log_progress(checkpoint.offset)
+            if checkpoint_uri and checkpoint.offset - last_checkpoint >= CHECKPOINT_INTERVAL:
+                _write_checkpoint(checkpoint_uri, checkpoint)
+                last_checkpoint = checkpoint.offset
+    except BaseException:
+        if checkpoint_uri:
+            _write_checkpoint(checkpoint_uri, checkpoint)
+        raise
+    finally:
+        reader.close()
+
+    if checkpoint.offset != size:
+        raise RuntimeError(f"Copied {checkpoint.offset} bytes of {source_uri}, expected {size}")
+    log_progress(size, force=True)
+    # The upload session is complete, so a failed verification starts the copy over
+    if checkpoint_uri:
+        _delete_checkpoint(checkpoint_uri)
+    crc32c, md5 = _verify_copy(destination_uri, checksums, expected_md5, client)
+    seconds = time.monotonic() - start_time
+    _logger.info(f"Copied {source_uri} to {destination_uri}: {size - resumed_from} bytes in {seconds:.2f} seconds")
+    return StreamCopyResult(source_uri, destination_uri, size, seconds, resumed_from, crc32c=crc32c, md5=md5)
+
+
+def stream_copy_and_parse(
+    source_uri: str,
+    destination_uri: str,
+    size: int,
+    parse_fn: Callable[[str | ChunkPipe], Any],
+    **copy_kwargs,
+) -> tuple[StreamCopyResult, Any]:
+    """
+    Copies `source_uri` to `destination_uri` with `stream_copy`, while calling
+    `parse_fn` with a ChunkPipe of the bytes being copied, e.g. a partial of
+    `parse_and_write_files`. The copy waits for the parse when the parse falls
+    behind, so they take about as long as the slower of the two.
+
+    If the parse fails, or the copy resumes from a checkpoint partway through
+    the file, `parse_fn` is called again with `destination_uri` once the copy
+    has succeeded. If the copy fails, its error is raised.
+
+    Returns the result of the copy and of `parse_fn`.
+    """
+    pipe = ChunkPipe(PurePosixPath(source_uri).name, size)
+    next_offset = 0
+
+    def on_chunk(offset: int, chunk: memoryview):
+        nonlocal next_offset
+        if offset != next_offset:
+            if next_offset == 0:
+                pipe.end(RuntimeError(f"Copy resumed from byte {offset}, the start of the file was not streamed"))
+            return
+        pipe.put(bytes(chunk))
+        next_offset += len(chunk)
+
+    copy_outcome = {}
+
+    def copy():
+        try:
+            copy_outcome["result"] = stream_copy(source_uri, destination_uri, size, on_chunk=on_chunk, **copy_kwargs)
+            pipe.end()
+        except BaseException as e:  # noqa: BLE001
+            copy_outcome["error"] = e
+            pipe.end(e)
+
+    # The parse runs on this thread, as profiling and parse workers expect to be
+    # started from the main thread
+    copy_thread = threading.Thread(target=copy, name="stream-copy", daemon=True)
+    copy_thread.start()
+    parse_error = None
+    try:
+        parsed = parse_fn(pipe)
+    except Exception as e:  # noqa: BLE001
+        parse_error = e
+    finally:
+        pipe.close()
+    copy_thread.join()
+
+    if "error" in copy_outcome:
+        raise copy_outcome["error"]
+    if parse_error is not None:
+        _logger.warning(
+            f"Parsing {source_uri} while copying it failed. Parsing {destination_uri} instead",
+            exc_info=parse_error,
+        )
+        parsed = parse_fn(destination_uri)
+    return copy_outcome["result"], parsed
@@ -1,5 +1,11 @@
+import contextlib
 import gzip
+import io
+import mmap
 import os
+import queue
+import threading
+from collections.abc import Iterator
 from dataclasses import dataclass
 from enum import StrEnum
 from pathlib import PurePath
@@ -18,8 +24,10 @@ class BinaryOpenMode(StrEnum):
 
 def assert_mkdir(db_directory: str):
     if not os.path.exists(db_directory):
-        os.mkdir(db_directory)
-    elif not os.path.isdir(db_directory):
+        # May be created concurrently by another process writing to the same tree
+        with contextlib.suppress(FileExistsError):
+            os.mkdir(db_directory)
+    if not os.path.isdir(db_directory):
         raise OSError(f"Path exists but is not a directory!: {db_directory}")
 
 
@@ -67,6 +75,142 @@ class ReadCounter:
         return self.bytes_read
 
 
+class BlockWriter:
+    """
+    Copies writes to `f` into a reused buffer of `block_size` bytes and writes the
+    buffer through when it is full, so a compressor or upload stream gets a few
+    large writes rather than one per row. Writes of a whole block or more go
+    straight through after the buffer.
+    """
+
+    def __init__(self, f, block_size: int):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = bytearray(block_size)
+        self.view = memoryview(self.buffer)
+        self.size = 0
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, data: bytes) -> int:
+        n = len(data)
+        if self.size + n > self.block_size:
+            self.write_block()
+            if n >= self.block_size:
+                self.f.write(data)
+                return n
+        # Same length slice assignment copies into the buffer without reallocating it
+        self.buffer[self.size : self.size + n] = data
+        self.size += n
+        return n
+
+    def write_block(self):
+        if self.size:
+            self.f.write(self.view[: self.size])
+            self.size = 0
+
+    def flush(self):
+        self.write_block()
+        self.f.flush()
+
+    def close(self):
+        try:
+            self.write_block()
+        finally:
+            self.view.release()
+            self.f.close()
+
+
+class ChunkPipe(io.RawIOBase):
+    """
+    A readable stream of the chunks another thread puts on it, e.g. to parse a
+    file while it is being downloaded. At most `max_chunks` chunks are buffered,
+    after which `put` blocks until the reader catches up.
+
+    `name` is the name of the streamed file and `size` its size in bytes. The
+    first chunk is kept as `head`, from which the start of the file can be read
+    again without consuming the stream.
+
+    If the reader closes the pipe, later chunks are dropped rather than blocking
+    the writer.
+    """
+
+    def __init__(self, name: str, size: int | None = None, max_chunks: int = 4):
+        super().__init__()
+        self.name = name
+        self.size = size
+        self.head = None
+        self._queue = queue.Queue(max_chunks)
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._reader_closed = threading.Event()
+        self._head_ready = threading.Event()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._chunk:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None or isinstance(item, BaseException):
+                self._eof = True
+                if item is not None:
+                    raise item
+                return 0
+            self._chunk = memoryview(item)
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+    def put(self, chunk: bytes) -> bool:
+        """
+        Adds `chunk` to the stream. Returns False if the reader has closed the pipe.
+        """
+        if self.head is None:
+            self.head = chunk
+            self._head_ready.set()
+        return self._put(chunk)
+
+    def end(self, error: BaseException | None = None):
+        """
+        Ends the stream. If `error` is given, the reader raises it after reading
+        the chunks before it.
+        """
+        self._head_ready.set()
+        self._put(error)
+
+    def wait_head(self) -> bytes:
+        """
+        Returns the first chunk, waiting until it has been put. Returns empty
+        bytes if the stream ended without any.
+        """
+        self._head_ready.wait()
+        return self.head or b""
+
+    def _put(self, item) -> bool:
+        while not self._reader_closed.is_set():
+            try:
+                self._queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def close(self):
+        self._reader_closed.set()
+        super().close()
+
+
 def fs_open(
     filename: str, make_parents=True, mode: BinaryOpenMode = BinaryOpenMode.READ
 ):
@@ -81,3 +225,20 @@ def fs_open(
     if filename.endswith(".gz"):
         return gzip.open(filename, mode)
     return open(filename, mode=mode)  # noqa: SIM115
+
+
+def is_local_uncompressed(filename: str | ChunkPipe) -> bool:
+    """
+    True if `filename` is a local path, not a URI or stream, and is not gzipped,
+    so it can be memory-mapped.
+    """
+    return isinstance(filename, str) and "://" not in filename and not filename.endswith(".gz")
+
+
+@contextlib.contextmanager
+def mmap_open(filename: str) -> Iterator[mmap.mmap]:
+    """
+    Maps the local file `filename` into memory, read only.
+    """
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield mm
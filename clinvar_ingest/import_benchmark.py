@@ -0,0 +1,204 @@
+"""
+Benchmarks of the import time of each entry point, with `python -X importtime`.
+
+Each entry point module is imported in a fresh interpreter, and the cumulative
+import time of the module is reported along with its slowest imports, and which
+of the cloud and API dependencies it loaded. Local parses and parse workers should
+not load those, as they are imported on first use.
+
+Results are written as JSON, and can be compared with the results of an earlier run:
+
+    python -m clinvar_ingest.import_benchmark -o imports.json --baseline baseline-imports.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+from datetime import UTC, datetime
+
+_logger = logging.getLogger("clinvar_ingest")
+
+ENTRY_POINTS = {
+    "cli": "clinvar_ingest.main",
+    "parse": "clinvar_ingest.parse",
+    "parse-worker": "clinvar_ingest.parallel",
+    "api": "clinvar_ingest.api.main",
+}
+
+# Modules only needed for cloud storage, BigQuery and the API
+CLOUD_MODULES = [
+    "fastapi",
+    "google.cloud.bigquery",
+    "google.cloud.storage",
+    "pydantic",
+    "requests",
+]
+
+# Number of slowest imports reported per entry point
+SLOWEST_IMPORTS = 10
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """
+    Parses the stderr of `python -X importtime` into a list of dicts of each
+    imported module's name, nesting depth and self and cumulative seconds.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append(
+            {
+                "name": name.strip(),
+                # Nested imports are indented by two spaces per level
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_seconds": int(self_us) / 1e6,
+                "cumulative_seconds": int(cumulative_us) / 1e6,
+            }
+        )
+    return imports
+
+
+def measure_import(module: str) -> dict:
+    """
+    Imports `module` in a new interpreter. Returns its cumulative import time,
+    its slowest imports and the cloud modules loaded.
+    """
+    code = (
+        f"import {module}, sys, json; "
+        f"print(json.dumps([m for m in {CLOUD_MODULES!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = parse_importtime(proc.stderr)
+    top = next(i for i in imports if i["name"] == module and i["depth"] == 0)
+    slowest = sorted(
+        (i for i in imports if i["name"] != module),
+        key=lambda i: i["cumulative_seconds"],
+        reverse=True,
+    )[:SLOWEST_IMPORTS]
+    return {
+        "module": module,
+        "seconds": top["cumulative_seconds"],
+        "modules_imported": len(imports),
+        "cloud_modules": json.loads(proc.stdout.splitlines()[-1]),
+        "slowest": [{"name": i["name"], "seconds": i["cumulative_seconds"]} for i in slowest],
+    }
+
+
+def benchmark_imports(entry_points: dict[str, str], repeat: int = 1) -> list[dict]:
+    """
+    Measures the import time of each entry point, keeping the fastest of `repeat` runs.
+    """
+    results = []
+    for name, module in entry_points.items():
+        _logger.info(f"Measuring import time of {module}")
+        runs = [measure_import(module) for _ in range(repeat)]
+        results.append({"entry_point": name, **min(runs, key=lambda r: r["seconds"])})
+    return results
+
+
+def compare_to_baseline(results: list[dict], baseline: list[dict]) -> list[dict]:
+    """
+    Compares the import time of each entry point with the baseline results of
+    the same entry point. `ratio` is the baseline time divided by the current
+    time, so less than 1 is slower, as in `benchmark.compare_to_baseline`.
+    """
+    baseline_by_name = {b["entry_point"]: b for b in baseline}
+    comparisons = []
+    for result in results:
+        base = baseline_by_name.get(result["entry_point"])
+        if base is None or not result["seconds"]:
+            continue
+        comparisons.append(
+            {
+                "entry_point": result["entry_point"],
+                "baseline_seconds": base["seconds"],
+                "seconds": result["seconds"],
+                "ratio": base["seconds"] / result["seconds"],
+            }
+        )
+    return comparisons
+
+
+def _print_results(results: list[dict]):
+    for result in results:
+        cloud = ", ".join(result["cloud_modules"]) or "none"
+        print(
+            f"{result['entry_point']} ({result['module']}): {result['seconds'] * 1000:.1f} ms, "
+            f"{result['modules_imported']} modules, cloud modules: {cloud}"
+        )
+        for i in result["slowest"]:
+            print(f"  {i['seconds'] * 1000:>8.1f} ms  {i['name']}")
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of each entry point")
+    parser.add_argument(
+        "entry_points",
+        nargs="*",
+        default=list(ENTRY_POINTS),
+        help=f"Entry points to measure (default: all of {', '.join(ENTRY_POINTS)})",
+    )
+    parser.add_argument("-o", "--output", help="File to write the JSON results to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=None,
+        help=(
+            "Exit with an error if any entry point is this fraction slower than the baseline, "
+            "e.g. 0.2 for 20%% slower"
+        ),
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point, keeping the fastest (default: 3)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.entry_points if name not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"Unknown entry points: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=sys.argv[1:]):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    entry_points = {name: ENTRY_POINTS[name] for name in args.entry_points}
+    results = benchmark_imports(entry_points, repeat=args.repeat)
+    _print_results(results)
+
+    output = {
+        "created": datetime.now(UTC).isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparisons = compare_to_baseline(results, baseline["results"])
+        slower = []
+        for c in comparisons:
+            print(f"{c['entry_point']:<13} {c['ratio']:.2f}x baseline import speed")
+            if args.max_slowdown is not None and c["ratio"] < 1 - args.max_slowdown:
+                slower.append(c)
+        if slower:
+            print(f"{len(slower)} entry points slower than baseline by more than {args.max_slowdown:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,10 +4,7 @@ from argparse import Namespace
 
 import coloredlogs
 
-from clinvar_ingest.api.model.requests import CreateExternalTablesRequest
 from clinvar_ingest.cli import parse_args
-from clinvar_ingest.cloud.bigquery.create_tables import run_create_external_tables
-from clinvar_ingest.cloud.gcs import copy_file_to_bucket
 from clinvar_ingest.fs import find_files
 from clinvar_ingest.parse import parse_and_write_files
 
@@ -25,11 +22,17 @@ def run_parse(args: Namespace):
         disassemble=args.disassemble,
         jsonify_content=args.jsonify_content == "true",
         file_format=args.file_format,
+        workers=args.workers,
+        ordered=args.ordered,
     )
     print(output_files)
 
 
 def run_upload(args: Namespace):
+    # Cloud and API dependencies are imported by the subcommands which use them,
+    # so a local parse does not pay for importing them
+    from clinvar_ingest.cloud.gcs import UPLOAD_CONCURRENCY, upload_files
+
     print(f"Uploading files to bucket: {args.destination_bucket}")
 
     file_paths = find_files(args.source_directory)
@@ -38,10 +41,15 @@ def run_upload(args: Namespace):
     if args.destination_prefix:
         dest_uri_prefix += "/" + args.destination_prefix
 
-    for file_path in file_paths:
-        s = args.source_directory + "/" + file_path
-        d = dest_uri_prefix + "/" + file_path
-        copy_file_to_bucket(s, d)
+    files = [
+        (args.source_directory + "/" + file_path, dest_uri_prefix + "/" + file_path)
+        for file_path in file_paths
+    ]
+    upload_files(
+        files,
+        concurrency=args.concurrency or UPLOAD_CONCURRENCY,
+        max_attempts=args.max_attempts,
+    )
 
 
 def run_cli(argv: list[str]):
@@ -54,9 +62,19 @@ def run_cli(argv: list[str]):
     if args.subcommand == "upload":
         return run_upload(args)
     if args.subcommand == "create-tables":
+        from clinvar_ingest.api.model.requests import CreateExternalTablesRequest
+        from clinvar_ingest.cloud.bigquery.create_tables import run_create_external_tables
+
         req = CreateExternalTablesRequest(**vars(args))
         resp = run_create_external_tables(req)
         return {entity_type: table.full_table_id for entity_type, table in resp.items()}
+    if args.subcommand == "load-tables":
+        from clinvar_ingest.api.model.requests import CreateExternalTablesRequest
+        from clinvar_ingest.cloud.bigquery.load_tables import run_load_tables
+
+        req = CreateExternalTablesRequest(**vars(args))
+        resp = run_load_tables(req)
+        return {table_name: load.table_id for table_name, load in resp.items()}
     raise ValueError(f"Unknown subcommand: {args.subcommand}")
 
 
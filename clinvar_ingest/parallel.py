@@ -0,0 +1,663 @@
+"""
+Parallel parsing where each worker process writes its own output files.
+
+The main process only splits the input into records (see
+`reader.frame_clinvar_xml_records`) and sends batches of them to the workers.
+Each worker parses its records and writes the rows to its own part file per
+entity type, e.g. `variation_archive/part-w03-00000.ndjson.gz`, so no single
+writer or compression stream is shared between workers.
+
+When a worker is done it sends back a manifest of the files it wrote, and the
+main process merges these manifests into the map of entity types to output files.
+
+Alternatively, `parse_and_write_ordered` keeps the output in input order: workers
+send back their encoded rows with the sequence number of the batch, and the main
+process writes them in sequence order to the same files as a serial parse.
+
+A local uncompressed input is memory-mapped instead of read. The main process
+finds the records in place and sends their (offset, length) to the workers, which
+parse them straight from their own mapping of the file, so the record bytes are
+not copied through the task queue.
+"""
+
+import contextlib
+import functools
+import itertools
+import json
+import logging
+import mmap
+import multiprocessing
+import queue
+import sys
+import traceback
+from collections.abc import Callable, Container, Iterator
+
+from clinvar_ingest.fs import ChunkPipe, is_local_uncompressed, mmap_open
+from clinvar_ingest.parse import _open_input, _st_size, encode_row, get_open_file_for_writing
+from clinvar_ingest.progress import ProgressTracker
+from clinvar_ingest.reader import (
+    RECORD_TAGS,
+    frame_clinvar_xml_record_spans,
+    frame_clinvar_xml_records,
+    read_clinvar_rcv_xml_record,
+    read_clinvar_xml_record,
+)
+from clinvar_ingest.stats import ParseStats, TimedReader
+from clinvar_ingest.utils import (
+    ClinVarIngestFileFormat,
+    make_progress_logger,
+    peak_rss_bytes,
+)
+
+_logger = logging.getLogger("clinvar_ingest")
+
+# Approximate size of the batches of records sent to workers
+BATCH_BYTES = 4 * 1024 * 1024
+# Number of batches which can be waiting for a worker, per worker
+QUEUED_BATCHES_PER_WORKER = 2
+# Number of batches the ordered mode may be ahead of the output, per worker.
+# Results of batches waiting on an earlier batch are held in memory until it is written.
+REORDER_WINDOW_BATCHES_PER_WORKER = 4
+# Seconds to wait between checks that workers are still running
+WORKER_POLL_INTERVAL = 5
+
+WORKER_STOP_VALUE = None
+
+# Reads the objects of one record, for each file format. RCV records are read
+# for only the parts of them RcvMapping needs, as in a serial parse.
+RECORD_READERS = {
+    ClinVarIngestFileFormat.VCV: read_clinvar_xml_record,
+    ClinVarIngestFileFormat.RCV: read_clinvar_rcv_xml_record,
+}
+
+
+def part_file_name(worker_id: int, part: int = 0) -> str:
+    """
+    Name of a part file written by a worker, without directory or suffix.
+
+    Example:
+        >>> part_file_name(3)
+        'part-w03-00000'
+    """
+    return f"part-w{worker_id:02d}-{part:05d}"
+
+
+def part_file_wildcard(output_release_directory: str, entity_type: str, suffix: str) -> str:
+    """
+    Path matching all part files of `entity_type`, e.g. for BigQuery external table source URIs.
+    """
+    return f"{output_release_directory}/{entity_type}/part-*{suffix}"
+
+
+def _batches(records: Iterator[bytes | tuple[int, int]], batch_bytes: int) -> Iterator[list]:
+    batch = []
+    size = 0
+    for record in records:
+        batch.append(record)
+        # Records of a memory-mapped input are (offset, length) spans
+        size += record[1] if isinstance(record, tuple) else len(record)
+        if size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+@contextlib.contextmanager
+def _input_records(
+    input_filename: str | ChunkPipe, tag: str, stats: ParseStats
+) -> Iterator[tuple[Iterator[bytes | tuple[int, int]], Callable[[], int]]]:
+    """
+    Yields an iterator of the records in the input to send to workers, and a
+    function returning how many bytes of the input have been consumed.
+
+    For a local uncompressed file, the records are (offset, length) spans of the
+    memory-mapped file, see `RecordSource`. Otherwise they are the record bytes.
+    """
+    if not is_local_uncompressed(input_filename):
+        with _open_input(input_filename) as (f_in, raw_in):
+            records = frame_clinvar_xml_records(TimedReader(f_in, stats), tag)
+            yield stats.timed_iter("frame", records), lambda: raw_in.bytes_read
+        return
+
+    with mmap_open(input_filename) as mm:
+
+        def spans():
+            for offset, length in frame_clinvar_xml_record_spans(mm, tag):
+                stats.bytes_read = offset + length
+                yield offset, length
+
+        _logger.info(f"Memory-mapped {input_filename}, sending record offsets to workers")
+        yield stats.timed_iter("frame", spans()), lambda: stats.bytes_read
+
+
+class RecordSource:
+    """
+    Resolves the records of a batch in a worker. Records are either their bytes,
+    or (offset, length) spans of the memory-mapped input file `mmap_path`, which
+    is mapped in the worker on first use. Spans are read as memoryview slices of
+    the mapping, released once the next record is taken.
+    """
+
+    def __init__(self, mmap_path: str | None):
+        self.mmap_path = mmap_path
+        self.mm = None
+        self.view = None
+
+    def records(self, batch: list) -> Iterator[bytes | memoryview]:
+        if self.mmap_path is None:
+            yield from batch
+            return
+        if self.mm is None:
+            with open(self.mmap_path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mm)
+        for offset, length in batch:
+            with self.view[offset : offset + length] as record:
+                yield record
+
+    def close(self):
+        if self.mm is not None:
+            self.view.release()
+            self.mm.close()
+            self.mm = None
+
+
+def _shard_worker(  # noqa: PLR0913
+    worker_id: int,
+    task_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+    output_release_directory: str,
+    release_date: str,
+    suffix: str,
+    disassemble: bool,
+    jsonify_content: bool,
+    mmap_path: str | None,
+    file_format: ClinVarIngestFileFormat,
+):
+    """
+    Worker process target. Parses batches of records from `task_queue` until it
+    receives WORKER_STOP_VALUE, then puts (worker_id, manifest, stats, None) on `result_queue`.
+    The manifest is a dict of entity type to the path written and its row count, and
+    stats is the summary of the worker's ParseStats.
+
+    On error, puts (worker_id, None, None, error) on `result_queue` right away, then keeps
+    taking batches off `task_queue` until stopped so the main process does not block.
+    """
+    # A client inherited from the parent process must not share its connections.
+    # The GCS module is only loaded, and a client possibly created, once a gs:// path is used.
+    if (gcs := sys.modules.get("clinvar_ingest.cloud.gcs")) is not None:
+        gcs._get_gcs_client.client = None
+    stats = ParseStats()
+    source = RecordSource(mmap_path)
+    read_record = RECORD_READERS[file_format]
+    open_output_files = {}
+    try:
+        while (batch := task_queue.get()) is not WORKER_STOP_VALUE:
+            for record in source.records(batch):
+                for obj in read_record(record, disassemble=disassemble, stats=stats):
+                    entity_type = obj.entity_type
+                    f_out = get_open_file_for_writing(
+                        open_output_files,
+                        root_dir=output_release_directory,
+                        label=entity_type,
+                        suffix=suffix,
+                        filename=part_file_name(worker_id),
+                    )
+                    row = stats.timed_call("encode", encode_row, obj, release_date, jsonify_content)
+                    stats.timed_call("write", f_out.write, row)
+                    stats.count_row(entity_type, len(row))
+        for f in open_output_files.values():
+            stats.timed_call("write", f.close)
+        source.close()
+    except Exception:  # noqa: BLE001
+        result_queue.put((worker_id, None, None, traceback.format_exc()))
+        while task_queue.get() is not WORKER_STOP_VALUE:
+            pass
+        return
+
+    manifest = {
+        entity_type: {"path": f._name, "rows": stats.entity_rows[entity_type]}
+        for entity_type, f in open_output_files.items()
+    }
+    result_queue.put((worker_id, manifest, stats.summary(), None))
+
+
+def _ordered_worker(  # noqa: PLR0913
+    worker_id: int,
+    task_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+    release_date: str,
+    disassemble: bool,
+    jsonify_content: bool,
+    mmap_path: str | None,
+    file_format: ClinVarIngestFileFormat,
+):
+    """
+    Worker process target. Parses (sequence number, batch of records) tasks from
+    `task_queue` until it receives WORKER_STOP_VALUE. For each batch, puts
+    (worker_id, sequence number, rows, None) on `result_queue`, where rows is a dict
+    of entity type to its encoded rows, in input order. When stopped, puts
+    (worker_id, None, stats, None), where stats is the summary of the worker's ParseStats.
+
+    On error, puts (worker_id, None, None, error) on `result_queue` right away, then
+    keeps taking batches off `task_queue` until stopped so the main process does not block.
+    """
+    stats = ParseStats()
+    source = RecordSource(mmap_path)
+    read_record = RECORD_READERS[file_format]
+    try:
+        while (task := task_queue.get()) is not WORKER_STOP_VALUE:
+            seq, batch = task
+            rows = {}
+            for record in source.records(batch):
+                for obj in read_record(record, disassemble=disassemble, stats=stats):
+                    row = stats.timed_call("encode", encode_row, obj, release_date, jsonify_content)
+                    rows.setdefault(obj.entity_type, []).append(row)
+                    stats.count_row(obj.entity_type, len(row))
+            result_queue.put((worker_id, seq, {k: b"".join(v) for k, v in rows.items()}, None))
+        source.close()
+    except Exception:  # noqa: BLE001
+        result_queue.put((worker_id, None, None, traceback.format_exc()))
+        while task_queue.get() is not WORKER_STOP_VALUE:
+            pass
+        return
+    result_queue.put((worker_id, None, stats.summary(), None))
+
+
+def _receive_result(
+    result_queue: multiprocessing.Queue, results: dict, stats: ParseStats, timeout: float | None
+) -> bool:
+    """
+    Moves one worker result, if available, into `results` and merges the worker's
+    stats into `stats`, waiting up to `timeout` seconds for it (None for no wait).
+    Raises an error if the worker reported one. Returns whether a result was received.
+    """
+    try:
+        if timeout is None:
+            worker_id, manifest, worker_stats, error = result_queue.get_nowait()
+        else:
+            worker_id, manifest, worker_stats, error = result_queue.get(timeout=timeout)
+    except queue.Empty:
+        return False
+    if error is not None:
+        raise RuntimeError(f"Parse worker {worker_id} failed:\n{error}")
+    results[worker_id] = manifest
+    stats.merge(worker_stats)
+    return True
+
+
+def _check_workers(processes: list, receive: Callable[[float | None], bool], finished: Container[int]):
+    """
+    Receives any results from workers with `receive`, which returns whether a
+    result was received, waiting up to the given number of seconds (None for no wait).
+    Raises an error if a worker exited without being in `finished`.
+    """
+    while receive(None):
+        pass
+    for worker_id, p in enumerate(processes):
+        if worker_id not in finished and p.exitcode is not None:
+            # A result sent just before exiting may not have arrived yet
+            while worker_id not in finished and receive(WORKER_POLL_INTERVAL):
+                pass
+            if worker_id not in finished:
+                raise RuntimeError(f"Parse worker {worker_id} exited with code {p.exitcode} without a result")
+
+
+def _put(task_queue: multiprocessing.Queue, item, check_workers: Callable[[], None]):
+    """
+    Puts `item` on `task_queue`, waiting for space, while checking that workers are still running.
+    """
+    while True:
+        try:
+            task_queue.put(item, timeout=WORKER_POLL_INTERVAL)
+            return
+        except queue.Full:
+            check_workers()
+
+
+class ReorderBuffer:
+    """
+    Receives batch results from ordered workers and passes them to `write` in
+    sequence order, holding results which arrive before an earlier batch.
+    The stats of finished workers are merged into `stats`.
+    """
+
+    def __init__(
+        self,
+        result_queue: multiprocessing.Queue,
+        write: Callable[[dict[str, bytes]], None],
+        stats: ParseStats | None = None,
+    ):
+        self.result_queue = result_queue
+        self.write = write
+        self.stats = stats
+        self.pending = {}
+        self.next_seq = 0
+        self.finished = set()
+
+    def receive(self, timeout: float | None) -> bool:
+        """
+        Receives one worker result, if available, waiting up to `timeout` seconds for it
+        (None for no wait), and writes any results which are next in sequence.
+        Raises an error if the worker reported one. Returns whether a result was received.
+        """
+        try:
+            if timeout is None:
+                worker_id, seq, rows, error = self.result_queue.get_nowait()
+            else:
+                worker_id, seq, rows, error = self.result_queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if error is not None:
+            raise RuntimeError(f"Parse worker {worker_id} failed:\n{error}")
+        if seq is None:
+            self.finished.add(worker_id)
+            if self.stats is not None:
+                self.stats.merge(rows)
+            return True
+        self.pending[seq] = rows
+        while self.next_seq in self.pending:
+            self.write(self.pending.pop(self.next_seq))
+            self.next_seq += 1
+        return True
+
+
+def _start_workers(target: Callable, workers: int, *args) -> tuple[multiprocessing.Queue, multiprocessing.Queue, list]:
+    """
+    Starts `workers` processes running `target(worker_id, task_queue, result_queue, *args)`.
+    Returns the task queue, result queue and processes.
+    """
+    # The workflow scripts run at import time and would be re-run in each worker
+    # by the spawn start method, so workers are forked
+    mp_context = multiprocessing.get_context("fork")
+    task_queue = mp_context.Queue(maxsize=workers * QUEUED_BATCHES_PER_WORKER)
+    result_queue = mp_context.Queue()
+    processes = [
+        mp_context.Process(
+            target=target,
+            args=(worker_id, task_queue, result_queue, *args),
+            daemon=True,
+        )
+        for worker_id in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    return task_queue, result_queue, processes
+
+
+def _join_workers(processes: list, task_queue: multiprocessing.Queue, stopped: bool):
+    """
+    Waits for the worker processes to exit. Unless they were all sent
+    WORKER_STOP_VALUE, as when the parse is unwound by an error, a KeyboardInterrupt
+    or a cancelled job's SystemExit, they would wait for tasks forever, so they
+    are terminated first, and killed if they do not exit. Batches still buffered
+    for `task_queue` are then dropped rather than waited on at exit.
+    """
+    if not stopped:
+        task_queue.cancel_join_thread()
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.join(WORKER_POLL_INTERVAL)
+            if p.exitcode is None:
+                p.kill()
+    for p in processes:
+        p.join()
+
+
+def _queue_depths(**queues: multiprocessing.Queue) -> dict[str, int]:
+    """
+    Returns the approximate number of items in each queue, leaving out queues
+    where this is not available, as on macOS.
+    """
+    depths = {}
+    for name, q in queues.items():
+        with contextlib.suppress(NotImplementedError):
+            depths[name] = q.qsize()
+    return depths
+
+
+def _object_progress_logger(iterate_type: str, stats: ParseStats) -> Callable:
+    return make_progress_logger(
+        logger=_logger,
+        fmt=("Read {elapsed_value} " + iterate_type + " in {elapsed:.2f}s. Total: {current_value}."),
+        interval=60,
+        details_fn=stats.progress_line,
+    )
+
+
+def merge_manifests(
+    manifests: dict[int, dict], output_release_directory: str, suffix: str
+) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """
+    Merges per-worker manifests into a map of entity type to a wildcard path for
+    its part files, and a map of entity type to the part files actually written.
+    """
+    parsed_files = {}
+    part_files = {}
+    for worker_id in sorted(manifests):
+        for entity_type, entry in manifests[worker_id].items():
+            parsed_files[entity_type] = part_file_wildcard(output_release_directory, entity_type, suffix)
+            part_files.setdefault(entity_type, []).append(entry["path"])
+    return parsed_files, part_files
+
+
+def parse_and_write_shards(  # noqa: PLR0913
+    input_filename: str | ChunkPipe,
+    output_release_directory: str,
+    release_date: str,
+    iterate_type: str,
+    workers: int,
+    gzip_output=True,
+    disassemble=True,
+    jsonify_content=True,
+    file_format: ClinVarIngestFileFormat = ClinVarIngestFileFormat.VCV,
+    limit: None | int = None,
+    stats: ParseStats | None = None,
+    progress: ProgressTracker | None = None,
+) -> dict[str, str]:
+    """
+    Parses input file with `workers` worker processes, each writing its own part
+    files in the output release directory.
+
+    Returns the dict of types to wildcard paths matching their part files.
+    The time spent in each stage by the main process and the workers is added to `stats`.
+    Progress through the input is reported to `progress`, see `clinvar_ingest.progress`.
+    """
+    suffix = ".ndjson" if not gzip_output else ".ndjson.gz"
+    tag = RECORD_TAGS[str(file_format)]
+    mmap_path = input_filename if is_local_uncompressed(input_filename) else None
+
+    task_queue, result_queue, processes = _start_workers(
+        _shard_worker,
+        workers,
+        output_release_directory,
+        release_date,
+        suffix,
+        disassemble,
+        jsonify_content,
+        mmap_path,
+        ClinVarIngestFileFormat(file_format),
+    )
+    _logger.info(f"Started {workers} parse workers writing to {output_release_directory}")
+    if stats is None:
+        stats = ParseStats()
+    if progress is None:
+        progress = ProgressTracker(_st_size(input_filename), stats=stats)
+    object_log_progress = _object_progress_logger(iterate_type, stats)
+    progress.queue_depths_fn = functools.partial(_queue_depths, tasks=task_queue, results=result_queue)
+
+    results = {}
+    receive = functools.partial(_receive_result, result_queue, results, stats)
+
+    def check_workers():
+        _check_workers(processes, receive, results)
+
+    object_count = 0
+    stopped = False
+    try:
+        with _input_records(input_filename, tag, stats) as (input_records, input_position):
+            object_log_progress(0)  # initialize
+
+            records = itertools.islice(input_records, limit) if limit else input_records
+            for batch in _batches(records, BATCH_BYTES):
+                check_workers()
+                stats.timed_call("wait", _put, task_queue, batch, check_workers)
+
+                # Log offset and count for monitoring
+                object_count += len(batch)
+                stats.records = object_count
+                progress.update(input_position(), object_count)
+                object_log_progress(object_count)
+
+            if limit and object_count >= limit:
+                _logger.info("Hard limit reached: %d", limit)
+
+            for _ in processes:
+                stats.timed_call("wait", _put, task_queue, WORKER_STOP_VALUE, check_workers)
+            stopped = True
+            while len(results) < workers:
+                if not stats.timed_call("wait", receive, WORKER_POLL_INTERVAL):
+                    check_workers()
+
+            # Log final status
+            progress.finish(input_position(), object_count)
+            object_log_progress(object_count, force=True)
+            _logger.info(f"Peak RSS (main process): {peak_rss_bytes()} bytes")
+    except BaseException:
+        _logger.critical("Exception caught in parse_and_write_shards")
+        raise
+    finally:
+        _join_workers(processes, task_queue, stopped)
+
+    parsed_files, part_files = merge_manifests(results, output_release_directory, suffix)
+    row_counts = {}
+    for manifest in results.values():
+        for entity_type, entry in manifest.items():
+            row_counts[entity_type] = row_counts.get(entity_type, 0) + entry["rows"]
+    _logger.info("Output part files: %s", part_files)
+    _logger.info("Output row counts: %s", row_counts)
+    _logger.info("Output files: %s", parsed_files)
+    return parsed_files
+
+
+def parse_and_write_ordered(  # noqa: PLR0912, PLR0913
+    input_filename: str | ChunkPipe,
+    output_release_directory: str,
+    release_date: str,
+    iterate_type: str,
+    workers: int,
+    gzip_output=True,
+    disassemble=True,
+    jsonify_content=True,
+    file_format: ClinVarIngestFileFormat = ClinVarIngestFileFormat.VCV,
+    limit: None | int = None,
+    stats: ParseStats | None = None,
+    progress: ProgressTracker | None = None,
+) -> dict[str, str]:
+    """
+    Parses input file with `workers` worker processes, writing their rows from the
+    main process in input order, to the same files as `parse.parse_and_write_files`
+    with a single worker. The uncompressed output is identical to it.
+
+    At most `workers * REORDER_WINDOW_BATCHES_PER_WORKER` batches are sent ahead of
+    the last batch written. When a slow batch holds up the output, reading the input
+    waits for it rather than holding more results in memory.
+
+    Returns the dict of types to their output files.
+    The time spent in each stage by the main process and the workers is added to `stats`.
+    Progress through the input is reported to `progress`, see `clinvar_ingest.progress`.
+    """
+    suffix = ".ndjson" if not gzip_output else ".ndjson.gz"
+    tag = RECORD_TAGS[str(file_format)]
+    mmap_path = input_filename if is_local_uncompressed(input_filename) else None
+    window = workers * REORDER_WINDOW_BATCHES_PER_WORKER
+
+    open_output_files = {}
+
+    def write(rows: dict[str, bytes]):
+        for entity_type, data in rows.items():
+            f_out = get_open_file_for_writing(
+                open_output_files,
+                root_dir=output_release_directory,
+                label=entity_type,
+                suffix=suffix,
+            )
+            stats.timed_call("write", f_out.write, data)
+
+    task_queue, result_queue, processes = _start_workers(
+        _ordered_worker,
+        workers,
+        release_date,
+        disassemble,
+        jsonify_content,
+        mmap_path,
+        ClinVarIngestFileFormat(file_format),
+    )
+    _logger.info(f"Started {workers} ordered parse workers with a window of {window} batches")
+    if stats is None:
+        stats = ParseStats()
+    if progress is None:
+        progress = ProgressTracker(_st_size(input_filename), stats=stats)
+    object_log_progress = _object_progress_logger(iterate_type, stats)
+
+    reorder_buffer = ReorderBuffer(result_queue, write, stats)
+    progress.queue_depths_fn = lambda: {
+        **_queue_depths(tasks=task_queue, results=result_queue),
+        "reorder": len(reorder_buffer.pending),
+    }
+
+    def check_workers():
+        _check_workers(processes, reorder_buffer.receive, reorder_buffer.finished)
+
+    object_count = 0
+    stopped = False
+    try:
+        with _input_records(input_filename, tag, stats) as (input_records, input_position):
+            object_log_progress(0)  # initialize
+
+            records = itertools.islice(input_records, limit) if limit else input_records
+            for seq, batch in enumerate(_batches(records, BATCH_BYTES)):
+                check_workers()
+                # Wait for the output to catch up before reading further ahead of it
+                while seq - reorder_buffer.next_seq >= window:
+                    if not stats.timed_call("wait", reorder_buffer.receive, WORKER_POLL_INTERVAL):
+                        check_workers()
+                stats.timed_call("wait", _put, task_queue, (seq, batch), check_workers)
+
+                # Log offset and count for monitoring
+                object_count += len(batch)
+                stats.records = object_count
+                progress.update(input_position(), object_count)
+                object_log_progress(object_count)
+
+            if limit and object_count >= limit:
+                _logger.info("Hard limit reached: %d", limit)
+
+            for _ in processes:
+                stats.timed_call("wait", _put, task_queue, WORKER_STOP_VALUE, check_workers)
+            stopped = True
+            while len(reorder_buffer.finished) < workers:
+                if not stats.timed_call("wait", reorder_buffer.receive, WORKER_POLL_INTERVAL):
+                    check_workers()
+            if reorder_buffer.pending:
+                raise RuntimeError(f"Batches not written, missing batch {reorder_buffer.next_seq}")
+
+            # Log final status
+            progress.finish(input_position(), object_count)
+            object_log_progress(object_count, force=True)
+            _logger.info(f"Peak RSS (main process): {peak_rss_bytes()} bytes")
+    except BaseException:
+        _logger.critical("Exception caught in parse_and_write_ordered")
+        raise
+    finally:
+        _join_workers(processes, task_queue, stopped)
+        _logger.debug("Closing output files")
+        for f in open_output_files.values():
+            stats.timed_call("write", f.close)
+
+    table_file_pairs = {k: v._name for k, v in open_output_files.items()}
+    _logger.info("Output files: %s", json.dumps(table_file_pairs))
+    return table_file_pairs
@@ -1,44 +1,53 @@
+import contextlib
 import gzip
+import io
 import json
 import logging
 import os
-import pathlib
 from collections.abc import Callable, Iterator
 from typing import IO, Any, TextIO
 
-import requests
-
-from clinvar_ingest.cloud.gcs import blob_reader, blob_size, blob_writer
-from clinvar_ingest.fs import BinaryOpenMode, ReadCounter, fs_open
+from clinvar_ingest.fs import BinaryOpenMode, BlockWriter, ChunkPipe, ReadCounter, fs_open
 from clinvar_ingest.model.common import Model, dictify
+from clinvar_ingest.profiling import profile_from_env
+from clinvar_ingest.progress import ParseProgress, ProgressTracker
 from clinvar_ingest.reader import (
     get_clinvar_rcv_xml_releaseinfo,
     get_clinvar_vcv_xml_releaseinfo,
     read_clinvar_rcv_xml,
     read_clinvar_vcv_xml,
 )
-from clinvar_ingest.utils import ClinVarIngestFileFormat, make_progress_logger
+from clinvar_ingest.stats import ParseStats, TimedReader
+from clinvar_ingest.storage import get_backend, uri_scheme
+from clinvar_ingest.utils import (
+    ClinVarIngestFileFormat,
+    make_progress_logger,
+    peak_rss_bytes,
+)
 
 _logger = logging.getLogger("clinvar_ingest")
 
 GZIP_COMPRESSLEVEL = int(os.environ.get("GZIP_COMPRESSLEVEL", 9))
+# Size of the blocks of rows written to each output file
+WRITE_BLOCK_SIZE = int(os.environ.get("CLINVAR_INGEST_WRITE_BLOCK_SIZE", 1024 * 1024))
 
 
-def _st_size(filepath: str):
-    if filepath.startswith("gs://"):
-        return blob_size(filepath)
-    return pathlib.Path(filepath).stat().st_size
+def _st_size(filepath: str | ChunkPipe):
+    if isinstance(filepath, ChunkPipe):
+        return filepath.size
+    return get_backend(filepath).size(filepath)
 
 
 def _open(
     filepath: str, mode: BinaryOpenMode = BinaryOpenMode.READ
 ) -> ReadCounter | TextIO | IO[Any] | gzip.GzipFile:
     _logger.debug(f"Opening file: {filepath}, mode: {mode}")
-    if filepath.startswith("gs://"):
+    if uri_scheme(filepath) != "file":
+        backend = get_backend(filepath)
         if mode == BinaryOpenMode.WRITE:
-            f = blob_writer(filepath)
+            f = backend.open_write(filepath)
         elif mode == BinaryOpenMode.READ:
-            f = blob_reader(filepath)
+            f = backend.open_read(filepath)
         else:
             raise ValueError(f"Unknown mode: {mode}")
 
@@ -50,23 +59,57 @@ def _open(
     return fs_open(filepath, mode=mode, make_parents=True)
 
 
+def _input_name(filepath: str | ChunkPipe) -> str:
+    return filepath.name if isinstance(filepath, ChunkPipe) else filepath
+
+
+@contextlib.contextmanager
+def _open_input(filepath: str | ChunkPipe) -> Iterator[tuple[IO[bytes] | gzip.GzipFile, ReadCounter]]:
+    """
+    Opens an input file from its storage backend, or a ChunkPipe streaming the input file,
+    for reading, decompressing it if it ends in .gz.
+
+    Yields the file and a ReadCounter on the raw stream underneath it, which counts
+    the bytes of the file as stored, i.e. compressed bytes for a gzipped file.
+    """
+    _logger.debug(f"Opening input file: {filepath}")
+    if isinstance(filepath, ChunkPipe):
+        raw = filepath
+    else:
+        # gs:// input is read ahead of the parse, so it does not wait on each request to GCS
+        raw = get_backend(filepath).open_read(filepath, prefetch=True)
+    with raw:
+        counter = ReadCounter(raw)
+        if _input_name(filepath).endswith(".gz"):
+            with gzip.GzipFile(fileobj=counter, mode="rb") as f:
+                yield f, counter
+        else:
+            yield counter, counter
+
+
 def get_open_file_for_writing(
     d: dict,
     root_dir: str,
     label: str,
     suffix=".ndjson",
+    filename: str | None = None,
+    block_size: int = WRITE_BLOCK_SIZE,
 ):
     """
     Takes a dictionary of labels to file handles. Opens a new file handle using
     label and suffix in root_dir if not already in the dictionary.
+    The file is named after the label, unless `filename` is given.
+
+    Writes to the file are buffered and written through in blocks of `block_size`
+    bytes, so at most that much per file is held in memory. See `fs.BlockWriter`.
 
     Adds a _name attribute for the path opened.
     """
     if label not in d:
         label_dir = f"{root_dir}/{label}"
-        filepath = f"{label_dir}/{label}{suffix}"
+        filepath = f"{label_dir}/{filename or label}{suffix}"
         _logger.info("Opening file for writing: %s", filepath)
-        d[label] = _open(filepath, mode=BinaryOpenMode.WRITE)
+        d[label] = BlockWriter(_open(filepath, mode=BinaryOpenMode.WRITE), block_size)
         d[label]._name = filepath
     return d[label]
 
@@ -130,6 +173,55 @@ def _jsonify_non_empties(obj: list | dict | str) -> dict | list | str | None:
     return json.dumps(obj) if obj not in [None, ""] else None
 
 
+def jsonify_fields(obj: Model, obj_dict: dict):
+    """
+    Replaces the content type fields of `obj` in its dictified form `obj_dict` with their JSON strings.
+    """
+    if hasattr(type(obj), "jsonifiable_fields"):
+        for field in type(obj).jsonifiable_fields():
+            if field in obj_dict:
+                obj_dict[field] = _jsonify_non_empties(obj_dict[field])
+
+
+def encode_row(obj: Model, release_date: str, jsonify_content=True) -> bytes:
+    """
+    Encodes a Model object as one line of newline delimited JSON.
+    """
+    obj_dict = dictify(obj)
+    if not isinstance(obj_dict, dict):
+        raise ValueError(f"Object not dictified: {obj}")
+
+    # jsonify content type fields if requested
+    if jsonify_content:
+        jsonify_fields(obj, obj_dict)
+
+    obj_dict["release_date"] = release_date
+    return json.dumps(obj_dict).encode("utf-8") + b"\n"
+
+
+def write_parse_stats(stats: dict, output_directory: str) -> str:
+    """
+    Writes the summary of a parse's stats as JSON to parse_stats.json in
+    `output_directory`, locally or in GCS. Returns the path written.
+    """
+    stats_path = f"{output_directory}/parse_stats.json"
+    with _open(stats_path, mode=BinaryOpenMode.WRITE) as f:
+        f.write(json.dumps(stats).encode("utf-8"))
+    _logger.info(f"Wrote parse stats to {stats_path}")
+    return stats_path
+
+
+def write_parse_progress(progress: ParseProgress, output_directory: str) -> str:
+    """
+    Writes the latest progress of a parse to `parse_progress.json` in `output_directory`,
+    replacing the previous one. Usable as the `progress_callback` of `parse_and_write_files`.
+    """
+    progress_path = f"{output_directory}/parse_progress.json"
+    with _open(progress_path, mode=BinaryOpenMode.WRITE) as f:
+        f.write(json.dumps(progress.as_dict()).encode("utf-8"))
+    return progress_path
+
+
 def reader_fn_for_format(
     file_format: ClinVarIngestFileFormat,
 ) -> Callable[[TextIO, bool], Iterator[Model]]:
@@ -144,11 +236,14 @@ def reader_fn_for_format(
 
 
 def get_release_date_and_iterate_type(
-    input_filename: str, file_format: ClinVarIngestFileFormat
+    input_filename: str | ChunkPipe, file_format: ClinVarIngestFileFormat
 ) -> dict[str, str]:
     """
     Returns the release date from inside the file and the iterate type, in a dict.
 
+    For a ChunkPipe, the release date is read from the first chunk of the stream,
+    which is kept as its `head`, so the stream itself is not consumed.
+
     Example:
         get_release_date_and_iterate_type("gs://bucket/ClinVarVCV_2021-04-01.xml.gz", ClinVarIngestFileFormat.VCV)
 
@@ -159,7 +254,12 @@ def get_release_date_and_iterate_type(
     """
 
     def ftp_http_reader(input_filename):
+        if isinstance(input_filename, ChunkPipe):
+            head = io.BytesIO(input_filename.wait_head())
+            return gzip.open(head) if input_filename.name.endswith(".gz") else head
         if input_filename.startswith(("http://", "https://", "ftp://")):
+            import requests
+
             response = requests.get(input_filename, stream=True, timeout=60)
             response.raise_for_status()  # Raises exception for error status codes
             if input_filename.endswith(".gz"):
@@ -181,21 +281,50 @@ def get_release_date_and_iterate_type(
     return {"release_date": release_date, "iterate_type": iterate_type}
 
 
-def parse_and_write_files(
-    input_filename: str,
+def parse_and_write_files(  # noqa: PLR0913
+    input_filename: str | ChunkPipe,
     output_directory: str,
     gzip_output=True,
     disassemble=True,
     jsonify_content=True,
     file_format: ClinVarIngestFileFormat = ClinVarIngestFileFormat.VCV,
     limit: None | int = None,
-) -> dict[str, str]:
+    workers: int = 1,
+    ordered: bool = False,
+    return_stats: bool = False,
+    progress_callback: Callable[[ParseProgress], None] | None = None,
+    progress_interval: float = 60,
+) -> dict[str, str] | tuple[dict[str, str], dict]:
     """
-    Parses input file, writes outputs to output directory.
-
-    Returns the dict of types to their output files.
+    Parses input file, writes outputs to output directory. The input may be a
+    ChunkPipe, to parse a file as it is being copied.
+
+    If `workers` is more than 1, records are parsed and written by that many
+    worker processes, each writing its own part file per type.
+    If `ordered` is also True, the workers' rows are instead written in input
+    order to the same files as with a single worker.
+    See `clinvar_ingest.parallel`.
+
+    Returns the dict of types to their output files. When parsing with
+    multiple workers and not `ordered`, the output file of a type is a wildcard
+    path matching all of its part files.
+
+    If `return_stats` is True, returns a tuple of that dict and a summary of the
+    time spent in each stage of the parse and the rows and bytes written per type.
+    See `clinvar_ingest.stats.ParseStats.summary`.
+
+    If `progress_callback` is given, it is called with a `ParseProgress`, giving
+    the throughput, percent complete and estimated time remaining, each time
+    progress is logged, at most every `progress_interval` seconds, and once more
+    when the input has been read.
+
+    Profiling can be enabled with the CLINVAR_INGEST_PROFILE environment variable,
+    see `clinvar_ingest.profiling`.
     """
-    open_output_files = {}
+    stats = ParseStats()
+    progress = ProgressTracker(
+        _st_size(input_filename), callback=progress_callback, interval=progress_interval, stats=stats
+    )
     release_info = get_release_date_and_iterate_type(input_filename, file_format)
     release_date = release_info["release_date"]
     iterate_type = release_info["iterate_type"]
@@ -204,13 +333,63 @@ def parse_and_write_files(
     # Release directory is within the output directory
     output_release_directory = f"{output_directory}/{release_date}"
 
-    # input_file_size = _st_size(input_filename)
+    with profile_from_env(output_directory):
+        if workers > 1:
+            # Imported here because clinvar_ingest.parallel imports from this module
+            from clinvar_ingest.parallel import parse_and_write_ordered, parse_and_write_shards
+
+            parse_fn = parse_and_write_ordered if ordered else parse_and_write_shards
+            table_file_pairs = parse_fn(
+                input_filename,
+                output_release_directory,
+                release_date=release_date,
+                iterate_type=iterate_type,
+                workers=workers,
+                gzip_output=gzip_output,
+                disassemble=disassemble,
+                jsonify_content=jsonify_content,
+                file_format=file_format,
+                limit=limit,
+                stats=stats,
+                progress=progress,
+            )
+        else:
+            table_file_pairs = _parse_and_write_serial(
+                input_filename,
+                output_release_directory,
+                release_date=release_date,
+                iterate_type=iterate_type,
+                gzip_output=gzip_output,
+                disassemble=disassemble,
+                jsonify_content=jsonify_content,
+                file_format=file_format,
+                limit=limit,
+                stats=stats,
+                progress=progress,
+            )
+
+    summary = stats.summary()
+    _logger.info("Parse stats: %s", json.dumps(summary))
+    if return_stats:
+        return table_file_pairs, summary
+    return table_file_pairs
+
+
+def _parse_and_write_serial(  # noqa: PLR0913
+    input_filename: str | ChunkPipe,
+    output_release_directory: str,
+    release_date: str,
+    iterate_type: str,
+    gzip_output: bool,
+    disassemble: bool,
+    jsonify_content: bool,
+    file_format: ClinVarIngestFileFormat,
+    limit: None | int,
+    stats: ParseStats,
+    progress: ProgressTracker,
+) -> dict[str, str]:
+    open_output_files = {}
     object_count = 0
-    byte_log_progress = make_progress_logger(
-        logger=_logger,
-        fmt="Read {elapsed_value} bytes in {elapsed:.2f}s. Total bytes read: {current_value}.",
-        interval=60,
-    )
     object_log_progress = make_progress_logger(
         logger=_logger,
         fmt=(
@@ -219,17 +398,20 @@ def parse_and_write_files(
             + " in {elapsed:.2f}s. Total: {current_value}."
         ),
         interval=60,
+        details_fn=stats.progress_line,
     )
 
     reader_fn = reader_fn_for_format(file_format)
     _logger.info(f"Reading file format: {file_format} with reader: {reader_fn}")
 
     try:
-        with _open(input_filename) as f_in:
-            byte_log_progress(0)  # initialize
+        with _open_input(input_filename) as (f_in, raw_in):
             object_log_progress(0)  # initialize
 
-            for obj in reader_fn(f_in, disassemble=disassemble):
+            # Time spent in the reader, other than reading the input and constructing
+            # models, is XML parsing
+            objects = stats.timed_iter("xml", reader_fn(TimedReader(f_in, stats), disassemble=disassemble, stats=stats))
+            for obj in objects:
                 entity_type = obj.entity_type
                 f_out = get_open_file_for_writing(
                     open_output_files,
@@ -237,33 +419,25 @@ def parse_and_write_files(
                     label=entity_type,
                     suffix=".ndjson" if not gzip_output else ".ndjson.gz",
                 )
-                obj_dict = dictify(obj)
-                if not isinstance(obj_dict, dict):
-                    raise ValueError(f"Object not dictified: {obj}")
-
-                # jsonify content type fields if requested
-                if jsonify_content and hasattr(type(obj), "jsonifiable_fields"):
-                    for field in type(obj).jsonifiable_fields():
-                        if field in obj_dict:
-                            obj_dict[field] = _jsonify_non_empties(obj_dict[field])
-
-                obj_dict["release_date"] = release_date
-                f_out.write(json.dumps(obj_dict).encode("utf-8"))
-                f_out.write(b"\n")
+                row = stats.timed_call("encode", encode_row, obj, release_date, jsonify_content)
+                stats.timed_call("write", f_out.write, row)
+                stats.count_row(entity_type, len(row))
 
                 # Log offset and count for monitoring
-                byte_log_progress(f_in.tell())
                 if entity_type == iterate_type:
                     object_count += 1
+                    stats.records = object_count
                     object_log_progress(object_count)
+                progress.update(raw_in.bytes_read, object_count)
 
                 if limit and object_count >= limit:
                     _logger.info("Hard limit reached: %d", limit)
                     break
 
             # Log final status
-            byte_log_progress(f_in.tell(), force=True)
+            progress.finish(raw_in.bytes_read, object_count)
             object_log_progress(object_count, force=True)
+            _logger.info(f"Peak RSS: {peak_rss_bytes()} bytes")
 
     except Exception as e:
         _logger.critical("Exception caught in parse_and_write_files")
@@ -271,7 +445,7 @@ def parse_and_write_files(
     finally:
         _logger.debug("Closing output files")
         for f in open_output_files.values():
-            f.close()
+            stats.timed_call("write", f.close)
 
     table_file_pairs = {k: v._name for k, v in open_output_files.items()}
     _logger.info("Output files: %s", json.dumps(table_file_pairs))
@@ -0,0 +1,257 @@
+"""
+Opt-in profiling of production parse runs, controlled by environment variables.
+
+Set CLINVAR_INGEST_PROFILE to a comma separated list of modes:
+
+    cprofile     Profile the parsing process with cProfile for the first
+                 CLINVAR_INGEST_PROFILE_SECONDS seconds (default 300), then write
+                 cprofile-<pid>.prof (loadable with pstats or snakeviz) and
+                 cprofile-<pid>.txt (the top functions by cumulative time).
+    tracemalloc  Trace allocations with CLINVAR_INGEST_TRACEMALLOC_FRAMES frames
+                 (default 10) and every CLINVAR_INGEST_TRACEMALLOC_INTERVAL seconds
+                 (default 600), and at the end, write tracemalloc-<pid>-<n>.txt with
+                 the top allocation sites and the change since the previous snapshot.
+    stacks       On CLINVAR_INGEST_PROFILE_SIGNAL (default SIGUSR1), write the
+                 stacks of all threads to stacks-<pid>-<n>.txt, e.g. after
+                 `kill -USR1 <pid>` on a run which seems stuck or slow.
+
+Files are written to a `profile` directory in the parse output directory, which
+may be local or any URI with a storage backend, see `clinvar_ingest.storage`.
+
+Only the process calling `parse_and_write_files` is profiled with cprofile and
+tracemalloc. Parse workers forked from it do not inherit these profilers, so to
+profile the XML parsing itself, run with a single worker. Workers do inherit the
+stack dump signal handler.
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import signal
+import sys
+import threading
+import traceback
+import tracemalloc
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from clinvar_ingest.storage import get_backend
+
+_logger = logging.getLogger("clinvar_ingest")
+
+PROFILE_MODES = {"cprofile", "tracemalloc", "stacks"}
+# Number of entries in the text summaries of profiles and snapshots
+TOP_ENTRIES = 50
+
+
+@dataclass
+class ProfileConfig:
+    modes: set[str] = field(default_factory=set)
+    cprofile_seconds: float = 300
+    tracemalloc_interval: float = 600
+    tracemalloc_frames: int = 10
+    stack_signal: signal.Signals = signal.SIGUSR1
+
+    @classmethod
+    def from_env(cls, environ: dict[str, str] | None = None) -> "ProfileConfig":
+        """
+        Reads the profiling configuration from the CLINVAR_INGEST_PROFILE* environment variables.
+        """
+        if environ is None:
+            environ = os.environ
+        modes = {m.strip().lower() for m in environ.get("CLINVAR_INGEST_PROFILE", "").split(",") if m.strip()}
+        unknown = modes - PROFILE_MODES
+        if unknown:
+            raise ValueError(f"Unknown CLINVAR_INGEST_PROFILE modes: {sorted(unknown)}, expected {sorted(PROFILE_MODES)}")
+        signal_name = environ.get("CLINVAR_INGEST_PROFILE_SIGNAL", "SIGUSR1").upper()
+        return cls(
+            modes=modes,
+            cprofile_seconds=float(environ.get("CLINVAR_INGEST_PROFILE_SECONDS", 300)),
+            tracemalloc_interval=float(environ.get("CLINVAR_INGEST_TRACEMALLOC_INTERVAL", 600)),
+            tracemalloc_frames=int(environ.get("CLINVAR_INGEST_TRACEMALLOC_FRAMES", 10)),
+            stack_signal=signal.Signals[signal_name if signal_name.startswith("SIG") else f"SIG{signal_name}"],
+        )
+
+
+def _write(path: str, data: bytes):
+    get_backend(path).write_bytes(path, data)
+    _logger.info(f"Wrote profile output {path}")
+
+
+class ProfileSession:
+    """
+    Runs the profilers in `config.modes` between `start` and `stop`, writing their
+    output to `output_directory`.
+    """
+
+    def __init__(self, output_directory: str, config: ProfileConfig):
+        self.output_directory = output_directory
+        self.config = config
+        self.pid = os.getpid()
+        self.profiler = None
+        self.profile_timer = None
+        self.snapshot_count = 0
+        self.prev_snapshot = None
+        self.stop_event = threading.Event()
+        self.snapshot_thread = None
+        self.stack_dump_count = 0
+        self.prev_signal_handler = None
+
+    def _path(self, name: str) -> str:
+        return f"{self.output_directory}/{name}"
+
+    def start(self):
+        _logger.info(f"Profiling modes {sorted(self.config.modes)}, writing to {self.output_directory}")
+        if "cprofile" in self.config.modes:
+            self._start_cprofile()
+        if "tracemalloc" in self.config.modes:
+            self._start_tracemalloc()
+        if "stacks" in self.config.modes:
+            self._start_stacks()
+        _active_sessions.append(self)
+
+    def stop(self):
+        _active_sessions.remove(self)
+        if self.prev_signal_handler is not None:
+            signal.signal(self.config.stack_signal, self.prev_signal_handler)
+        if self.snapshot_thread is not None:
+            self.stop_event.set()
+            self.snapshot_thread.join()
+            self._write_snapshot()
+            tracemalloc.stop()
+        if self.profiler is not None:
+            self._stop_cprofile()
+            self._write_cprofile()
+
+    # cProfile
+
+    def _start_cprofile(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        # cProfile only stops profiling when disabled from the profiled thread, which
+        # a signal handler runs in. Signal handlers can only be set in the main thread,
+        # otherwise the profile covers the whole session.
+        if threading.current_thread() is threading.main_thread():
+            self.profile_timer = signal.signal(signal.SIGALRM, lambda _signum, _frame: self._stop_cprofile())
+            signal.setitimer(signal.ITIMER_REAL, self.config.cprofile_seconds)
+        else:
+            _logger.warning("Not in the main thread, cProfile window is the whole parse")
+
+    def _stop_cprofile(self):
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        if self.profile_timer is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self.profile_timer)
+            self.profile_timer = None
+
+    def _write_cprofile(self):
+        self.profiler.create_stats()
+        # Same format as Profile.dump_stats, which can only write to a local file
+        _write(self._path(f"cprofile-{self.pid}.prof"), marshal.dumps(self.profiler.stats))
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_ENTRIES)
+        _write(self._path(f"cprofile-{self.pid}.txt"), text.getvalue().encode("utf-8"))
+        self.profiler = None
+
+    # tracemalloc
+
+    def _start_tracemalloc(self):
+        tracemalloc.start(self.config.tracemalloc_frames)
+        self.snapshot_thread = threading.Thread(target=self._snapshot_loop, name="tracemalloc-snapshots", daemon=True)
+        self.snapshot_thread.start()
+
+    def _snapshot_loop(self):
+        while not self.stop_event.wait(self.config.tracemalloc_interval):
+            try:
+                self._write_snapshot()
+            except Exception:
+                _logger.exception("Failed to write tracemalloc snapshot")
+
+    def _write_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__)]
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: current {current} bytes, peak {peak} bytes", "", "Top allocation sites:"]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]]
+        if self.prev_snapshot is not None:
+            lines += ["", "Change since previous snapshot:"]
+            lines += [str(stat) for stat in snapshot.compare_to(self.prev_snapshot, "lineno")[:TOP_ENTRIES]]
+        self.prev_snapshot = snapshot
+        _write(
+            self._path(f"tracemalloc-{self.pid}-{self.snapshot_count:03d}.txt"),
+            "\n".join(lines).encode("utf-8"),
+        )
+        self.snapshot_count += 1
+
+    # Stack dumps
+
+    def _start_stacks(self):
+        if threading.current_thread() is not threading.main_thread():
+            _logger.warning("Not in the main thread, cannot handle signals to dump stacks")
+            return
+        self.prev_signal_handler = signal.signal(self.config.stack_signal, self._dump_stacks)
+        _logger.info(f"Send {self.config.stack_signal.name} to process {self.pid} to dump stacks")
+
+    def _dump_stacks(self, _signum, _frame):
+        threads = {t.ident: t.name for t in threading.enumerate()}
+        lines = []
+        for thread_id, frame in sys._current_frames().items():
+            lines.append(f"Thread {threads.get(thread_id, thread_id)}:")
+            lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+            lines.append("")
+        try:
+            _write(
+                # Forked parse workers inherit the handler, so can have their stacks dumped too
+                self._path(f"stacks-{os.getpid()}-{self.stack_dump_count:03d}.txt"),
+                "\n".join(lines).encode("utf-8"),
+            )
+        except Exception:
+            _logger.exception("Failed to write stack dump")
+        self.stack_dump_count += 1
+
+
+_active_sessions: list[ProfileSession] = []
+
+
+def _disable_in_child():
+    """
+    Stops profilers inherited by a forked child process, which would only slow it
+    down since their output is written by the parent.
+    """
+    for session in _active_sessions:
+        if session.profiler is not None:
+            session.profiler.disable()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _active_sessions.clear()
+
+
+os.register_at_fork(after_in_child=_disable_in_child)
+
+
+@contextlib.contextmanager
+def profile_from_env(output_directory: str, config: ProfileConfig | None = None) -> Iterator[ProfileSession | None]:
+    """
+    Profiles the enclosed block as configured by the environment, see the module
+    docstring. Output is written to `output_directory`/profile.
+
+    Yields the ProfileSession, or None if profiling is not enabled.
+    """
+    if config is None:
+        config = ProfileConfig.from_env()
+    if not config.modes:
+        yield None
+        return
+    session = ProfileSession(f"{output_directory}/profile", config)
+    session.start()
+    try:
+        yield session
+    finally:
+        session.stop()
@@ -0,0 +1,176 @@
+"""
+Progress of a parse, as throughput, percent complete and estimated time remaining.
+
+Progress is measured in bytes of the input file as stored, i.e. compressed bytes
+for a gzipped input, counted on the raw stream underneath the decompression.
+Unlike the uncompressed offset, this can be compared to the size of the file.
+"""
+
+import datetime
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field, fields
+
+from clinvar_ingest.stats import ParseStats
+
+_logger = logging.getLogger("clinvar_ingest")
+
+# Weight of the latest rate measurement in the smoothed rates
+DEFAULT_SMOOTHING = 0.3
+
+
+@dataclass
+class ParseProgress:
+    """
+    A snapshot of the progress of a parse.
+
+    `input_size` is None when the size of the input is not known, in which case
+    there is no percent complete or estimated time remaining.
+
+    `entity_rows` are the rows written so far per entity type. With multiple workers,
+    these are only counted when the workers finish. `queue_depths` are the numbers
+    of batches waiting in each queue of a parallel parse. `stage_seconds` is the time
+    spent so far in each stage of the parse, see `clinvar_ingest.stats`.
+    """
+
+    input_bytes: int
+    input_size: int | None
+    records: int
+    elapsed_seconds: float
+    bytes_per_second: float
+    records_per_second: float
+    done: bool = False
+    entity_rows: dict[str, int] = field(default_factory=dict)
+    queue_depths: dict[str, int] = field(default_factory=dict)
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def percent(self) -> float | None:
+        if not self.input_size:
+            return None
+        return min(100.0, 100.0 * self.input_bytes / self.input_size)
+
+    @property
+    def eta_seconds(self) -> float | None:
+        if self.done:
+            return 0.0
+        if not self.input_size or self.bytes_per_second <= 0:
+            return None
+        return max(0, self.input_size - self.input_bytes) / self.bytes_per_second
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "percent": self.percent, "eta_seconds": self.eta_seconds}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ParseProgress":
+        """
+        Inverse of `as_dict`.
+        """
+        return cls(**{f.name: d[f.name] for f in fields(cls) if f.name in d})
+
+    def __str__(self) -> str:
+        if self.percent is None:
+            position = f"{self.input_bytes} input bytes"
+        else:
+            position = f"{self.input_bytes}/{self.input_size} input bytes ({self.percent:.1f}%)"
+        eta = self.eta_seconds
+        eta_str = "unknown" if eta is None else str(datetime.timedelta(seconds=round(eta)))
+        return (
+            f"Read {position} at {self.bytes_per_second:.0f} bytes/s,"
+            f" {self.records} records at {self.records_per_second:.1f} records/s."
+            f" Elapsed: {datetime.timedelta(seconds=round(self.elapsed_seconds))}, ETA: {eta_str}."
+        )
+
+
+class ProgressTracker:
+    """
+    Tracks the progress of a parse, logging it and passing it to `callback` at
+    most every `interval` seconds.
+
+    Rates are exponentially smoothed over the intervals, with `smoothing` as the
+    weight of the most recent interval, so the estimated time remaining follows
+    changes in throughput without jumping around with every record.
+
+    Rows per entity type are taken from `stats`, and queue depths from `queue_depths_fn`,
+    which can be set once the queues exist.
+    """
+
+    def __init__(
+        self,
+        input_size: int | None,
+        callback: Callable[[ParseProgress], None] | None = None,
+        interval: float = 60,
+        smoothing: float = DEFAULT_SMOOTHING,
+        logger: logging.Logger = _logger,
+        stats: ParseStats | None = None,
+        queue_depths_fn: Callable[[], dict[str, int]] | None = None,
+    ):
+        self.input_size = input_size
+        self.callback = callback
+        self.interval = interval
+        self.smoothing = smoothing
+        self.logger = logger
+        self.stats = stats
+        self.queue_depths_fn = queue_depths_fn
+        self.start_time = time.monotonic()
+        self.prev_time = self.start_time
+        self.prev_bytes = 0
+        self.prev_records = 0
+        self.bytes_per_second = None
+        self.records_per_second = None
+
+    def _smooth(self, prev: float | None, current: float) -> float:
+        if prev is None:
+            return current
+        return self.smoothing * current + (1 - self.smoothing) * prev
+
+    def update(self, input_bytes: int, records: int, force: bool = False) -> ParseProgress | None:
+        """
+        Records the input bytes read and records parsed so far. Returns the
+        progress if it was reported, otherwise None.
+        """
+        now = time.monotonic()
+        elapsed = now - self.prev_time
+        if not force and elapsed < self.interval:
+            return None
+        if elapsed > 0:
+            self.bytes_per_second = self._smooth(self.bytes_per_second, (input_bytes - self.prev_bytes) / elapsed)
+            self.records_per_second = self._smooth(self.records_per_second, (records - self.prev_records) / elapsed)
+        self.prev_time = now
+        self.prev_bytes = input_bytes
+        self.prev_records = records
+        return self._report(input_bytes, records, now, done=False)
+
+    def finish(self, input_bytes: int, records: int) -> ParseProgress:
+        """
+        Reports the final progress, with the average rates over the whole parse.
+        """
+        now = time.monotonic()
+        elapsed = now - self.start_time
+        if elapsed > 0:
+            self.bytes_per_second = input_bytes / elapsed
+            self.records_per_second = records / elapsed
+        return self._report(input_bytes, records, now, done=True)
+
+    def _report(self, input_bytes: int, records: int, now: float, done: bool) -> ParseProgress:
+        progress = ParseProgress(
+            input_bytes=input_bytes,
+            input_size=self.input_size,
+            records=records,
+            elapsed_seconds=now - self.start_time,
+            bytes_per_second=self.bytes_per_second or 0.0,
+            records_per_second=self.records_per_second or 0.0,
+            done=done,
+            entity_rows=dict(self.stats.entity_rows) if self.stats is not None else {},
+            queue_depths=self.queue_depths_fn() if self.queue_depths_fn is not None else {},
+            stage_seconds=dict(self.stats.seconds) if self.stats is not None else {},
+        )
+        self.logger.info(str(progress))
+        if self.callback is not None:
+            try:
+                self.callback(progress)
+            except Exception:
+                # A failing consumer of progress updates should not fail the parse
+                self.logger.exception("Exception in parse progress callback")
+        return progress
@@ -3,17 +3,20 @@ Module for iterating over XML files and calling Model constructors
 on appropriate elements.
 """
 
+import io
 import logging
 import xml.etree.ElementTree as ET
 from collections.abc import Iterator
 from enum import StrEnum
 from typing import Any, TextIO
+from xml.parsers import expat
 
 import xmltodict
 
 from clinvar_ingest.model.common import Model
 from clinvar_ingest.model.rcv import RcvMapping
 from clinvar_ingest.model.variation_archive import VariationArchive
+from clinvar_ingest.stats import ParseStats
 
 _logger = logging.getLogger("clinvar_ingest")
 
@@ -124,30 +127,257 @@ def _handle_text_nodes(path, key, value) -> tuple[Any, Any]:  # noqa: ARG001
     return (key, value)
 
 
+class _DictBuilder:
+    """
+    expat handler that builds the same dict as xmltodict.parse with the
+    _handle_text_nodes postprocessor, in a single pass.
+
+    Attributes are put in "@"-prefixed keys, text is put in a "$" key after any
+    attributes and child elements, and an element with only text becomes {"$": text}.
+    Repeated child elements are collapsed into a list. Text is whitespace-stripped
+    and an element with no attributes, children or text is None.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.item = None
+        self.data = []
+
+    def start(self, _name: str, attrs: list[str]):
+        self.stack.append((self.item, self.data))
+        # With ordered_attributes, attrs is a flat [name, value, name, value, ...] list
+        if attrs:
+            self.item = {"@" + k: v for k, v in zip(attrs[0::2], attrs[1::2], strict=True)}
+        else:
+            self.item = None
+        self.data = []
+
+    def end(self, name: str):
+        text = "".join(self.data).strip() if self.data else None
+        value = self.item
+        self.item, self.data = self.stack.pop()
+        if value is None:
+            value = {"$": text} if text else None
+        elif text:
+            value["$"] = text
+
+        if self.item is None:
+            self.item = {}
+        parent = self.item
+        if name in parent:
+            existing = parent[name]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                parent[name] = [existing, value]
+        else:
+            parent[name] = value
+
+    def characters(self, data: str):
+        self.data.append(data)
+
+
+def _ignore_default(_data):
+    pass
+
+
+def _ignore_external_entity(*_args) -> int:
+    # Nonzero tells expat the reference was handled, without loading anything
+    return 1
+
+
 def _parse_xml_document(doc_str: str | bytes):
     """
     Reads an XML document from a string.
+
+    Output is the same as xmltodict.parse(doc_str, postprocessor=_handle_text_nodes),
+    and the expat parser is configured the same way, including not expanding entities.
     """
-    return xmltodict.parse(doc_str, postprocessor=_handle_text_nodes)
+    encoding = None
+    if isinstance(doc_str, str):
+        doc_str = doc_str.encode("utf-8")
+        encoding = "utf-8"
+    builder = _DictBuilder()
+    parser = expat.ParserCreate(encoding)
+    parser.ordered_attributes = True
+    parser.buffer_text = True
+    parser.StartElementHandler = builder.start
+    parser.EndElementHandler = builder.end
+    parser.CharacterDataHandler = builder.characters
+    parser.DefaultHandler = _ignore_default
+    parser.ExternalEntityRefHandler = _ignore_external_entity
+    parser.Parse(doc_str, True)
+    return builder.item
+
+
+def _models_from_dict(elem_d: dict, disassemble=True) -> Iterator[Model]:
+    """
+    Takes a single record parsed into a dict of {tag: contents} and outputs
+    the Model object for it, or its disassembled objects.
+    """
+    if not isinstance(elem_d, dict):
+        raise RuntimeError(f"xmltodict returned non-dict type: ({type(elem_d)}) {elem_d}")
+    if len(elem_d.keys()) > 1:
+        raise RuntimeError(f"parsed dict had more than 1 key: ({elem_d.keys()}) {elem_d}")
+    tag, contents = next(iter(elem_d.items()))
+    model_obj = construct_model(tag, contents)
+    if disassemble:
+        yield from model_obj.disassemble()
+    else:
+        yield model_obj
+
+
+def _timed_models_from_dict(elem_d: dict, disassemble=True, stats: ParseStats | None = None) -> Iterator[Model]:
+    """
+    `_models_from_dict`, timing model construction and disassembly as the "model" stage of `stats`.
+    """
+    models = _models_from_dict(elem_d, disassemble)
+    if stats is None:
+        return models
+    return stats.timed_iter("model", models)
 
 
-def read_clinvar_rcv_xml(reader: TextIO, disassemble=True) -> Iterator[Model]:
-    tag_we_care_about = "ClinVarSet"
-    return _read_clinvar_xml(reader, tag_we_care_about, disassemble)
+def read_clinvar_xml_record(record: bytes, disassemble=True, stats: ParseStats | None = None) -> Iterator[Model]:
+    """
+    Outputs objects for a single record (e.g. one VariationArchive or ClinVarSet
+    element) from its XML bytes, as produced by `frame_clinvar_xml_records`.
 
+    If `stats` is given, XML parsing is timed as its "xml" stage and model
+    construction and disassembly as its "model" stage.
+    """
+    if stats is None:
+        elem_d = _parse_xml_document(record)
+    else:
+        elem_d = stats.timed_call("xml", _parse_xml_document, record)
+    return _timed_models_from_dict(elem_d, disassemble, stats)
 
-def read_clinvar_vcv_xml(reader: TextIO, disassemble=True) -> Iterator[Model]:
-    tag_we_care_about = "VariationArchive"
-    return _read_clinvar_xml(reader, tag_we_care_about, disassemble)
+
+def frame_clinvar_xml_records(
+    reader, tag_we_care_about: str, chunk_size: int = 8 * 1024 * 1024
+) -> Iterator[bytes]:
+    """
+    Generator function that splits a ClinVar XML file into the bytes of each
+    `tag_we_care_about` element, without parsing it.
+    Accepts `reader` as a readable binary file-like object.
+
+    ClinVar records do not nest and are never self-closing, so a record ends at
+    the first matching end tag.
+    Only the record elements themselves are output, so namespace declarations on
+    the root element are not carried along with them.
+    """
+    start_marker = b"<" + tag_we_care_about.encode("utf-8")
+    end_marker = b"</" + tag_we_care_about.encode("utf-8") + b">"
+    # Bytes which may follow the tag name in a start tag
+    name_delimiters = b" \t\r\n>"
+    buf = b""
+    # Offset in buf to search for the next record from
+    pos = 0
+    # Offset in buf to search for the end of the current record from, once started
+    end_search_pos = None
+    eof = False
+    while True:
+        start = buf.find(start_marker, pos)
+        # Skip over tags which only start with the same name
+        while (
+            start != -1
+            and start + len(start_marker) < len(buf)
+            and buf[start + len(start_marker)] not in name_delimiters
+        ):
+            start = buf.find(start_marker, start + 1)
+
+        if start == -1:
+            # Keep any partial start tag at the end of the buffer
+            pos = max(pos, len(buf) - len(start_marker) + 1)
+        elif start + len(start_marker) == len(buf):
+            # Can't tell yet whether this is the tag or only starts like it
+            pos = start
+        else:
+            search_from = start if end_search_pos is None else end_search_pos
+            end = buf.find(end_marker, search_from)
+            if end != -1:
+                end += len(end_marker)
+                yield buf[start:end]
+                pos = end
+                end_search_pos = None
+                continue
+            # Avoid searching the whole record again after reading more,
+            # but keep any partial end tag at the end of the buffer.
+            end_search_pos = max(start, len(buf) - len(end_marker) + 1)
+            pos = start
+
+        if eof:
+            if start != -1:
+                raise ValueError(f"Unterminated {tag_we_care_about} at end of input")
+            return
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            eof = True
+        # Drop what has already been searched, keeping offsets relative to buf
+        if end_search_pos is not None:
+            end_search_pos -= pos
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def frame_clinvar_xml_record_spans(buf, tag_we_care_about: str) -> Iterator[tuple[int, int]]:
+    """
+    Like `frame_clinvar_xml_records`, but over a whole file in memory, e.g. a
+    memory-mapped file, which is searched in place with its `find` method.
+
+    Yields (offset, length) of each `tag_we_care_about` element in `buf`, so the
+    record bytes are only copied, if at all, by whatever reads them.
+    """
+    start_marker = b"<" + tag_we_care_about.encode("utf-8")
+    end_marker = b"</" + tag_we_care_about.encode("utf-8") + b">"
+    # Bytes which may follow the tag name in a start tag
+    name_delimiters = b" \t\r\n>"
+    size = len(buf)
+    pos = 0
+    while True:
+        start = buf.find(start_marker, pos)
+        # Skip over tags which only start with the same name
+        while start != -1 and (
+            start + len(start_marker) == size or buf[start + len(start_marker)] not in name_delimiters
+        ):
+            start = buf.find(start_marker, start + 1)
+        if start == -1:
+            return
+        end = buf.find(end_marker, start)
+        if end == -1:
+            raise ValueError(f"Unterminated {tag_we_care_about} at end of input")
+        end += len(end_marker)
+        yield start, end - start
+        pos = end
+
+
+RECORD_TAGS = {
+    "vcv": "VariationArchive",
+    "rcv": "ClinVarSet",
+}
+
+
+def read_clinvar_rcv_xml(reader: TextIO, disassemble=True, stats: ParseStats | None = None) -> Iterator[Model]:
+    return _read_clinvar_rcv_xml(reader, disassemble, stats)
+
+
+def read_clinvar_vcv_xml(reader: TextIO, disassemble=True, stats: ParseStats | None = None) -> Iterator[Model]:
+    tag_we_care_about = RECORD_TAGS["vcv"]
+    return _read_clinvar_xml(reader, tag_we_care_about, disassemble, stats)
 
 
 def _read_clinvar_xml(
-    reader: TextIO, tag_we_care_about: str, disassemble=True
+    reader: TextIO, tag_we_care_about: str, disassemble=True, stats: ParseStats | None = None
 ) -> Iterator[Model]:
     """
     Generator function that reads a ClinVar Variation XML file and outputs objects.
     Accepts `reader` as a readable TextIO/BytesIO object, or a filename.
+
+    Processed records are cleared and removed from the root element, so memory
+    use does not grow with the number of records in the file.
+
+    If `stats` is given, model construction and disassembly are timed as its "model" stage.
     """
+    root = None
     unclosed = 0
     for event, elem in ET.iterparse(reader, events=["start", "end"]):
         # https://docs.python.org/3/library/xml.etree.elementtree.html#element-objects
@@ -157,6 +387,8 @@ def _read_clinvar_xml(
         # For depth=1 (first level inside the root, unclosed should == 1)
         # ET sends an end event for self-closed tags like e.g. <br/>, so this should work.
         if event == "start":
+            if root is None:
+                root = elem
             unclosed += 1
         elif event == "end":
             unclosed -= 1
@@ -171,18 +403,126 @@ def _read_clinvar_xml(
                 )
             else:
                 elem_d = _parse_xml_document(ET.tostring(elem))
-                if not isinstance(elem_d, dict):
-                    raise RuntimeError(
-                        f"xmltodict returned non-dict type: ({type(elem_d)}) {elem_d}"
-                    )
-                if len(elem_d.keys()) > 1:
-                    raise RuntimeError(
-                        f"parsed dict had more than 1 key: ({elem_d.keys()}) {elem_d}"
-                    )
-                tag, contents = next(iter(elem_d.items()))
-                model_obj = construct_model(tag, contents)
-                if disassemble:
-                    yield from model_obj.disassemble()
-                else:
-                    yield model_obj
+                yield from _timed_models_from_dict(elem_d, disassemble, stats)
             elem.clear()
+            # A cleared element still takes up space as a child of the root
+            if unclosed == 1:
+                root.remove(elem)
+
+
+def read_clinvar_rcv_xml_record(record: bytes, disassemble=True, stats: ParseStats | None = None) -> Iterator[Model]:
+    """
+    Outputs the RcvMapping objects of a single ClinVarSet element from its XML
+    bytes, as produced by `frame_clinvar_xml_records`, reading only the parts
+    of it they need, as `read_clinvar_rcv_xml` does.
+
+    If `stats` is given, XML parsing is timed as its "xml" stage and model
+    construction and disassembly as its "model" stage.
+    """
+    if stats is None:
+        elem_d = _rcv_record_dict(record)
+    else:
+        elem_d = stats.timed_call("xml", _rcv_record_dict, record)
+    return _timed_models_from_dict(elem_d, disassemble, stats)
+
+
+def _read_clinvar_rcv_xml(
+    reader: TextIO, disassemble=True, stats: ParseStats | None = None
+) -> Iterator[Model]:
+    """
+    Generator function that reads a ClinVar RCV XML file and outputs RcvMapping objects.
+    Accepts `reader` as a readable TextIO/BytesIO object, or a filename.
+
+    If `stats` is given, model construction and disassembly are timed as its "model" stage.
+    """
+    for elem_d in _rcv_record_dicts(reader, record_depth=1):
+        yield from _timed_models_from_dict(elem_d, disassemble, stats)
+
+
+def _rcv_record_dicts(reader, record_depth: int) -> Iterator[dict]:  # noqa: PLR0912
+    """
+    Yields a dict of each ClinVarSet element at `record_depth` in `reader`, 1 in
+    a ReleaseSet file, or 0 for a single ClinVarSet.
+
+    RcvMapping only needs the RCV accession, the SCV accessions and the
+    ReferenceClinVarAssertion TraitSet. Rather than converting every ClinVarSet
+    (mostly ClinVarAssertion bodies) to a dict, the accessions are read from element
+    attributes as they are parsed, only the TraitSet subtree is converted, and
+    everything else is cleared as soon as its end tag is seen.
+
+    The dict passed to RcvMapping.from_xml has the same shape as the relevant
+    parts of a fully converted ClinVarSet.
+    """
+    # Depths in a file: ReleaseSet=0, ClinVarSet=1, ReferenceClinVarAssertion/ClinVarAssertion=2
+    assertion_depth = record_depth + 1
+    depth = -1
+    root = None
+    # The depth 2 element currently being read, if any
+    assertion_tag = None
+    rcv_accession = None
+    trait_set = None
+    scv_accessions = []
+    for event, elem in ET.iterparse(reader, events=["start", "end"]):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            if depth == assertion_depth:
+                assertion_tag = elem.tag
+            continue
+        if event != "end":
+            raise ValueError(f"Unexpected event: {event}. Element: {ET.tostring(elem)}")
+
+        if depth == assertion_depth + 1:
+            if elem.tag == "ClinVarAccession":
+                if assertion_tag == "ReferenceClinVarAssertion":
+                    rcv_accession = elem.attrib["Acc"]
+                elif assertion_tag == "ClinVarAssertion":
+                    scv_accessions.append(elem.attrib["Acc"])
+            elif elem.tag == "TraitSet" and assertion_tag == "ReferenceClinVarAssertion":
+                trait_set = _parse_xml_document(ET.tostring(elem))["TraitSet"]
+        elif depth == assertion_depth:
+            assertion_tag = None
+        elif depth == record_depth:
+            if elem.tag != "ClinVarSet":
+                _logger.warning(f"Unexpected element at depth {depth}: {elem.tag}")
+            else:
+                contents = {
+                    "ReferenceClinVarAssertion": {
+                        "ClinVarAccession": {"@Acc": rcv_accession},
+                        "TraitSet": trait_set,
+                    },
+                    "ClinVarAssertion": [
+                        {"ClinVarAccession": {"@Acc": acc}} for acc in scv_accessions
+                    ],
+                }
+                yield {elem.tag: contents}
+            rcv_accession = None
+            trait_set = None
+            scv_accessions = []
+
+        # Clear each ClinVarSet and its first two levels of descendants once read,
+        # and detach the ClinVarSet from the root. Deeper elements are released along
+        # with their cleared ancestor, which keeps the TraitSet intact until its own
+        # end event.
+        if record_depth <= depth <= assertion_depth + 1:
+            elem.clear()
+        if depth == record_depth and elem is not root:
+            root.remove(elem)
+        depth -= 1
+
+
+def _rcv_record_dict(record: bytes) -> dict:
+    """
+    Returns the dict `_rcv_record_dicts` reads from a single ClinVarSet element.
+    """
+    [elem_d] = _rcv_record_dicts(io.BytesIO(record), record_depth=0)
+    return elem_d
+
+
+# Parses the XML of a single record into the dict of {tag: contents} its model is
+# constructed from, for each file format, as a parse of the whole file does
+RECORD_DICT_READERS = {
+    "vcv": _parse_xml_document,
+    "rcv": _rcv_record_dict,
+}
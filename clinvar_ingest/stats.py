@@ -0,0 +1,127 @@
+"""
+Low overhead timers and counters for the stages of a parse.
+
+Stages are timed exclusively: when a stage is timed while another one is being
+timed, e.g. reading the input while parsing XML, its time is taken out of the
+outer stage, so the stage times add up to the time spent in all of them.
+"""
+
+import time
+from collections.abc import Iterable, Iterator
+
+# Order of stages in summaries and progress lines, other stages follow
+STAGE_ORDER = ["read", "frame", "xml", "model", "encode", "write", "wait"]
+
+
+class ParseStats:
+    """
+    Cumulative time spent in each stage, and rows and bytes written per entity type.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.seconds = {}
+        self.bytes_read = 0
+        self.records = 0
+        self.entity_rows = {}
+        self.entity_bytes = {}
+        self._active = []
+
+    def _start(self, stage: str) -> float:
+        self._active.append(stage)
+        return time.perf_counter()
+
+    def _stop(self, stage: str, start: float):
+        elapsed = time.perf_counter() - start
+        self._active.pop()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+        if self._active:
+            outer = self._active[-1]
+            self.seconds[outer] = self.seconds.get(outer, 0.0) - elapsed
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """
+        Yields the items of `iterable`, timing the time spent producing them as `stage`.
+        """
+        it = iter(iterable)
+        while True:
+            start = self._start(stage)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._stop(stage, start)
+            yield item
+
+    def timed_call(self, stage: str, fn, *args, **kwargs):
+        """
+        Returns `fn(*args, **kwargs)`, timing it as `stage`.
+        """
+        start = self._start(stage)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._stop(stage, start)
+
+    def count_row(self, entity_type: str, size: int):
+        self.entity_rows[entity_type] = self.entity_rows.get(entity_type, 0) + 1
+        self.entity_bytes[entity_type] = self.entity_bytes.get(entity_type, 0) + size
+
+    def merge(self, summary: dict):
+        """
+        Adds the stage times and entity type counts of a summary from another
+        process, e.g. a parse worker, to these stats.
+        """
+        for stage, seconds in summary["stages"].items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        for entity_type, counts in summary["entity_types"].items():
+            self.entity_rows[entity_type] = self.entity_rows.get(entity_type, 0) + counts["rows"]
+            self.entity_bytes[entity_type] = self.entity_bytes.get(entity_type, 0) + counts["bytes"]
+
+    def _ordered_stages(self) -> list[str]:
+        return [s for s in STAGE_ORDER if s in self.seconds] + sorted(
+            s for s in self.seconds if s not in STAGE_ORDER
+        )
+
+    def progress_line(self) -> str:
+        """
+        Stage times as a short string for progress logs, e.g. "read=1.2s xml=3.4s model=2.0s".
+        """
+        return " ".join(f"{stage}={self.seconds[stage]:.1f}s" for stage in self._ordered_stages())
+
+    def summary(self) -> dict:
+        """
+        Returns a JSON serializable dict of the stats.
+
+        With multiple worker processes, the stage times are summed over the
+        processes, so they can add up to more than the elapsed time.
+        """
+        return {
+            "elapsed_seconds": time.perf_counter() - self.start_time,
+            "stages": {stage: self.seconds[stage] for stage in self._ordered_stages()},
+            "bytes_read": self.bytes_read,
+            "records": self.records,
+            "entity_types": {
+                entity_type: {"rows": rows, "bytes": self.entity_bytes[entity_type]}
+                for entity_type, rows in self.entity_rows.items()
+            },
+        }
+
+
+class TimedReader:
+    """
+    Wraps a readable file, timing reads as the "read" stage and counting the bytes read.
+    """
+
+    def __init__(self, f, stats: ParseStats):
+        self.f = f
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def read(self, size=-1):
+        result = self.stats.timed_call("read", self.f.read, size)
+        self.stats.bytes_read += len(result)
+        return result
@@ -0,0 +1,308 @@
+"""
+Storage backends for the files read and written by the pipeline, selected by the
+scheme of each URI:
+
+- Local paths and file:// URIs are on the local filesystem
+- gs:// URIs are GCS blobs
+- mem:// URIs are held in the memory of this process, e.g. for tests
+
+gs:// URIs can be redirected to a stand-in for GCS with CLINVAR_INGEST_GS_BACKEND,
+set to "memory", or to a local directory under which gs://bucket/name is stored
+at <directory>/bucket/name. The copy, parse and status steps can then be run and
+benchmarked without a bucket. Memory backends are not shared between processes,
+so parses with more than one worker need a local directory.
+
+    CLINVAR_INGEST_GS_BACKEND=/tmp/fake-gcs clinvar-ingest parse -i gs://bucket/file.xml.gz ...
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from typing import BinaryIO
+
+_logger = logging.getLogger("clinvar_ingest")
+
+# Backend for gs:// URIs: "gcs", "memory" or a local directory
+GS_BACKEND = os.environ.get("CLINVAR_INGEST_GS_BACKEND", "gcs")
+
+
+class StorageBackend(metaclass=ABCMeta):
+    """
+    Reads and writes whole objects by URI. Objects written are only visible
+    once the writer is closed, as with GCS.
+    """
+
+    @abstractmethod
+    def open_read(self, uri: str, prefetch: bool = False) -> BinaryIO:
+        """
+        Returns a binary file-like object reading the object at `uri`.
+        Raises FileNotFoundError if it does not exist.
+
+        With `prefetch`, a backend may read ahead of the caller, for objects
+        that are read through to the end.
+        """
+
+    @abstractmethod
+    def open_write(self, uri: str) -> BinaryIO:
+        """
+        Returns a binary file-like object writing the object at `uri`.
+        """
+
+    @abstractmethod
+    def size(self, uri: str) -> int:
+        """
+        Returns the size of the object at `uri` in bytes.
+        """
+
+    @abstractmethod
+    def exists(self, uri: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, uri: str):
+        pass
+
+    @abstractmethod
+    def list_uris(self, prefix: str) -> list[str]:
+        """
+        Returns the URIs of the objects starting with `prefix`, except those
+        further down a directory after it, like a GCS listing with delimiter /.
+        """
+
+    def read_bytes(self, uri: str) -> bytes:
+        with self.open_read(uri) as f:
+            return f.read()
+
+    def write_bytes(self, uri: str, data: bytes):
+        with self.open_write(uri) as f:
+            f.write(data)
+
+
+class LocalBackend(StorageBackend):
+    """
+    Files on the local filesystem. With a `root` directory, the scheme of each
+    URI is dropped and the rest is a path under `root`, so gs://bucket/name is
+    <root>/bucket/name.
+    """
+
+    def __init__(self, root: str | None = None):
+        self.root = root
+
+    def path(self, uri: str) -> str:
+        if self.root is not None:
+            return os.path.join(self.root, uri.split("://", maxsplit=1)[-1])
+        return uri.removeprefix("file://")
+
+    def open_read(self, uri: str, prefetch: bool = False) -> BinaryIO:  # noqa: ARG002
+        return open(self.path(uri), "rb")  # noqa: SIM115
+
+    def open_write(self, uri: str) -> BinaryIO:
+        path = self.path(uri)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return open(path, "wb")  # noqa: SIM115
+
+    def size(self, uri: str) -> int:
+        return os.path.getsize(self.path(uri))
+
+    def exists(self, uri: str) -> bool:
+        return os.path.exists(self.path(uri))
+
+    def delete(self, uri: str):
+        os.remove(self.path(uri))
+
+    def list_uris(self, prefix: str) -> list[str]:
+        path_prefix = self.path(prefix)
+        directory, name_prefix = os.path.split(path_prefix)
+        if not os.path.isdir(directory or "."):
+            return []
+        return [
+            prefix + name[len(name_prefix) :]
+            for name in sorted(os.listdir(directory or "."))
+            if name.startswith(name_prefix) and os.path.isfile(os.path.join(directory, name))
+        ]
+
+
+class GCSBackend(StorageBackend):
+    """
+    GCS blobs. Blobs opened with `prefetch` are read ahead with concurrent
+    ranged requests, see `cloud.gcs.PrefetchingBlobReader`.
+    """
+
+    # GCS and HTTP clients are imported on first use, which local parses and
+    # parse workers never get to, as they take a while to import
+
+    def open_read(self, uri: str, prefetch: bool = False) -> BinaryIO:
+        from clinvar_ingest.cloud.gcs import blob_reader, prefetching_blob_reader
+
+        if prefetch:
+            return prefetching_blob_reader(uri)
+        return blob_reader(uri)
+
+    def open_write(self, uri: str) -> BinaryIO:
+        from clinvar_ingest.cloud.gcs import blob_writer
+
+        return blob_writer(uri)
+
+    def size(self, uri: str) -> int:
+        from clinvar_ingest.cloud.gcs import blob_size
+
+        return blob_size(uri)
+
+    def exists(self, uri: str) -> bool:
+        from clinvar_ingest.cloud.gcs import parse_blob_uri
+
+        return parse_blob_uri(uri).exists()
+
+    def delete(self, uri: str):
+        from clinvar_ingest.cloud.gcs import parse_blob_uri
+
+        parse_blob_uri(uri).delete()
+
+    def list_uris(self, prefix: str) -> list[str]:
+        from clinvar_ingest.cloud.gcs import _get_gcs_client
+
+        bucket, _, name_prefix = prefix.removeprefix("gs://").partition("/")
+        blobs = _get_gcs_client().list_blobs(bucket, prefix=name_prefix, delimiter="/")
+        return [f"gs://{bucket}/{blob.name}" for blob in blobs]
+
+    def read_bytes(self, uri: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+
+        from clinvar_ingest.cloud.gcs import parse_blob_uri
+
+        try:
+            return parse_blob_uri(uri).download_as_bytes()
+        except NotFound as e:
+            raise FileNotFoundError(uri) from e
+
+
+class _MemoryReader(io.RawIOBase):
+    """
+    Reads `data`, waiting `latency` seconds before each read, and long enough
+    for reads to take at most `bandwidth` bytes per second, if given.
+    """
+
+    def __init__(self, data: bytes, latency: float, bandwidth: float | None):
+        super().__init__()
+        self.view = memoryview(data)
+        self.offset = 0
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self.view) - self.offset)
+        delay = self.latency + (n / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+        b[:n] = self.view[self.offset : self.offset + n]
+        self.offset += n
+        return n
+
+    def tell(self) -> int:
+        return self.offset
+
+
+class _MemoryWriter(io.BytesIO):
+    def __init__(self, backend: "MemoryBackend", uri: str):
+        super().__init__()
+        self.backend = backend
+        self.uri = uri
+
+    def close(self):
+        if not self.closed:
+            with self.backend.lock:
+                self.backend.objects[self.uri] = self.getvalue()
+        super().close()
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Objects held in memory, keyed by URI. Each read waits `latency` seconds,
+    and reads take at most `bandwidth` bytes per second if given, to stand in
+    for a remote store in benchmarks.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float | None = None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.objects: dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def _get(self, uri: str) -> bytes:
+        with self.lock:
+            if uri not in self.objects:
+                raise FileNotFoundError(uri)
+            return self.objects[uri]
+
+    def open_read(self, uri: str, prefetch: bool = False) -> BinaryIO:  # noqa: ARG002
+        return io.BufferedReader(_MemoryReader(self._get(uri), self.latency, self.bandwidth))
+
+    def open_write(self, uri: str) -> BinaryIO:
+        return _MemoryWriter(self, uri)
+
+    def size(self, uri: str) -> int:
+        return len(self._get(uri))
+
+    def exists(self, uri: str) -> bool:
+        with self.lock:
+            return uri in self.objects
+
+    def delete(self, uri: str):
+        with self.lock:
+            if self.objects.pop(uri, None) is None:
+                raise FileNotFoundError(uri)
+
+    def list_uris(self, prefix: str) -> list[str]:
+        with self.lock:
+            return sorted(uri for uri in self.objects if uri.startswith(prefix) and "/" not in uri[len(prefix) :])
+
+
+_backends: dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def _default_backend(scheme: str) -> StorageBackend:
+    if scheme == "file":
+        return LocalBackend()
+    if scheme == "mem":
+        return MemoryBackend()
+    if scheme == "gs":
+        if GS_BACKEND == "gcs":
+            return GCSBackend()
+        _logger.info(f"Using the {GS_BACKEND} backend for gs:// URIs")
+        if GS_BACKEND == "memory":
+            return MemoryBackend()
+        return LocalBackend(root=GS_BACKEND)
+    raise ValueError(f"No storage backend for {scheme}:// URIs")
+
+
+def uri_scheme(uri: str) -> str:
+    """
+    Returns the scheme of `uri`, or "file" for a local path.
+    """
+    return uri.split("://", maxsplit=1)[0] if "://" in uri else "file"
+
+
+def get_backend(uri: str) -> StorageBackend:
+    """
+    Returns the backend for the scheme of `uri`, creating it on first use.
+    """
+    scheme = uri_scheme(uri)
+    with _backends_lock:
+        if scheme not in _backends:
+            _backends[scheme] = _default_backend(scheme)
+        return _backends[scheme]
+
+
+def register_backend(scheme: str, backend: StorageBackend):
+    """
+    Uses `backend` for URIs with `scheme`, e.g. a MemoryBackend for gs:// URIs in a benchmark.
+    """
+    with _backends_lock:
+        _backends[scheme] = backend
@@ -0,0 +1,402 @@
+"""
+Generates synthetic ClinVar releases for scale testing, using the records in
+test/data as templates.
+
+Each synthetic record is a copy of a template record with new accessions and IDs,
+a new number of submissions (SCVs) and a varied number of traits in the
+submitted trait sets. The number of SCVs follows a long tailed distribution where
+most records have 1 or 2, and every `giant_every` records is a giant record with
+thousands of SCVs. VCV templates are chosen by variation type, so the mix of
+SimpleAllele, Haplotype and Genotype records is kept regardless of the templates,
+and the members of Haplotypes and Genotypes are varied in number and in depth
+of nesting, in the records' variations and those of their submissions.
+
+The output only depends on the templates, arguments and seed:
+
+    python -m clinvar_ingest.synthetic -o synthetic-vcv.xml.gz --size 1G --seed 1
+    python -m clinvar_ingest.synthetic -o synthetic-rcv.xml.gz --size 1G --file-format rcv
+"""
+
+import argparse
+import copy
+import glob
+import gzip
+import logging
+import os
+import random
+import sys
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+
+from clinvar_ingest.utils import ClinVarIngestFileFormat
+
+_logger = logging.getLogger("clinvar_ingest")
+
+DEFAULT_TEMPLATES_DIR = "test/data"
+TEMPLATE_FILE_PATTERNS = {
+    ClinVarIngestFileFormat.VCV: "VCV*.xml",
+    ClinVarIngestFileFormat.RCV: "rcv/RCV*.xml",
+}
+
+# Share of VCV records of each variation type
+VARIATION_TYPE_WEIGHTS = {"SimpleAllele": 0.96, "Haplotype": 0.02, "Genotype": 0.02}
+# Shape of the Pareto distribution of SCVs per record. 1.6 gives about 2/3 of records 1 SCV.
+SCV_COUNT_ALPHA = 1.6
+MAX_SCV_COUNT = 1000
+GIANT_SCV_COUNT_RANGE = (2000, 5000)
+# Chance of a submitted trait set getting extra traits, and the most extra traits added
+EXTRA_TRAITS_PROBABILITY = 0.1
+MAX_EXTRA_TRAITS = 3
+# Chance of the members of a Haplotype or Genotype being varied, and the most members added
+VARY_MEMBERS_PROBABILITY = 0.5
+MAX_EXTRA_MEMBERS = 2
+# Chance of a varied Genotype also having a member swapped between a SimpleAllele and a Haplotype
+SWAP_MEMBER_PROBABILITY = 0.5
+# Variations which can be members of a Haplotype or Genotype
+MEMBER_TAGS = ("SimpleAllele", "Haplotype")
+
+VCV_RELEASE_OPENER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<ClinVarVariationRelease xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xsi:noNamespaceSchemaLocation="http://ftp.ncbi.nlm.nih.gov/pub/clinvar/xsd_public/ClinVar_VCV_2.0.xsd" '
+    'ReleaseDate="{release_date}">\n'
+)
+VCV_RELEASE_CLOSER = "</ClinVarVariationRelease>\n"
+RCV_RELEASE_OPENER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<ReleaseSet xsi:noNamespaceSchemaLocation="http://ftp.ncbi.nlm.nih.gov/pub/clinvar/xsd_public/RCV/ClinVar_RCV_2.0.xsd" '
+    'Dated="{release_date}" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" Type="full">\n'
+)
+RCV_RELEASE_CLOSER = "</ReleaseSet>\n"
+
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a size in bytes with an optional K, M, G or T binary unit suffix.
+
+    Example:
+        >>> parse_size("10G")
+        10737418240
+    """
+    size = size.strip().upper().removesuffix("B")
+    if size and size[-1] in SIZE_UNITS:
+        return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+    return int(size)
+
+
+def load_templates(templates_dir: str, file_format: ClinVarIngestFileFormat) -> list[ET.Element]:
+    """
+    Returns the record elements of the template files of `file_format` in `templates_dir`.
+    """
+    tag = "VariationArchive" if file_format == ClinVarIngestFileFormat.VCV else "ClinVarSet"
+    paths = sorted(glob.glob(os.path.join(templates_dir, TEMPLATE_FILE_PATTERNS[file_format])))
+    templates = [elem for path in paths for elem in ET.parse(path).getroot().iter(tag)]
+    if not templates:
+        raise ValueError(f"No {tag} templates found in {templates_dir}")
+    return templates
+
+
+def variation_type(variation_archive: ET.Element) -> str:
+    """
+    Returns the type of the top level variation of a VariationArchive element,
+    SimpleAllele, Haplotype or Genotype.
+    """
+    variation = _variation(_interp_record(variation_archive))
+    if variation is None:
+        raise ValueError(f"No variation in VariationArchive {variation_archive.get('Accession')}")
+    return variation.tag
+
+
+def _variation(elem: ET.Element) -> ET.Element | None:
+    """
+    Returns the SimpleAllele, Haplotype or Genotype child of `elem`, if any.
+    """
+    return next((child for child in elem if child.tag in VARIATION_TYPE_WEIGHTS), None)
+
+
+def _interp_record(variation_archive: ET.Element) -> ET.Element:
+    record = variation_archive.find("ClassifiedRecord")
+    if record is None:
+        record = variation_archive.find("IncludedRecord")
+    return record
+
+
+class SyntheticReleaseGenerator:
+    """
+    Generates synthetic records from templates. Accessions and IDs are numbered
+    from `first_id` so they do not collide with those of real records.
+    """
+
+    def __init__(
+        self,
+        templates: list[ET.Element],
+        file_format: ClinVarIngestFileFormat,
+        seed: int = 0,
+        giant_every: int = 100_000,
+        first_id: int = 900_000_000,
+    ):
+        self.file_format = file_format
+        self.rng = random.Random(seed)  # noqa: S311
+        self.giant_every = giant_every
+        self.next_id = first_id
+        if file_format == ClinVarIngestFileFormat.VCV:
+            self.templates_by_type = {}
+            for template in templates:
+                self.templates_by_type.setdefault(variation_type(template), []).append(template)
+        else:
+            self.templates_by_type = {"ClinVarSet": templates}
+        self.type_weights = [VARIATION_TYPE_WEIGHTS.get(t, 1.0) for t in self.templates_by_type]
+
+    def _new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def scv_count(self, record_index: int) -> int:
+        if self.giant_every and record_index % self.giant_every == self.giant_every // 2:
+            return self.rng.randint(*GIANT_SCV_COUNT_RANGE)
+        return min(int(self.rng.paretovariate(SCV_COUNT_ALPHA)), MAX_SCV_COUNT)
+
+    def _choose_template(self) -> ET.Element:
+        (templates,) = self.rng.choices(list(self.templates_by_type.values()), weights=self.type_weights)
+        return self.rng.choice(templates)
+
+    def _vary_traits(self, trait_set: ET.Element | None):
+        """
+        Sometimes adds copies of existing traits to a submitted trait set.
+        """
+        if trait_set is None or self.rng.random() >= EXTRA_TRAITS_PROBABILITY:
+            return
+        traits = trait_set.findall("Trait")
+        if not traits:
+            return
+        for _ in range(self.rng.randint(1, MAX_EXTRA_TRAITS)):
+            trait_set.append(copy.deepcopy(self.rng.choice(traits)))
+
+    def _vary_members(self, variation: ET.Element | None, renumber: bool = False):
+        """
+        Sometimes varies the members of a Haplotype or Genotype, and of the
+        Haplotypes in a Genotype. Members are added as copies of others or
+        dropped, keeping at least one, and a member of a Genotype may be swapped
+        for one of its SimpleAlleles or for a copy of a Haplotype, which changes
+        the depth of nesting.
+
+        With `renumber`, copied variations get new VariationIDs, keeping those
+        shared within the copy.
+        """
+        if variation is None or variation.tag not in ("Haplotype", "Genotype"):
+            return
+        if variation.tag == "Genotype":
+            for member in variation.findall("Haplotype"):
+                self._vary_members(member, renumber)
+        members = [child for child in variation if child.tag in MEMBER_TAGS]
+        if not members or self.rng.random() >= VARY_MEMBERS_PROBABILITY:
+            return
+
+        def add_copy(position: int, member: ET.Element):
+            member = copy.deepcopy(member)
+            if renumber:
+                variation_ids = {}
+                for elem in member.iter():
+                    old_id = elem.get("VariationID")
+                    if old_id is not None:
+                        if old_id not in variation_ids:
+                            variation_ids[old_id] = str(self._new_id())
+                        elem.set("VariationID", variation_ids[old_id])
+            variation.insert(position, member)
+
+        if variation.tag == "Genotype" and self.rng.random() < SWAP_MEMBER_PROBABILITY:
+            member = self.rng.choice(members)
+            if member.tag == "Haplotype":
+                replacements = member.findall("SimpleAllele")
+            else:
+                replacements = variation.findall("Haplotype")
+            if replacements:
+                add_copy(list(variation).index(member), self.rng.choice(replacements))
+                variation.remove(member)
+                members = [child for child in variation if child.tag in MEMBER_TAGS]
+
+        count = self.rng.randint(1, len(members) + MAX_EXTRA_MEMBERS)
+        # Members come before the other children of a variation
+        position = list(variation).index(members[-1]) + 1
+        for _ in range(count - len(members)):
+            add_copy(position, self.rng.choice(members))
+            position += 1
+        for member in self.rng.sample(members, max(0, len(members) - count)):
+            variation.remove(member)
+
+    def variation_archive(self, record_index: int) -> ET.Element:
+        """
+        Returns a new VariationArchive element.
+        """
+        va = copy.deepcopy(self._choose_template())
+        # Renumber all variations in the record, keeping references between them
+        variation_ids = {}
+        for elem in va.iter():
+            old_id = elem.get("VariationID")
+            if old_id is not None:
+                if old_id not in variation_ids:
+                    variation_ids[old_id] = str(self._new_id())
+                elem.set("VariationID", variation_ids[old_id])
+        va.set("Accession", f"VCV{int(va.get('VariationID')):09d}")
+
+        record = _interp_record(va)
+        self._vary_members(_variation(record), renumber=True)
+        for rcv in record.iterfind("RCVList/RCVAccession"):
+            rcv.set("Accession", f"RCV{self._new_id():09d}")
+
+        assertion_list = record.find("ClinicalAssertionList")
+        if assertion_list is None or len(assertion_list) == 0:
+            return va
+        template_scvs = list(assertion_list)
+        trait_mapping_list = record.find("TraitMappingList")
+        trait_mappings = {}
+        if trait_mapping_list is not None:
+            for tm in list(trait_mapping_list):
+                trait_mappings.setdefault(tm.get("ClinicalAssertionID"), []).append(tm)
+                trait_mapping_list.remove(tm)
+        for scv in template_scvs:
+            assertion_list.remove(scv)
+
+        count = self.scv_count(record_index)
+        for i in range(count):
+            template_scv = template_scvs[i % len(template_scvs)]
+            scv = copy.deepcopy(template_scv)
+            scv_id = str(self._new_id())
+            scv.set("ID", scv_id)
+            scv.find("ClinVarAccession").set("Accession", f"SCV{int(scv_id):09d}")
+            self._vary_traits(scv.find("TraitSet"))
+            self._vary_members(_variation(scv))
+            assertion_list.append(scv)
+            for tm in trait_mappings.get(template_scv.get("ID"), []):
+                new_tm = copy.deepcopy(tm)
+                new_tm.set("ClinicalAssertionID", scv_id)
+                trait_mapping_list.append(new_tm)
+        va.set("NumberOfSubmissions", str(count))
+        return va
+
+    def clinvar_set(self, record_index: int) -> ET.Element:
+        """
+        Returns a new ClinVarSet element.
+        """
+        cs = copy.deepcopy(self._choose_template())
+        cs.set("ID", str(self._new_id()))
+        rca = cs.find("ReferenceClinVarAssertion")
+        rca.find("ClinVarAccession").set("Acc", f"RCV{self._new_id():09d}")
+        self._vary_traits(rca.find("TraitSet"))
+
+        template_scvs = cs.findall("ClinVarAssertion")
+        for scv in template_scvs:
+            cs.remove(scv)
+        for i in range(self.scv_count(record_index)):
+            scv = copy.deepcopy(template_scvs[i % len(template_scvs)])
+            scv_id = self._new_id()
+            scv.set("ID", str(scv_id))
+            scv.find("ClinVarAccession").set("Acc", f"SCV{scv_id:09d}")
+            cs.append(scv)
+        return cs
+
+    def records(self) -> Iterator[bytes]:
+        """
+        Generates serialized records indefinitely.
+        """
+        make_record = (
+            self.variation_archive if self.file_format == ClinVarIngestFileFormat.VCV else self.clinvar_set
+        )
+        record_index = 0
+        while True:
+            elem = make_record(record_index)
+            elem.tail = "\n"
+            yield ET.tostring(elem, encoding="utf-8", xml_declaration=False)
+            record_index += 1
+
+
+def write_synthetic_release(
+    output_path: str,
+    size: int,
+    file_format: ClinVarIngestFileFormat = ClinVarIngestFileFormat.VCV,
+    seed: int = 0,
+    release_date: str = "2000-01-01",
+    templates_dir: str = DEFAULT_TEMPLATES_DIR,
+    giant_every: int = 100_000,
+) -> dict:
+    """
+    Writes a synthetic release of at least `size` bytes of uncompressed XML to
+    `output_path`, gzipped if it ends in .gz.
+
+    Returns a dict with the number of records and bytes of XML written.
+    """
+    templates = load_templates(templates_dir, file_format)
+    generator = SyntheticReleaseGenerator(templates, file_format, seed=seed, giant_every=giant_every)
+    if file_format == ClinVarIngestFileFormat.VCV:
+        opener, closer = VCV_RELEASE_OPENER, VCV_RELEASE_CLOSER
+    else:
+        opener, closer = RCV_RELEASE_OPENER, RCV_RELEASE_CLOSER
+
+    if output_path.endswith(".gz"):
+        # A fixed mtime keeps the gzip header, and so the output, deterministic
+        f_out = gzip.GzipFile(output_path, mode="wb", compresslevel=6, mtime=0)
+    else:
+        f_out = open(output_path, "wb")  # noqa: SIM115
+    record_count = 0
+    with f_out:
+        written = f_out.write(opener.format(release_date=release_date).encode("utf-8"))
+        for record in generator.records():
+            if written >= size:
+                break
+            written += f_out.write(record)
+            record_count += 1
+        written += f_out.write(closer.encode("utf-8"))
+    _logger.info(f"Wrote {record_count} records, {written} bytes of XML to {output_path}")
+    return {"records": record_count, "xml_bytes": written}
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a synthetic ClinVar release from template records")
+    parser.add_argument("-o", "--output", required=True, help="Output file, gzipped if it ends in .gz")
+    parser.add_argument(
+        "--size",
+        required=True,
+        type=parse_size,
+        help="Uncompressed size of the release, in bytes or with a unit, e.g. 1G",
+    )
+    parser.add_argument(
+        "--file-format",
+        type=ClinVarIngestFileFormat,
+        choices=list(ClinVarIngestFileFormat),
+        default=ClinVarIngestFileFormat.VCV,
+        help="Format of the release (default: vcv)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--release-date", default="2000-01-01", help="Release date of the release")
+    parser.add_argument(
+        "--templates-dir",
+        default=DEFAULT_TEMPLATES_DIR,
+        help=f"Directory of template files (default: {DEFAULT_TEMPLATES_DIR})",
+    )
+    parser.add_argument(
+        "--giant-every",
+        type=int,
+        default=100_000,
+        help="Make one in this many records a giant record with thousands of SCVs, 0 for none (default: 100000)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    write_synthetic_release(
+        args.output,
+        args.size,
+        file_format=args.file_format,
+        seed=args.seed,
+        release_date=args.release_date,
+        templates_dir=args.templates_dir,
+        giant_every=args.giant_every,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
+import resource
+import sys
 import time
+from collections.abc import Callable
 from enum import StrEnum
 from typing import Any
 
@@ -96,7 +99,14 @@ def flatten1(things: list[list[Any]]) -> list[Any]:
     ]
 
 
-def make_progress_logger(logger, fmt: str, max_value: int = 0, interval: int = 10):
+def make_progress_logger(
+    logger, fmt: str, max_value: int = 0, interval: int = 10, details_fn: Callable[[], str] | None = None
+):
+    """
+    Returns a function which logs progress with `fmt` at most every `interval` seconds.
+    If `details_fn` is given, its return value is appended to each logged line.
+    """
+
     def log_progress(current_value, force=False):
         if getattr(log_progress, "prev_log_time", None) is None:
             log_progress.prev_log_time = time.time()
@@ -107,14 +117,15 @@ def make_progress_logger(logger, fmt: str, max_value: int = 0, interval: int = 1
         if force or now - log_progress.prev_log_time > interval:
             elapsed = now - log_progress.prev_log_time
             elapsed_value = current_value - log_progress.prev_value
-            logger.info(
-                fmt.format(
-                    current_value=current_value,
-                    elapsed=elapsed,
-                    elapsed_value=elapsed_value,
-                    max_value=log_progress.max_value,
-                )
+            msg = fmt.format(
+                current_value=current_value,
+                elapsed=elapsed,
+                elapsed_value=elapsed_value,
+                max_value=log_progress.max_value,
             )
+            if details_fn is not None:
+                msg = f"{msg} {details_fn()}"
+            logger.info(msg)
 
             log_progress.prev_log_time = now
             log_progress.prev_value = current_value
@@ -122,6 +133,17 @@ def make_progress_logger(logger, fmt: str, max_value: int = 0, interval: int = 1
     return log_progress
 
 
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of the current process, in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
 def make_counter():
     """
     Create a counter that starts at 0 and increments by 1 each time it is iterated on.
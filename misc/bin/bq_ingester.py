@@ -13,19 +13,10 @@ import traceback
 from google.cloud import bigquery
 from google.cloud.storage import Client as GCSClient
 
-from clinvar_ingest.api.model.requests import (
-    CreateExternalTablesRequest,
-    CreateInternalTablesRequest,
-    DropExternalTablesRequest,
-    walk_and_replace,
-)
+from clinvar_ingest.api.model.requests import CreateExternalTablesRequest
 from clinvar_ingest.cloud.bigquery import processing_history
-from clinvar_ingest.cloud.bigquery.create_tables import (
-    create_internal_tables,
-    drop_external_tables,
-    ensure_dataset_exists,
-    run_create_external_tables,
-)
+from clinvar_ingest.cloud.bigquery.create_tables import ensure_dataset_exists
+from clinvar_ingest.cloud.bigquery.load_tables import run_load_tables
 from clinvar_ingest.config import get_env
 from clinvar_ingest.slack import send_slack_message
 
@@ -233,90 +224,34 @@ for row in rows_to_ingest:
     _logger.info(msg)
     send_slack_message(msg)
 
-    # Create VCV external tables
-    vcv_create_tables_request = CreateExternalTablesRequest(
+    # Load the VCV tables, then the RCV tables, with load jobs for all the
+    # tables of each submitted at once
+    vcv_load_tables_request = CreateExternalTablesRequest(
         destination_dataset=target_dataset_name,
         source_table_paths=vcv_parsed_files,
     )
     _logger.info(
-        f"VCV Create External Tables request: {vcv_create_tables_request.model_dump_json()}"
-    )
-    vcv_create_tables_response = run_create_external_tables(vcv_create_tables_request)
-    vcv_ext_resp_json = json.dumps(
-        walk_and_replace(vcv_create_tables_response, processing_history._dump_fn)
-    )
-    _logger.info(f"VCV Create External Tables response: {vcv_ext_resp_json}")
-
-    # Create RCV external tables
-    rcv_create_tables_request = CreateExternalTablesRequest(
-        destination_dataset=target_dataset_name,
-        source_table_paths=rcv_parsed_files,
-    )
-    _logger.info(
-        f"RCV Create External Tables request: {rcv_create_tables_request.model_dump_json()}"
-    )
-    rcv_create_tables_response = run_create_external_tables(rcv_create_tables_request)
-    rcv_ext_resp_json = json.dumps(
-        walk_and_replace(rcv_create_tables_response, processing_history._dump_fn)
-    )
-    _logger.info(f"RCV Create External Tables response: {rcv_ext_resp_json}")
-
-    # VCV create internal tables
-    vcv_create_internal_tables_request = CreateInternalTablesRequest(
-        source_dest_table_map={
-            # source -> destination
-            str(table): str(table).replace("_external", "")
-            for _, table in vcv_create_tables_response.items()
-        }
-    )
-    _logger.info(
-        f"VCV Create Internal Tables request: {vcv_create_internal_tables_request.model_dump_json()}"
+        f"VCV Load Tables request: {vcv_load_tables_request.model_dump_json()}"
     )
-    vcv_create_internal_tables_response = create_internal_tables(
-        vcv_create_internal_tables_request
+    vcv_load_tables_response = run_load_tables(
+        vcv_load_tables_request, client=bq_client, gcs_client=_get_gcs_client()
     )
     _logger.info(
-        f"VCV Create Internal Tables response: {vcv_create_internal_tables_response.model_dump_json()}"
+        f"VCV Load Tables response: {json.dumps({k: vars(v) for k, v in vcv_load_tables_response.items()})}"
     )
 
-    # RCV create internal tables
-    rcv_create_internal_tables_request = CreateInternalTablesRequest(
-        source_dest_table_map={
-            # source -> destination
-            str(table): str(table).replace("_external", "")
-            for _, table in rcv_create_tables_response.items()
-        }
-    )
-    _logger.info(
-        f"RCV Create Internal Tables request: {rcv_create_internal_tables_request.model_dump_json()}"
-    )
-    rcv_create_internal_tables_response = create_internal_tables(
-        rcv_create_internal_tables_request
-    )
-    _logger.info(
-        f"RCV Create Internal Tables response: {rcv_create_internal_tables_response.model_dump_json()}"
-    )
-
-    # Drop VCV external tables
-    vcv_drop_external_tables_request = DropExternalTablesRequest(
-        root=vcv_create_tables_response
+    rcv_load_tables_request = CreateExternalTablesRequest(
+        destination_dataset=target_dataset_name,
+        source_table_paths=rcv_parsed_files,
     )
     _logger.info(
-        f"VCV Drop External Tables request: {vcv_drop_external_tables_request.model_dump_json()}"
+        f"RCV Load Tables request: {rcv_load_tables_request.model_dump_json()}"
     )
-    vcv_drop_external_tables_response = drop_external_tables(
-        vcv_drop_external_tables_request
-    )
-
-    # Drop RCV external tables
-    rcv_drop_external_tables_request = DropExternalTablesRequest(
-        root=rcv_create_tables_response
+    rcv_load_tables_response = run_load_tables(
+        rcv_load_tables_request, client=bq_client, gcs_client=_get_gcs_client()
     )
     _logger.info(
-        f"RCV Drop External Tables request: {rcv_drop_external_tables_request.model_dump_json()}"
-    )
-    rcv_drop_external_tables_response = drop_external_tables(
-        rcv_drop_external_tables_request
+        f"RCV Load Tables response: {json.dumps({k: vars(v) for k, v in rcv_load_tables_response.items()})}"
     )
 
     # Update the processing history table to insert the final release date into the VCV
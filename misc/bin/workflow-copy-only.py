@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import logging
 import os
-from pathlib import Path, PurePosixPath
+from pathlib import PurePosixPath
 
 from google.cloud.storage import Client as GCSClient
 
@@ -9,7 +9,8 @@ from clinvar_ingest.api.model.requests import (
     ClinvarFTPWatcherRequest,
     CopyResponse,
 )
-from clinvar_ingest.cloud.gcs import copy_file_to_bucket, http_download_requests
+from clinvar_ingest.cloud.gcs import http_get_md5
+from clinvar_ingest.cloud.streaming import existing_copy_checksums, stream_copy
 from clinvar_ingest.config import get_env
 from clinvar_ingest.parse import ClinVarIngestFileFormat
 from clinvar_ingest.slack import send_slack_message
@@ -97,46 +98,45 @@ def copy(payload: ClinvarFTPWatcherRequest, skip_existing: bool = True) -> CopyR
         f"{source_base}/{source_dir.relative_to(source_dir.anchor) / source_file}"
     )
 
+    scheme = source_host.split("://", maxsplit=1)[0]
+    if scheme not in ["http", "https", "gs"]:
+        raise ValueError(f"Unsupported host scheme: {source_host}")
+    # ClinVar publishes an MD5 checksum file alongside each release
+    expected_md5 = http_get_md5(f"{source_path}.md5") if scheme != "gs" else None
+
     if skip_existing:
-        # If the blob already exists and the size matches the expected size
-        # from the `payload`, return early.
-        bucket = client.bucket(env.bucket_name)
-        # Remove the scheme and bucket name
-        gcs_blob_name = gcs_path[len(f"gs://{env.bucket_name}/") :]
-        # Retrieve blob metadata
-        blob = bucket.get_blob(gcs_blob_name)
-
-        if blob is not None and blob.size == source_file_size:
+        # If the blob already exists and its size and checksums match the
+        # source, return early.
+        existing = existing_copy_checksums(
+            source_path, gcs_path, source_file_size, expected_md5=expected_md5, client=client
+        )
+        if existing is not None:
+            crc32c, md5 = existing
             _logger.info(
-                f"Skipping copy, file already exists and size matches: {gcs_path}"
+                f"Skipping copy, file already exists and checksums match: {gcs_path}"
+            )
+            return CopyResponse(
+                ftp_path=source_path, gcs_path=gcs_path, crc32c=crc32c, md5=md5
             )
-            return CopyResponse(ftp_path=source_path, gcs_path=gcs_path)
-
-    if source_host.split("://", maxsplit=1)[0] in ["http", "https", "ftp"]:
-        _logger.info(f"Copying {source_path} to {gcs_path}")
-        local_path = http_download_requests(
-            http_uri=source_path,
-            local_path=source_file,  # Just the file name, relative to current working directory
-            file_size=source_file_size,
-        )
-        _logger.info(f"Downloaded {source_path} to {local_path}")
-
-    elif source_host.startswith("gs://"):
-        _logger.info(f"Copying {source_path} to {gcs_path}")
-        with open(source_file, "wb") as f:
-            client.download_blob_to_file(source_path, f)
-        local_path = Path(source_file)
-        _logger.info(f"Downloaded {source_path} to {local_path}")
-
-    else:
-        raise ValueError(f"Unsupported host scheme: {source_host}")
 
-    # Upload file to GCS
-    copy_file_to_bucket(
-        local_file_uri=str(local_path), remote_blob_uri=gcs_path, client=client
+    # The file is streamed straight into the bucket without staging it on local
+    # disk. If the copy fails, retrying the workflow resumes it from the checkpoint.
+    _logger.info(f"Copying {source_path} to {gcs_path}")
+    copy_result = stream_copy(
+        source_uri=source_path,
+        destination_uri=gcs_path,
+        size=source_file_size,
+        checkpoint_uri=f"{gcs_base}/copy-checkpoint.json",
+        client=client,
+        expected_md5=expected_md5,
+    )
+    _logger.info(f"Copied {source_path} to {gcs_path}")
+    return CopyResponse(
+        ftp_path=source_path,
+        gcs_path=gcs_path,
+        crc32c=copy_result.crc32c,
+        md5=copy_result.md5,
     )
-    _logger.info(f"Uploaded {local_path} to {gcs_path}")
-    return CopyResponse(ftp_path=source_path, gcs_path=gcs_path)
 
 
 try:
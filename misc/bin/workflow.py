@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
+import functools
 import logging
 import os
 import sys
 import traceback
-from pathlib import Path, PurePosixPath
+from pathlib import PurePosixPath
 
 from google.cloud import bigquery
 from google.cloud.storage import Client as GCSClient
@@ -15,12 +16,20 @@ from clinvar_ingest.api.model.requests import (
     ParseResponse,
 )
 from clinvar_ingest.cloud.bigquery import processing_history
-from clinvar_ingest.cloud.gcs import copy_file_to_bucket, http_download_requests
+from clinvar_ingest.cloud.gcs import http_get_md5
+from clinvar_ingest.cloud.streaming import (
+    existing_copy_checksums,
+    stream_copy,
+    stream_copy_and_parse,
+)
 from clinvar_ingest.config import get_env
+from clinvar_ingest.fs import ChunkPipe
 from clinvar_ingest.parse import (
     ClinVarIngestFileFormat,
     get_release_date_and_iterate_type,
     parse_and_write_files,
+    write_parse_progress,
+    write_parse_stats,
 )
 from clinvar_ingest.slack import send_slack_message
 
@@ -119,6 +128,8 @@ ftp_file_name_release_date = wf_input.release_date.isoformat()
 
 # Lookup one more val just for copy-only mode
 copy_only = os.environ.get("CLINVAR_INGEST_COPY_ONLY", "false").lower() == "true"
+# Parse the file while copying it, rather than after
+tee_parse = os.environ.get("CLINVAR_INGEST_TEE_PARSE", "false").lower() == "true"
 
 _logger.info(
     f"File mode: {file_mode}, ftp_file_name_release_date: {ftp_file_name_release_date}"
@@ -190,12 +201,63 @@ rollback_rows.append(
 )
 
 
+################################################################
+# Reads an XML file from GCS, parses it, and writes the parsed data to GCS
+
+
+def parse(
+    payload: ParseRequest, limit=None, input_file: str | ChunkPipe | None = None
+) -> ParseResponse:
+    """
+    `input_file`, if given, is parsed instead of `payload.input_path`, e.g. a
+    ChunkPipe of the file while it is copied to `payload.input_path`.
+    """
+    _logger.info(f"parse payload: {payload.model_dump_json()}")
+    parse_format_mode = ClinVarIngestFileFormat(
+        wf_input.file_format or env.file_format_mode
+    )
+    _logger.info(f"Parsing file using mode: {parse_format_mode}")
+    execution_prefix = f"{env.executions_output_prefix}/{workflow_execution_id}"
+    parse_output_path = (
+        f"gs://{env.bucket_name}/{execution_prefix}/{env.parse_output_prefix}"
+    )
+    output_files, stats = parse_and_write_files(
+        input_file if input_file is not None else payload.input_path,
+        parse_output_path,
+        disassemble=payload.disassemble,
+        jsonify_content=payload.jsonify_content,
+        file_format=parse_format_mode,
+        limit=limit,
+        workers=payload.workers,
+        ordered=payload.ordered,
+        return_stats=True,
+        progress_callback=functools.partial(write_parse_progress, output_directory=parse_output_path),
+    )
+    write_parse_stats(stats, parse_output_path)
+    return ParseResponse(parsed_files=output_files, stats=stats)
+
+
+def parse_request(input_path: str) -> ParseRequest:
+    return ParseRequest(
+        input_path=input_path,
+        workers=int(os.environ.get("CLINVAR_INGEST_PARSE_WORKERS", "1")),
+        ordered=os.environ.get("CLINVAR_INGEST_PARSE_ORDERED", "false").lower() == "true",
+    )
+
+
 ################################################################
 # Run copy step. Copies a source XML file from an HTTP/FTP server to GCS
 # If the host is a GCS bucket, it will download from there rather than using HTTP
+# With tee_parse, the file is also parsed from the same stream as it is copied
 
 
-def copy(payload: ClinvarFTPWatcherRequest, skip_existing: bool = True) -> CopyResponse:
+def copy(
+    payload: ClinvarFTPWatcherRequest, skip_existing: bool = True, tee_parse: bool = False
+) -> tuple[CopyResponse, ParseResponse | None]:
+    """
+    Returns the copy response, and the parse response if the file was parsed
+    while it was copied.
+    """
     _logger.info(f"copy payload: {payload.model_dump_json()}")
 
     gcs_base = (
@@ -208,52 +270,58 @@ def copy(payload: ClinvarFTPWatcherRequest, skip_existing: bool = True) -> CopyR
     source_host = str(payload.host)
     source_file_size = payload.size
 
+    scheme = source_host.split("://", maxsplit=1)[0]
+    if scheme not in ["http", "https", "gs"]:
+        raise ValueError(f"Unsupported host scheme: {source_host}")
+    # ClinVar publishes an MD5 checksum file alongside each release
+    expected_md5 = http_get_md5(f"{source_path}.md5") if scheme != "gs" else None
+
     if skip_existing:
-        # If the blob already exists and the size matches the expected size
-        # from the `payload`, return early.
-        bucket = _get_gcs_client().bucket(env.bucket_name)
-        # Remove the scheme and bucket name
-        gcs_blob_name = gcs_path[len(f"gs://{env.bucket_name}/") :]
-        # Retrieve blob metadata
-        blob = bucket.get_blob(gcs_blob_name)
-
-        if blob is not None and blob.size == source_file_size:
+        # If the blob already exists and its size and checksums match the
+        # source, return early.
+        existing = existing_copy_checksums(
+            source_path, gcs_path, source_file_size, expected_md5=expected_md5, client=_get_gcs_client()
+        )
+        if existing is not None:
+            crc32c, md5 = existing
             _logger.info(
-                f"Skipping copy, file already exists and size matches: {gcs_path}"
+                f"Skipping copy, file already exists and checksums match: {gcs_path}"
             )
-            return CopyResponse(ftp_path=source_path, gcs_path=gcs_path)
-
-    if source_host.split("://", maxsplit=1)[0] in ["http", "https", "ftp"]:
-        _logger.info(f"Copying {source_path} to {gcs_path}")
-        local_path = http_download_requests(
-            http_uri=source_path,
-            local_path=source_file,  # Just the file name, relative to current working directory
-            file_size=source_file_size,
+            return CopyResponse(
+                ftp_path=source_path, gcs_path=gcs_path, crc32c=crc32c, md5=md5
+            ), None
+
+    # The file is streamed straight into the bucket without staging it on local
+    # disk. If the copy fails, retrying the workflow resumes it from the checkpoint.
+    _logger.info(f"Copying {source_path} to {gcs_path}")
+    copy_kwargs = {
+        "source_uri": source_path,
+        "destination_uri": gcs_path,
+        "size": source_file_size,
+        "checkpoint_uri": f"{gcs_base}/copy-checkpoint.json",
+        "client": _get_gcs_client(),
+        "expected_md5": expected_md5,
+    }
+    parse_response = None
+    if tee_parse:
+        # Falls back to parsing the copied file if parsing the stream fails
+        copy_result, parse_response = stream_copy_and_parse(
+            parse_fn=lambda input_file: parse(parse_request(gcs_path), input_file=input_file),
+            **copy_kwargs,
         )
-        _logger.info(f"Downloaded {source_path} to {local_path}")
-
-    elif source_host.startswith("gs://"):
-        _logger.info(f"Copying {source_path} to {gcs_path}")
-        with open(source_file, "wb") as f:
-            _get_gcs_client().download_blob_to_file(source_path, f)
-        local_path = Path(source_file)
-        _logger.info(f"Downloaded {source_path} to {local_path}")
-
     else:
-        raise ValueError(f"Unsupported host scheme: {source_host}")
-
-    # Upload file to GCS
-    copy_file_to_bucket(
-        local_file_uri=str(local_path),
-        remote_blob_uri=gcs_path,
-        client=_get_gcs_client(),
-    )
-    _logger.info(f"Uploaded {local_path} to {gcs_path}")
-    return CopyResponse(ftp_path=source_path, gcs_path=gcs_path)
+        copy_result = stream_copy(**copy_kwargs)
+    _logger.info(f"Copied {source_path} to {gcs_path}")
+    return CopyResponse(
+        ftp_path=source_path,
+        gcs_path=gcs_path,
+        crc32c=copy_result.crc32c,
+        md5=copy_result.md5,
+    ), parse_response
 
 
 try:
-    copy_response = copy(wf_input)
+    copy_response, parse_response = copy(wf_input, tee_parse=tee_parse and not copy_only)
     _logger.info(f"Copy response: {copy_response.model_dump_json()}")
 except Exception as e:
     msg = "Failed during 'copy'."
@@ -268,36 +336,12 @@ if copy_only:
     send_slack_message(msg)
     sys.exit(0)
 
-################################################################
-# Reads an XML file from GCS, parses it, and writes the parsed data to GCS
-
-
-def parse(payload: ParseRequest, limit=None) -> ParseResponse:
-    _logger.info(f"parse payload: {payload.model_dump_json()}")
-    parse_format_mode = ClinVarIngestFileFormat(
-        wf_input.file_format or env.file_format_mode
-    )
-    _logger.info(f"Parsing file using mode: {parse_format_mode}")
-    execution_prefix = f"{env.executions_output_prefix}/{workflow_execution_id}"
-    parse_output_path = (
-        f"gs://{env.bucket_name}/{execution_prefix}/{env.parse_output_prefix}"
-    )
-    output_files = parse_and_write_files(
-        payload.input_path,
-        parse_output_path,
-        disassemble=payload.disassemble,
-        jsonify_content=payload.jsonify_content,
-        file_format=parse_format_mode,
-        limit=limit,
-    )
-    return ParseResponse(parsed_files=output_files)
-
-
 try:
-    parse_response = parse(
-        ParseRequest(input_path=copy_response.gcs_path),
-        #limit=1000,
-    )
+    if parse_response is None:
+        parse_response = parse(
+            parse_request(copy_response.gcs_path),
+            #limit=1000,
+        )
     _logger.info(f"Parse response: {parse_response.model_dump_json}")
 except Exception as e:
     msg = "Failed during 'parse'."
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from clinvar_ingest import storage
+from clinvar_ingest.api.main import app
+from clinvar_ingest.api.status_file import write_status_file
+from clinvar_ingest.cloud.streaming import StreamCopyResult
+from clinvar_ingest.status import StepName, StepStatus
+
+COPY_BODY = {
+    "Name": "ClinVarVariationRelease_2023-1104.xml.gz",
+    "Size": 10,
+    "Released": "2022-12-05 15:47:16",
+    "Last Modified": "2023-12-05 15:47:16",
+    "Directory": "/pub/clinvar/xml/clinvar_variation/weekly_release",
+    "Host": "https://ftp.ncbi.nlm.nih.gov",
+    "Release Date": "2023-12-04",
+}
+
+
+@pytest.fixture
+def memory_bucket(monkeypatch):
+    monkeypatch.setattr(storage, "_backends", {})
+    monkeypatch.setattr(storage, "GS_BACKEND", "memory")
+
+
+def parse_events(lines) -> list[tuple[str, dict]]:
+    events = []
+    event = None
+    for line in lines:
+        if line.startswith("event: "):
+            event = line.removeprefix("event: ")
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line.removeprefix("data: "))))
+    return events
+
+
+def test_step_events_late_subscriber(memory_bucket, env_config):
+    prefix = f"{env_config.executions_output_prefix}/test-execution-id"
+    write_status_file(env_config.bucket_name, prefix, StepName.COPY, StepStatus.STARTED)
+    write_status_file(env_config.bucket_name, prefix, StepName.COPY, StepStatus.SUCCEEDED, message="copied")
+
+    with (
+        patch.object(
+            storage.MemoryBackend, "list_uris", autospec=True, side_effect=storage.MemoryBackend.list_uris
+        ) as list_uris,
+        TestClient(app) as client,
+    ):
+        response = client.get("/step_events/test-execution-id")
+    assert response.status_code == 200
+    # The current statuses are read from one listing of the status files
+    assert list_uris.call_count == 1
+    assert response.headers["content-type"].startswith("text/event-stream")
+    # The stream ends with the final status, as no steps are running
+    [(event, data)] = parse_events(response.text.splitlines())
+    assert event == "status"
+    assert data["step_name"] == StepName.COPY
+    assert data["step_status"] == StepStatus.SUCCEEDED
+    assert data["message"] == "copied"
+
+
+def test_step_events_running_step(memory_bucket, env_config):
+    release = threading.Event()
+
+    def fake_stream_copy(source_uri, destination_uri, size, on_chunk, **kwargs):
+        assert release.wait(10)
+        on_chunk(0, memoryview(b"01234"))
+        on_chunk(5, memoryview(b"56789"))
+        return StreamCopyResult(source_uri, destination_uri, size, 1.0, 0, crc32c="00000000")
+
+    with (
+        patch("clinvar_ingest.api.steps.stream_copy", fake_stream_copy),
+        patch("clinvar_ingest.api.steps.http_get_md5", return_value=None),
+        patch("clinvar_ingest.api.steps.STEP_PROGRESS_INTERVAL", 0),
+        patch("clinvar_ingest.api.jobs.JOB_WORKER_TYPE", "thread"),
+        TestClient(app) as client,
+    ):
+        job_id = client.post("/copy/test-execution-id", json=COPY_BODY).json()["job_id"]
+
+        # The test client returns the stream once it has ended, so the copy
+        # goes ahead once the stream has subscribed
+        def release_when_subscribed():
+            while not app.step_events.subscribers.get("test-execution-id"):
+                time.sleep(0.01)
+            release.set()
+
+        threading.Thread(target=release_when_subscribed, daemon=True).start()
+        events = parse_events(client.get("/step_events/test-execution-id").text.splitlines())
+
+    assert [(event, data.get("step_status")) for event, data in events] == [
+        ("status", StepStatus.STARTED),
+        ("progress", None),
+        ("progress", None),
+        ("status", StepStatus.SUCCEEDED),
+    ]
+    progress = [data for event, data in events if event == "progress"]
+    assert {data["job_id"] for data in progress} == {job_id}
+    assert [data["progress"]["bytes_copied"] for data in progress] == [5, 10]
+    assert progress[-1]["progress"]["percent"] == 100.0
+    assert json.loads(events[-1][1]["message"])["crc32c"] == "00000000"
+
+
+def test_step_events_before_submission(memory_bucket, env_config):
+    def fake_stream_copy(source_uri, destination_uri, size, on_chunk, **kwargs):
+        return StreamCopyResult(source_uri, destination_uri, size, 1.0, 0, crc32c="00000000")
+
+    events = []
+    with (
+        patch("clinvar_ingest.api.steps.stream_copy", fake_stream_copy),
+        patch("clinvar_ingest.api.steps.http_get_md5", return_value=None),
+        patch("clinvar_ingest.api.jobs.JOB_WORKER_TYPE", "thread"),
+        TestClient(app) as client,
+    ):
+        # The stream is opened before the copy is submitted, and waits for it to finish
+        thread = threading.Thread(
+            target=lambda: events.extend(parse_events(client.get("/step_events/test-execution-id").text.splitlines()))
+        )
+        thread.start()
+        while not app.step_events.subscribers.get("test-execution-id"):
+            time.sleep(0.01)
+        client.post("/copy/test-execution-id", json=COPY_BODY)
+        thread.join(10)
+        assert not thread.is_alive()
+
+    assert [(event, data["step_status"]) for event, data in events] == [
+        ("status", StepStatus.STARTED),
+        ("status", StepStatus.SUCCEEDED),
+    ]
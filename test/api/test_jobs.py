@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from clinvar_ingest import parallel
+from clinvar_ingest.api.jobs import JobExecutor, JobState
+
+
+def report_and_double(n: int, report_progress) -> int:
+    for i in range(n):
+        report_progress({"done": i + 1})
+    logging.getLogger("clinvar_ingest").info(f"Doubling {n}")
+    return n * 2
+
+
+def fail():
+    raise RuntimeError("step failed")
+
+
+def wait_for(event: threading.Event):
+    assert event.wait(10)
+
+
+def test_job_capacity():
+    executor = JobExecutor(max_jobs=2, max_cpus=4, worker_type="thread")
+    events = [threading.Event() for _ in range(3)]
+    a = executor.submit(wait_for, events[0], step="a", cpus=3)
+    b = executor.submit(wait_for, events[1], step="b", cpus=2)
+    c = executor.submit(wait_for, events[2], step="c", cpus=1)
+    # b does not fit alongside a, and c waits behind it
+    assert [a.state, b.state, c.state] == [JobState.RUNNING, JobState.QUEUED, JobState.QUEUED]
+
+    events[0].set()
+    assert executor.wait(timeout=0) is False
+    for event in events[1:]:
+        event.set()
+    assert executor.wait(timeout=10)
+    assert [j.state for j in (a, b, c)] == [JobState.SUCCEEDED] * 3
+    assert a.finished_at <= b.started_at
+    executor.shutdown()
+
+
+def test_cancel_queued_job():
+    executor = JobExecutor(max_jobs=1, worker_type="thread")
+    done = []
+    event = threading.Event()
+    running = executor.submit(wait_for, event, step="a")
+    queued = executor.submit(wait_for, event, step="b", on_done=done.append)
+
+    assert executor.cancel(queued.job_id).state == JobState.CANCELLED
+    assert done == [queued]
+    # Jobs in threads cannot be stopped, nor finished jobs cancelled
+    with pytest.raises(ValueError, match="cannot be cancelled"):
+        executor.cancel(running.job_id)
+    with pytest.raises(ValueError, match="already cancelled"):
+        executor.cancel(queued.job_id)
+    event.set()
+    executor.shutdown()
+    assert running.state == JobState.SUCCEEDED
+
+
+def test_cancel_after_result():
+    executor = JobExecutor(max_jobs=1, worker_type="thread")
+    event = threading.Event()
+    job = executor.submit(wait_for, event, step="a")
+    # The job is cancelled as it returns its result
+    job.cancel_requested = True
+    event.set()
+    assert executor.wait(timeout=10)
+    assert job.state == JobState.SUCCEEDED
+    executor.shutdown()
+
+
+@pytest.mark.integration
+def test_process_jobs(caplog):
+    caplog.set_level(logging.INFO)
+    executor = JobExecutor(max_jobs=2, worker_type="process")
+    progress = []
+    done = threading.Event()
+    job = executor.submit(
+        report_and_double,
+        3,
+        step="double",
+        on_progress=lambda _, p: progress.append(p),
+        on_done=lambda _: done.set(),
+    )
+    failing = executor.submit(fail, step="fail")
+    assert executor.wait(timeout=60)
+    assert done.wait(10)
+
+    assert job.state == JobState.SUCCEEDED
+    assert job.result == 6
+    assert job.progress == {"done": 3}
+    assert progress == [{"done": 1}, {"done": 2}, {"done": 3}]
+    assert failing.state == JobState.FAILED
+    assert failing.error == "step failed"
+    executor.shutdown(cancel=False)
+    # Records logged in the job processes are handled in this one
+    assert any(r.getMessage() == "Doubling 3" for r in caplog.records)
+
+
+@pytest.mark.integration
+def test_cancel_running_process_job():
+    executor = JobExecutor(max_jobs=1, worker_type="process")
+    done = []
+    job = executor.submit(time.sleep, 60, step="sleep", on_done=done.append)
+    assert job.state == JobState.RUNNING
+    executor.cancel(job.job_id)
+    assert executor.wait(timeout=30)
+    assert job.state == JobState.CANCELLED
+    assert done == [job]
+    executor.shutdown()
+
+
+@pytest.mark.integration
+def test_cancel_parallel_parse_job(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    # The parse blocks reading the input from a pipe no data is written to
+    input_path = tmp_path / "input.xml.gz"
+    os.mkfifo(input_path)
+    fd = os.open(input_path, os.O_RDWR)
+    try:
+        executor = JobExecutor(max_jobs=1, worker_type="process")
+        job = executor.submit(
+            parallel.parse_and_write_shards,
+            str(input_path),
+            str(tmp_path / "out"),
+            "2024-01-01",
+            "VariationArchive",
+            2,
+            step="parse",
+        )
+        deadline = time.monotonic() + 30
+        while not any(r.getMessage().startswith("Started 2 parse workers") for r in caplog.records):
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        executor.cancel(job.job_id)
+        # The job stops its workers and exits
+        assert executor.wait(timeout=30)
+        assert job.state == JobState.CANCELLED
+        assert job.runner.exitcode is not None
+        executor.shutdown()
+    finally:
+        os.close(fd)
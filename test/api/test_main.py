@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 
 from clinvar_ingest.api.main import app
 from clinvar_ingest.api.model.requests import StepStartedResponse
+from clinvar_ingest.cloud.streaming import StreamCopyResult
 from clinvar_ingest.status import StatusValue, StepName, StepStatus
 
 
@@ -31,15 +32,19 @@ def test_copy_endpoint_success(log_conf, env_config, caplog) -> None:
         StepStatus.SUCCEEDED, StepName.COPY, datetime.now(tz=UTC).isoformat()
     )
     with (
-        patch("clinvar_ingest.api.main.http_download_curl", return_value=None),
-        patch("clinvar_ingest.api.main.copy_file_to_bucket", return_value=None),
-        patch("clinvar_ingest.api.main._get_gcs_client", return_value="not a client"),
+        patch(
+            "clinvar_ingest.api.steps.stream_copy",
+            return_value=StreamCopyResult("", "", 10, 1.0, 0, crc32c="00000000"),
+        ),
+        patch("clinvar_ingest.api.steps.http_get_md5", return_value=None),
+        # Jobs run in threads, so they see the patched functions
+        patch("clinvar_ingest.api.jobs.JOB_WORKER_TYPE", "thread"),
         patch(
             "clinvar_ingest.api.main.write_status_file",
             return_value=started_status_value,
         ),
         patch(
-            "clinvar_ingest.api.main.get_status_file",
+            "clinvar_ingest.api.main.lookup_step_status",
             return_value=succeeded_status_value,
         ),
         TestClient(app) as client,
@@ -59,6 +64,7 @@ def test_copy_endpoint_success(log_conf, env_config, caplog) -> None:
             json=body,
         )
         assert response.status_code == 201
+        assert client.app.jobs.wait(timeout=10)
 
         expected_started_response = StepStartedResponse(
             workflow_execution_id=wf_execution_id,
@@ -68,6 +74,8 @@ def test_copy_endpoint_success(log_conf, env_config, caplog) -> None:
         )
         actual_started_response = StepStartedResponse(**response.json())
         actual_started_response.timestamp = expected_started_response.timestamp
+        assert actual_started_response.job_id is not None
+        expected_started_response.job_id = actual_started_response.job_id
         assert expected_started_response == actual_started_response
 
         body["Released"] = "2022-12-05"
@@ -77,5 +85,5 @@ def test_copy_endpoint_success(log_conf, env_config, caplog) -> None:
         )
         assert response.status_code == 422
         assert "Input should be a valid datetime" in response.text
-        assert len(caplog.records) == 9
+        assert len(caplog.records) == 11
         # assert "status_code=422" in caplog.records[5].msg
@@ -0,0 +1,94 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from clinvar_ingest.api import metrics
+from clinvar_ingest.api.main import app
+from clinvar_ingest.progress import ParseProgress
+
+
+def test_render_openmetrics():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("test_events", "Events seen", ["kind"]))
+    histogram = registry.register(metrics.Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0)))
+    counter.inc(kind='a "quoted" kind')
+    counter.inc(2, kind='a "quoted" kind')
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    assert registry.render().splitlines() == [
+        "# TYPE test_events counter",
+        "# HELP test_events Events seen",
+        'test_events_total{kind="a \\"quoted\\" kind"} 3.0',
+        "# TYPE test_latency_seconds histogram",
+        "# HELP test_latency_seconds Latency",
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="1.0"} 2',
+        'test_latency_seconds_bucket{le="+Inf"} 3',
+        "test_latency_seconds_count 3",
+        "test_latency_seconds_sum 5.6",
+        "# EOF",
+    ]
+
+    with pytest.raises(ValueError, match="has labels"):
+        counter.inc(other="x")
+    with pytest.raises(ValueError, match="only be increased"):
+        counter.inc(-1, kind="a")
+
+
+def test_record_parse_progress():
+    progress = ParseProgress(
+        input_bytes=50,
+        input_size=200,
+        records=10,
+        elapsed_seconds=5.0,
+        bytes_per_second=10.0,
+        records_per_second=2.0,
+        entity_rows={"gene": 4},
+        queue_depths={"tasks": 3},
+    )
+    metrics.record_parse_progress("test-execution", progress)
+    rendered = metrics.REGISTRY.render()
+    assert 'clinvar_ingest_parse_input_bytes{workflow_execution_id="test-execution"} 50.0' in rendered
+    assert 'clinvar_ingest_parse_eta_seconds{workflow_execution_id="test-execution"} 15.0' in rendered
+    assert 'clinvar_ingest_parse_entity_rows{workflow_execution_id="test-execution",entity_type="gene"} 4.0' in rendered
+    assert 'clinvar_ingest_parse_queue_depth{workflow_execution_id="test-execution",queue="tasks"} 3.0' in rendered
+
+    # The series of the parse are removed once it has finished
+    metrics.record_parse_progress("other-execution", progress)
+    metrics.clear_parse_progress("test-execution")
+    rendered = metrics.REGISTRY.render()
+    assert 'workflow_execution_id="test-execution"' not in rendered
+    assert 'clinvar_ingest_parse_entity_rows{workflow_execution_id="other-execution",entity_type="gene"} 4.0' in rendered
+    metrics.clear_parse_progress("other-execution")
+
+
+def test_track_background_task():
+    def task():
+        rendered = metrics.REGISTRY.render()
+        assert 'clinvar_ingest_background_tasks_in_progress{step="test-step"} 1.0' in rendered
+        return "done"
+
+    assert metrics.track_background_task("test-step", task)() == "done"
+    rendered = metrics.REGISTRY.render()
+    assert 'clinvar_ingest_background_tasks_in_progress{step="test-step"} 0.0' in rendered
+    assert 'clinvar_ingest_background_task_duration_seconds_count{step="test-step"} 1' in rendered
+
+
+def test_metrics_endpoint(log_conf, caplog):
+    with TestClient(app) as client:
+        client.get("/health")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/openmetrics-text")
+        assert response.text.endswith("# EOF\n")
+        assert re.search(
+            r'clinvar_ingest_http_request_duration_seconds_count\{method="GET",route="/health",status_code="200"\} [1-9]',
+            response.text,
+        )
+
+    # Request start times are logged in milliseconds
+    start_ms = int(re.search(r"start_ms=(\d+)", caplog.records[1].msg).group(1))
+    assert start_ms > 10**12
@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from clinvar_ingest import storage
+from clinvar_ingest.api import status_file
+from clinvar_ingest.api.main import app
+from clinvar_ingest.status import StepName, StepStatus
+
+
+class CountingBackend(storage.MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def list_uris(self, prefix):
+        self.calls.append(("list", prefix))
+        return super().list_uris(prefix)
+
+    def read_bytes(self, uri):
+        self.calls.append(("read", uri))
+        return super().read_bytes(uri)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setattr(storage, "_backends", {"gs": backend})
+    monkeypatch.setattr(status_file, "_status_cache", {})
+    return backend
+
+
+def test_lookup_step_status(backend):
+    prefix = "executions/wf1"
+    for status in [StepStatus.STARTED, StepStatus.IN_PROGRESS]:
+        status_file.write_status_file("bucket", prefix, StepName.PARSE, status, message=status)
+    status_file.write_status_file("bucket", prefix, StepName.COPY, StepStatus.STARTED)
+    # Other files in the prefix, and further down it, are ignored
+    backend.write_bytes(f"gs://bucket/{prefix}/parse-SUCCEEDED.json.tmp", b"")
+    backend.write_bytes(f"gs://bucket/{prefix}/parsed/parse-FAILED.json", b"")
+    assert status_file.list_step_statuses("bucket", prefix) == {
+        StepName.PARSE: {StepStatus.STARTED, StepStatus.IN_PROGRESS},
+        StepName.COPY: {StepStatus.STARTED},
+    }
+
+    backend.calls.clear()
+    status_value = status_file.lookup_step_status("bucket", prefix, StepName.PARSE)
+    assert status_value.status == StepStatus.IN_PROGRESS
+    # One listing, and only the latest status file is read
+    assert backend.calls == [
+        ("list", f"gs://bucket/{prefix}/"),
+        ("read", f"gs://bucket/{prefix}/parse-IN_PROGRESS.json"),
+    ]
+
+    # Cached until a status of the step is written
+    backend.calls.clear()
+    assert status_file.lookup_step_status("bucket", prefix, StepName.PARSE) == status_value
+    assert backend.calls == []
+    status_file.write_status_file("bucket", prefix, StepName.PARSE, StepStatus.SUCCEEDED, message="done")
+    assert status_file.lookup_step_status("bucket", prefix, StepName.PARSE).message == "done"
+
+    with pytest.raises(ValueError, match="Could not find status file"):
+        status_file.lookup_step_status("bucket", prefix, StepName.CREATE_EXTERNAL_TABLES)
+
+
+def test_lookup_step_status_ttl(backend):
+    status_file.write_status_file("bucket", "executions/wf1", StepName.COPY, StepStatus.STARTED)
+    status_file.lookup_step_status("bucket", "executions/wf1", StepName.COPY, ttl=0)
+    status_file.lookup_step_status("bucket", "executions/wf1", StepName.COPY, ttl=0)
+    assert len([call for call in backend.calls if call[0] == "list"]) == 2
+
+
+def test_step_status_endpoint(backend, env_config):
+    prefix = f"{env_config.executions_output_prefix}/wf1"
+    status_file.write_status_file(env_config.bucket_name, prefix, StepName.COPY, StepStatus.STARTED)
+    status_file.write_status_file(env_config.bucket_name, prefix, StepName.COPY, StepStatus.FAILED, message="oops")
+    with TestClient(app) as client:
+        response = client.get("/step_status/wf1/copy")
+        assert response.status_code == 200
+        assert response.json()["step_status"] == "FAILED"
+        assert response.json()["message"] == "oops"
+        assert client.get("/step_status/wf1/parse").status_code == 404
@@ -1,9 +1,19 @@
+import hashlib
 import json
 import logging.config
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage
 
 from clinvar_ingest import config
+from clinvar_ingest.cloud import gcs
 
 
 @pytest.fixture
@@ -32,3 +42,180 @@ def env_config() -> config.Env:
     }
 
     return config.get_env()
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves `server.content` with support for Range and If-Range headers, unless
+    `server.accept_ranges` is false. The first request for each range start in
+    `server.drop_ranges` is cut off halfway through, and requests for the whole
+    file are cut off after `server.truncate_at` bytes if it is set. If
+    `server.change_after_head` is true, the ETag changes after each HEAD request.
+    """
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+        if self.server.change_after_head:
+            self.server.etag = '"v2"'
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body: bool):
+        server = self.server
+        if self.path.endswith(".md5"):
+            body = f"MD5 (release.xml.gz) = {hashlib.md5(server.content).hexdigest()}\n".encode()  # noqa: S324
+            self._send(200, {}, body, send_body)
+            return
+
+        server.requests.append((self.command, self.headers.get("Range"), self.headers.get("If-Range")))
+        content = server.content
+        headers = {"ETag": server.etag}
+        range_match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if not server.accept_ranges or range_match is None or (if_range is not None and if_range != server.etag):
+            if server.accept_ranges:
+                headers["Accept-Ranges"] = "bytes"
+            if server.truncate_at is not None and send_body:
+                self._send_truncated(200, headers, content, server.truncate_at)
+                return
+            self._send(200, headers, content, send_body)
+            return
+
+        start = int(range_match.group(1))
+        end = int(range_match.group(2)) if range_match.group(2) else len(content) - 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        body = content[start : end + 1]
+        if start in server.drop_ranges:
+            server.drop_ranges.remove(start)
+            self._send_truncated(206, headers, body, len(body) // 2)
+            return
+        self._send(206, headers, body, send_body)
+
+    def _send_truncated(self, status, headers, body, length):
+        headers["Content-Length"] = str(len(body))
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body[:length])
+        self.close_connection = True
+
+    def _send(self, status, headers, body, send_body):
+        self.send_response(status)
+        headers.setdefault("Content-Length", str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    server.content = os.urandom(10_500)
+    server.etag = '"v1"'
+    server.accept_ranges = True
+    server.change_after_head = False
+    server.drop_ranges = set()
+    server.truncate_at = None
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.uri = f"http://127.0.0.1:{server.server_port}/release.xml.gz"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    """
+    Serves the objects in `server.objects`, a dict of (bucket, name) to bytes,
+    through the GCS JSON API's metadata and media download endpoints, with
+    support for Range headers. Each download waits `server.delay` seconds, and
+    the most downloads in flight at once is recorded in `server.max_in_flight`.
+    """
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        match = re.fullmatch(r"(/download)?/storage/v1/b/([^/]+)/o/([^/]+)", url.path)
+        key = (match.group(2), urllib.parse.unquote(match.group(3))) if match else None
+        if key not in server.objects:
+            self._send(404, "application/json", b'{"error": {"code": 404, "message": "Not Found"}}')
+            return
+        content = server.objects[key]
+        generation = server.generations.setdefault(key, 1)
+        if "ifGenerationMatch" in query and int(query["ifGenerationMatch"][0]) != generation:
+            self._send(412, "application/json", b'{"error": {"code": 412, "message": "Precondition Failed"}}')
+            return
+
+        if not match.group(1):
+            metadata = {"bucket": key[0], "name": key[1], "size": str(len(content)), "generation": str(generation)}
+            self._send(200, "application/json", json.dumps(metadata).encode())
+            return
+
+        server.requests.append(self.headers.get("Range"))
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            range_match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+            if range_match is None:
+                self._send(200, "application/octet-stream", content)
+                return
+            start, end = int(range_match.group(1)), int(range_match.group(2))
+            self._send(
+                206,
+                "application/octet-stream",
+                content[start : end + 1],
+                {"Content-Range": f"bytes {start}-{min(end, len(content) - 1)}/{len(content)}"},
+            )
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def gcs_server(monkeypatch):
+    """
+    A fake GCS server, with `server.client` a storage.Client of it, which is
+    also returned by clinvar_ingest.cloud.gcs._get_gcs_client.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGCSHandler)
+    server.objects = {}
+    server.generations = {}
+    server.requests = []
+    server.delay = 0
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.client = storage.Client(
+        project="test",
+        credentials=AnonymousCredentials(),
+        client_options={"api_endpoint": f"http://127.0.0.1:{server.server_port}"},
+    )
+    monkeypatch.setattr(gcs._get_gcs_client, "client", server.client, raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,70 @@
+import pytest
+
+from clinvar_ingest import benchmark
+from clinvar_ingest.utils import ClinVarIngestFileFormat
+
+
+def test_detect_file_format():
+    assert benchmark.detect_file_format("test/data/VCV000000002.xml") == ClinVarIngestFileFormat.VCV
+    assert benchmark.detect_file_format("test/data/rcv/combined.xml.gz") == ClinVarIngestFileFormat.RCV
+
+
+@pytest.mark.parametrize(
+    ("path", "file_format", "records"),
+    [
+        ("test/data/combined.xml.gz", "vcv", 15),
+        ("test/data/rcv/combined.xml.gz", "rcv", 2),
+    ],
+)
+def test_benchmark_file(path, file_format, records):
+    result = benchmark.benchmark_file(path)
+    assert result["file_format"] == file_format
+    assert result["records"] == records
+    assert result["rows"] >= result["records"]
+    assert result["xml_bytes"] > result["input_bytes"]
+    assert list(result["stages"]) == benchmark.STAGES
+    for stage in ["dict-convert", "from_xml", "encode", "end-to-end"]:
+        assert result["stages"][stage]["records_per_s"] > 0
+        assert result["stages"][stage]["mb_per_s"] > 0
+
+
+def test_benchmark_file_rcv_reader(monkeypatch):
+    """
+    The stages of an RCV file read its records as the parse does, not by
+    converting each whole ClinVarSet.
+    """
+    read = []
+    rcv_record_dict = benchmark.RECORD_DICT_READERS["rcv"]
+
+    def recording_record_dict(record):
+        read.append(record)
+        return rcv_record_dict(record)
+
+    monkeypatch.setitem(benchmark.RECORD_DICT_READERS, "rcv", recording_record_dict)
+    result = benchmark.benchmark_file("test/data/rcv/combined.xml.gz")
+    assert len(read) == result["records"]
+
+
+def test_run_benchmarks_reports_errors(tmp_path):
+    bad_file = tmp_path / "bad.xml"
+    bad_file.write_text("<Unknown/>")
+    results = benchmark.run_benchmarks([str(bad_file)])
+    assert results == [{"path": str(bad_file), "error": results[0]["error"]}]
+    assert "Could not detect file format" in results[0]["error"]
+
+
+def test_compare_to_baseline():
+    def result(path, rate):
+        return {"path": path, "stages": {"encode": {"records_per_s": rate}, "frame": {"records_per_s": None}}}
+
+    baseline = [result("a.xml", 100.0), {"path": "b.xml", "error": "KeyError()"}]
+    results = [result("a.xml", 50.0), result("b.xml", 10.0), result("c.xml", 10.0)]
+    assert benchmark.compare_to_baseline(results, baseline) == [
+        {
+            "path": "a.xml",
+            "stage": "encode",
+            "baseline_records_per_s": 100.0,
+            "records_per_s": 50.0,
+            "ratio": 0.5,
+        }
+    ]
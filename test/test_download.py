@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+import pytest
+
+from clinvar_ingest.cloud import gcs
+
+
+def test_http_download_ranges(http_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(gcs, "DOWNLOAD_READ_SIZE", 100)
+    http_server.drop_ranges = {2000}
+    local_path = tmp_path / "release.xml.gz"
+    expected_md5 = gcs.http_get_md5(http_server.uri + ".md5")
+    assert expected_md5 == hashlib.md5(http_server.content).hexdigest()  # noqa: S324
+
+    path = gcs.http_download_ranges(
+        http_server.uri,
+        local_path,
+        len(http_server.content),
+        expected_md5=expected_md5,
+        connections=3,
+        range_size=1000,
+        retry_delay=0,
+    )
+    assert path.read_bytes() == http_server.content
+    assert not (tmp_path / "release.xml.gz.ranges.json").exists()
+
+    ranges = sorted(r for command, r, _ in http_server.requests if command == "GET")
+    assert len(ranges) == 12
+    assert ranges.count("bytes=10000-10499") == 1
+    # The dropped range is resumed from the last byte received
+    assert "bytes=2000-2999" in ranges
+    assert "bytes=2500-2999" in ranges
+    assert {if_range for command, _, if_range in http_server.requests if command == "GET"} == {'"v1"'}
+
+
+def test_http_download_ranges_resume(http_server, tmp_path):
+    local_path = tmp_path / "release.xml.gz"
+    local_path.write_bytes(http_server.content[:3000] + bytes(len(http_server.content) - 3000))
+    state_path = tmp_path / "release.xml.gz.ranges.json"
+    state_path.write_text(json.dumps({"validator": '"v1"', "size": len(http_server.content), "done": [0, 1000, 2000]}))
+
+    gcs.http_download_ranges(http_server.uri, local_path, len(http_server.content), connections=2, range_size=1000)
+    assert local_path.read_bytes() == http_server.content
+    ranges = {r for command, r, _ in http_server.requests if command == "GET"}
+    assert len(ranges) == 8
+    assert "bytes=0-999" not in ranges
+
+    # Ranges of another version of the file are downloaded again
+    http_server.requests.clear()
+    state_path.write_text(json.dumps({"validator": '"v0"', "size": len(http_server.content), "done": [0, 1000, 2000]}))
+    gcs.http_download_ranges(http_server.uri, local_path, len(http_server.content), connections=2, range_size=1000)
+    assert len([r for command, r, _ in http_server.requests if command == "GET"]) == 11
+
+
+def test_http_download_ranges_verification(http_server, tmp_path):
+    local_path = tmp_path / "release.xml.gz"
+    # The file changes after the HEAD request, so the server no longer sends ranges
+    http_server.change_after_head = True
+    with pytest.raises(RuntimeError, match="The file may have changed"):
+        gcs.http_download_ranges(http_server.uri, local_path, len(http_server.content), range_size=1000, retry_delay=0)
+
+    with pytest.raises(RuntimeError, match="MD5 mismatch"):
+        gcs.http_download_ranges(http_server.uri, local_path, len(http_server.content), expected_md5="0" * 32, range_size=1000)
+    assert not local_path.exists()
+
+
+def test_http_download_ranges_not_supported(http_server, tmp_path):
+    http_server.accept_ranges = False
+    path = gcs.http_download_ranges(http_server.uri, tmp_path / "release.xml.gz", len(http_server.content))
+    assert path.read_bytes() == http_server.content
+    assert [r for command, r, _ in http_server.requests if command == "GET"] == [None]
+
+    with pytest.raises(RuntimeError, match="File size mismatch"):
+        gcs.http_download_ranges(http_server.uri, tmp_path / "other.xml.gz", len(http_server.content) + 1)
+
+    # The MD5 is verified as the file is downloaded
+    with pytest.raises(RuntimeError, match="MD5 mismatch"):
+        gcs.http_download_ranges(
+            http_server.uri, tmp_path / "other.xml.gz", len(http_server.content), expected_md5="0" * 32
+        )
+    assert not (tmp_path / "other.xml.gz").exists()
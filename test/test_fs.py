@@ -0,0 +1,77 @@
+import gzip
+import io
+import threading
+
+import pytest
+
+from clinvar_ingest.fs import BlockWriter, ChunkPipe
+
+
+class RecordingFile(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.write_sizes = []
+
+    def write(self, data):
+        self.write_sizes.append(len(data))
+        return super().write(data)
+
+    def close(self):
+        self.closed_value = self.getvalue()
+        super().close()
+
+
+def test_block_writer():
+    f = RecordingFile()
+    writer = BlockWriter(f, block_size=10)
+    rows = [b"abc\n", b"defg\n", b"h\n", b"0123456789abcdef\n", b"ij\n"]
+    for row in rows:
+        assert writer.write(row) == len(row)
+    # Rows are written through when the next would not fit in the block, and
+    # rows of a block or more go straight through
+    assert f.write_sizes == [9, 2, 17]
+    writer.close()
+    assert f.write_sizes == [9, 2, 17, 3]
+    assert f.closed_value == b"".join(rows)
+
+
+def test_block_writer_gzip(tmp_path):
+    path = tmp_path / "rows.ndjson.gz"
+    rows = [f'{{"id": {i}}}\n'.encode() for i in range(1000)]
+    with BlockWriter(gzip.open(path, "wb"), block_size=256) as writer:
+        for row in rows:
+            writer.write(row)
+    with gzip.open(path) as f:
+        assert f.read() == b"".join(rows)
+
+
+def test_chunk_pipe():
+    data = gzip.compress(b"".join(f'{{"id": {i}}}\n'.encode() for i in range(1000)))
+    pipe = ChunkPipe("rows.ndjson.gz", size=len(data), max_chunks=2)
+
+    def write():
+        for i in range(0, len(data), 100):
+            pipe.put(data[i : i + 100])
+        pipe.end()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    with gzip.GzipFile(fileobj=pipe) as f:
+        assert f.read() == gzip.decompress(data)
+    writer.join()
+    assert pipe.wait_head() == data[:100]
+
+
+def test_chunk_pipe_error_and_close():
+    pipe = ChunkPipe("rows.ndjson", max_chunks=2)
+    pipe.put(b"abc")
+    pipe.end(RuntimeError("copy failed"))
+    assert pipe.read(3) == b"abc"
+    with pytest.raises(RuntimeError, match="copy failed"):
+        pipe.read(3)
+
+    # Once the reader has closed the pipe, chunks are dropped instead of blocking
+    pipe = ChunkPipe("rows.ndjson", max_chunks=1)
+    assert pipe.put(b"abc")
+    pipe.close()
+    assert not pipe.put(b"def")
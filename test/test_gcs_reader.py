@@ -0,0 +1,65 @@
+import gzip
+import os
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from clinvar_ingest.cloud import gcs
+from clinvar_ingest.parse import get_release_date_and_iterate_type, parse_and_write_files
+from clinvar_ingest.utils import ClinVarIngestFileFormat
+
+
+def test_prefetching_blob_reader(gcs_server):
+    content = os.urandom(10_500)
+    gcs_server.objects["bucket", "dir/file.bin"] = content
+    gcs_server.delay = 0.05
+
+    with gcs.prefetching_blob_reader("gs://bucket/dir/file.bin", chunk_size=1000, depth=4) as f:
+        assert f.size == len(content)
+        assert f.read(10) == content[:10]
+        assert f.tell() == 10
+        assert f.read() == content[10:]
+        assert f.tell() == len(content)
+        assert f.read(10) == b""
+
+    assert sorted(gcs_server.requests, key=lambda r: int(r.split("=")[1].split("-")[0])) == [
+        f"bytes={start}-{min(start + 1000, len(content)) - 1}" for start in range(0, len(content), 1000)
+    ]
+    # Several reads were in flight at once
+    assert gcs_server.max_in_flight > 1
+
+
+def test_prefetching_blob_reader_replaced(gcs_server):
+    gcs_server.objects["bucket", "file.bin"] = os.urandom(5000)
+    with gcs.prefetching_blob_reader("gs://bucket/file.bin", chunk_size=1000, depth=1) as f:
+        f.read(1000)
+        # The blob is replaced by a new generation while it is being read
+        gcs_server.generations["bucket", "file.bin"] = 2
+        with pytest.raises(api_exceptions.PreconditionFailed):
+            f.read()
+
+
+def test_parse_gcs_input(gcs_server, tmp_path):
+    input_filename = "test/data/combined.xml.gz"
+    with open(input_filename, "rb") as f:
+        gcs_server.objects["bucket", "combined.xml.gz"] = f.read()
+
+    output_files = parse_and_write_files("gs://bucket/combined.xml.gz", str(tmp_path / "gcs"), gzip_output=True)
+    expected_files = parse_and_write_files(input_filename, str(tmp_path / "local"), gzip_output=True)
+    for entity_type, path in output_files.items():
+        with gzip.open(path) as f, gzip.open(expected_files[entity_type]) as f_expected:
+            assert f.read() == f_expected.read()
+
+
+def test_release_date_gcs_input(gcs_server, monkeypatch):
+    with open("test/data/combined.xml.gz", "rb") as f:
+        gcs_server.objects["bucket", "combined.xml.gz"] = f.read()
+
+    # Reading the header does not read the rest of the file ahead
+    def prefetching_blob_reader(*args, **kwargs):
+        raise AssertionError("The header of the file was read with a prefetching reader")
+
+    monkeypatch.setattr(gcs, "prefetching_blob_reader", prefetching_blob_reader)
+    release_info = get_release_date_and_iterate_type("gs://bucket/combined.xml.gz", ClinVarIngestFileFormat.VCV)
+    assert release_info["iterate_type"] == "variation_archive"
+    assert len(gcs_server.requests) == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from clinvar_ingest import import_benchmark
+
+
+def test_parse_importtime():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |     json.decoder\n"
+        "import time:       200 |        300 |   json\n"
+        "import time:        50 |        350 | clinvar_ingest.utils\n"
+    )
+    assert import_benchmark.parse_importtime(output) == [
+        {"name": "json.decoder", "depth": 2, "self_seconds": 0.0001, "cumulative_seconds": 0.0001},
+        {"name": "json", "depth": 1, "self_seconds": 0.0002, "cumulative_seconds": 0.0003},
+        {"name": "clinvar_ingest.utils", "depth": 0, "self_seconds": 0.00005, "cumulative_seconds": 0.00035},
+    ]
+
+
+@pytest.mark.parametrize("entry_point", ["cli", "parse", "parse-worker"])
+def test_local_entry_points_do_not_import_cloud_modules(entry_point):
+    """
+    Cloud and API dependencies are imported on first use, not by the CLI, parse
+    module or parse workers.
+    """
+    result = import_benchmark.measure_import(import_benchmark.ENTRY_POINTS[entry_point])
+    assert result["seconds"] > 0
+    assert result["cloud_modules"] == []
+
+
+def test_compare_to_baseline():
+    results = [{"entry_point": "cli", "seconds": 0.2}, {"entry_point": "api", "seconds": 0.5}]
+    baseline = [{"entry_point": "cli", "seconds": 0.1}]
+    assert import_benchmark.compare_to_baseline(results, baseline) == [
+        {"entry_point": "cli", "baseline_seconds": 0.1, "seconds": 0.2, "ratio": 0.5}
+    ]
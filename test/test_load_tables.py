@@ -0,0 +1,138 @@
+import datetime
+import json
+
+import pytest
+from google.cloud import bigquery
+
+from clinvar_ingest.cloud.bigquery import load_tables
+
+STARTED = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+class FakeJob:
+    """
+    A job that is done after `polls` calls to done().
+    """
+
+    def __init__(self, client, job_type: str, destination, polls: int, error: str | None = None):
+        self.client = client
+        self.job_type = job_type
+        self.job_id = f"job-{len(client.jobs)}"
+        self.destination = destination if job_type == "load" else None
+        self.ddl_target_table = destination if job_type == "query" else None
+        self.polls = polls
+        self.error_result = {"message": error} if error else None
+        self.started = STARTED
+        self.ended = STARTED + datetime.timedelta(seconds=polls)
+        self.input_file_bytes = 100 * polls
+        self.output_bytes = 200 * polls
+        self.output_rows = 10 * polls
+        self.total_bytes_processed = 50
+
+    def done(self) -> bool:
+        self.client.log.append(("poll", self.job_id))
+        self.polls -= 1
+        return self.polls <= 0
+
+
+class FakeClient:
+    """
+    Records the load jobs, queries and table deletions made through it.
+    """
+
+    def __init__(self, polls: dict[str, int] | None = None, errors: dict[str, str] | None = None):
+        self.polls = polls or {}
+        self.errors = errors or {}
+        self.jobs = []
+        self.log = []
+        self.deleted = []
+
+    def schema_from_json(self, path):
+        with open(path) as f:
+            return [bigquery.SchemaField.from_api_repr(field) for field in json.load(f)]
+
+    def load_table_from_uri(self, source_uri, destination, job_config):
+        table_id = destination.table_id
+        job = FakeJob(self, "load", destination, self.polls.get(table_id, 1), error=self.errors.get(table_id))
+        job.source_uri = source_uri
+        job.job_config = job_config
+        self.jobs.append(job)
+        self.log.append(("load", destination.table_id))
+        return job
+
+    def query(self, query):
+        destination = bigquery.TableReference.from_string(query.split("`")[1])
+        job = FakeJob(self, "query", destination, 1)
+        job.query = query
+        self.jobs.append(job)
+        self.log.append(("query", destination.table_id))
+        return job
+
+    def delete_table(self, table, not_found_ok=False):
+        assert not_found_ok
+        self.deleted.append(table.table_id)
+
+
+def test_load_tables():
+    client = FakeClient(polls={"variation_archive": 3, "gene_staging": 2})
+    dataset = bigquery.Dataset("project.dataset")
+    loads = load_tables.load_tables(
+        client,
+        dataset,
+        {
+            "variation_archive": "gs://bucket/parsed/variation_archive/part-*.ndjson.gz",
+            "gene": "gs://bucket/parsed/gene.ndjson.gz",
+            "submitter": "gs://bucket/parsed/submitter.parquet",
+        },
+        poll_interval=0,
+    )
+
+    # All load jobs are submitted before any is polled, and the deduplicating
+    # queries once they have all finished
+    first_poll = next(i for i, (action, _) in enumerate(client.log) if action == "poll")
+    assert client.log[:first_poll] == [("load", "variation_archive"), ("load", "gene_staging"), ("load", "submitter_staging")]
+    load_job_ids = {job.job_id for job in client.jobs[:3]}
+    first_query = client.log.index(("query", "gene"))
+    assert not [job_id for action, job_id in client.log[first_query:] if action == "poll" and job_id in load_job_ids]
+
+    va_job, gene_job, submitter_job = client.jobs[:3]
+    assert va_job.job_config.source_format == bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+    assert va_job.job_config.write_disposition == bigquery.WriteDisposition.WRITE_TRUNCATE
+    assert va_job.source_uri.endswith("part-*.ndjson.gz")
+    assert submitter_job.job_config.source_format == bigquery.SourceFormat.PARQUET
+    # Staging tables get the schema of the table they are deduplicated into
+    assert [f.name for f in gene_job.job_config.schema] == [
+        f.name for f in client.schema_from_json(load_tables.schema_file_path_for_table("gene"))
+    ]
+
+    gene_query = next(job.query for job in client.jobs if job.job_type == "query" and job.ddl_target_table.table_id == "gene")
+    assert "FROM `project.dataset.gene_staging`" in gene_query
+    assert "`project.dataset.variation_archive`" in gene_query
+    assert sorted(client.deleted) == ["gene_staging", "submitter_staging"]
+
+    assert set(loads) == {"variation_archive", "gene_staging", "submitter_staging", "gene", "submitter"}
+    va = loads["variation_archive"]
+    assert va.table_id == "project.dataset.variation_archive"
+    assert (va.seconds, va.input_bytes, va.output_rows, va.output_bytes) == (3.0, 300, 30, 600)
+    assert loads["gene"].table_id == "project.dataset.gene"
+    assert loads["gene"].input_bytes == 50
+
+
+def test_load_tables_failure():
+    client = FakeClient(errors={"variation_archive": "Invalid JSON", "gene_staging": "Too many errors"})
+    dataset = bigquery.Dataset("project.dataset")
+    with pytest.raises(RuntimeError, match=r"Failed to load tables \['gene_staging', 'variation_archive'\]"):
+        load_tables.load_tables(
+            client,
+            dataset,
+            {
+                "variation_archive": "gs://bucket/parsed/variation_archive.ndjson.gz",
+                "gene": "gs://bucket/parsed/gene.ndjson.gz",
+                "variation": "gs://bucket/parsed/variation.ndjson.gz",
+            },
+            poll_interval=0,
+        )
+    # Every load is waited for, no deduplication is run, and staging tables are dropped
+    assert len([job for job in client.jobs if job.job_type == "load"]) == 3
+    assert not [job for job in client.jobs if job.job_type == "query"]
+    assert client.deleted == ["gene_staging"]
@@ -0,0 +1,205 @@
+import collections
+import glob
+import gzip
+import queue
+
+import pytest
+
+from clinvar_ingest import parallel
+from clinvar_ingest.parse import parse_and_write_files
+from clinvar_ingest.utils import ClinVarIngestFileFormat
+
+
+def _read_rows(paths: list[str]) -> collections.Counter:
+    rows = collections.Counter()
+    for path in paths:
+        with gzip.open(path) as f:
+            rows.update(f.read().splitlines())
+    return rows
+
+
+@pytest.mark.parametrize(
+    ("filename", "file_format"),
+    [
+        ("test/data/combined.xml.gz", ClinVarIngestFileFormat.VCV),
+        ("test/data/rcv/combined.xml.gz", ClinVarIngestFileFormat.RCV),
+    ],
+)
+def test_parse_and_write_files_workers(tmp_path, monkeypatch, filename, file_format):
+    """
+    Parsing with multiple workers writes the same rows as a serial parse,
+    split over part files that are matched by the returned wildcard paths.
+    """
+    # Small batches so records are spread over the workers
+    monkeypatch.setattr(parallel, "BATCH_BYTES", 16 * 1024)
+
+    serial_files = parse_and_write_files(
+        filename, str(tmp_path / "serial"), file_format=file_format
+    )
+    sharded_files = parse_and_write_files(
+        filename, str(tmp_path / "sharded"), file_format=file_format, workers=3
+    )
+
+    assert sharded_files.keys() == serial_files.keys()
+    part_file_counts = []
+    for entity_type, wildcard in sharded_files.items():
+        assert wildcard.endswith(f"/{entity_type}/part-*.ndjson.gz")
+        part_files = glob.glob(wildcard)
+        part_file_counts.append(len(part_files))
+        assert _read_rows(part_files) == _read_rows([serial_files[entity_type]])
+    if file_format == ClinVarIngestFileFormat.VCV:
+        assert max(part_file_counts) > 1
+
+
+@pytest.mark.parametrize(
+    ("filename", "file_format", "limit"),
+    [
+        ("test/data/combined.xml.gz", ClinVarIngestFileFormat.VCV, None),
+        ("test/data/combined.xml.gz", ClinVarIngestFileFormat.VCV, 7),
+        ("test/data/rcv/combined.xml.gz", ClinVarIngestFileFormat.RCV, None),
+    ],
+)
+def test_parse_and_write_files_ordered(tmp_path, monkeypatch, filename, file_format, limit):
+    """
+    Parsing with multiple ordered workers writes the same bytes to the same files as a serial parse.
+    """
+    monkeypatch.setattr(parallel, "BATCH_BYTES", 16 * 1024)
+    # Smallest window, so reading often waits on the output
+    monkeypatch.setattr(parallel, "REORDER_WINDOW_BATCHES_PER_WORKER", 1)
+
+    serial_dir = tmp_path / "serial"
+    ordered_dir = tmp_path / "ordered"
+    serial_files = parse_and_write_files(
+        filename, str(serial_dir), gzip_output=False, file_format=file_format, limit=limit
+    )
+    ordered_files = parse_and_write_files(
+        filename,
+        str(ordered_dir),
+        gzip_output=False,
+        file_format=file_format,
+        limit=limit,
+        workers=3,
+        ordered=True,
+    )
+
+    assert list(ordered_files) == list(serial_files)
+    for entity_type, path in ordered_files.items():
+        serial_path = serial_files[entity_type]
+        assert path == serial_path.replace(str(serial_dir), str(ordered_dir))
+        with open(path, "rb") as f_ordered, open(serial_path, "rb") as f_serial:
+            assert f_ordered.read() == f_serial.read()
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_parse_and_write_files_mmap(tmp_path, monkeypatch, ordered):
+    """
+    A local uncompressed input is memory-mapped and workers are sent record
+    offsets, writing the same rows as a serial parse of the gzipped input.
+    """
+    monkeypatch.setattr(parallel, "BATCH_BYTES", 16 * 1024)
+    sent_batches = []
+    original_put = parallel._put
+
+    def recording_put(task_queue, item, check_workers):
+        sent_batches.append(item)
+        return original_put(task_queue, item, check_workers)
+
+    monkeypatch.setattr(parallel, "_put", recording_put)
+
+    input_path = tmp_path / "combined.xml"
+    with gzip.open("test/data/combined.xml.gz") as f:
+        input_path.write_bytes(f.read())
+
+    serial_files = parse_and_write_files("test/data/combined.xml.gz", str(tmp_path / "serial"))
+    mmap_files = parse_and_write_files(str(input_path), str(tmp_path / "mmap"), workers=3, ordered=ordered)
+
+    batches = [item[1] if ordered else item for item in sent_batches if item is not parallel.WORKER_STOP_VALUE]
+    assert all(isinstance(span, tuple) for batch in batches for span in batch)
+    assert mmap_files.keys() == serial_files.keys()
+    for entity_type, path in mmap_files.items():
+        assert _read_rows(glob.glob(path)) == _read_rows([serial_files[entity_type]])
+
+
+def test_reorder_buffer():
+    result_queue = queue.Queue()
+    written = []
+    reorder_buffer = parallel.ReorderBuffer(result_queue, written.append)
+
+    for seq in [2, 0, 3, 1]:
+        result_queue.put((seq % 2, seq, {"gene": f"{seq}".encode()}, None))
+    result_queue.put((0, None, None, None))
+
+    assert reorder_buffer.receive(None)  # 2
+    assert written == []
+    assert reorder_buffer.receive(None)  # 0
+    assert reorder_buffer.receive(None)  # 3
+    assert written == [{"gene": b"0"}]
+    assert reorder_buffer.receive(None)  # 1
+    assert written == [{"gene": b"0"}, {"gene": b"1"}, {"gene": b"2"}, {"gene": b"3"}]
+    assert reorder_buffer.pending == {}
+    assert reorder_buffer.receive(None)  # worker 0 finished
+    assert reorder_buffer.finished == {0}
+    assert not reorder_buffer.receive(None)
+
+    result_queue.put((1, None, None, "Traceback"))
+    with pytest.raises(RuntimeError, match="Parse worker 1 failed"):
+        reorder_buffer.receive(None)
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_parse_and_write_files_worker_error(tmp_path, ordered):
+    input_file = tmp_path / "bad.xml"
+    input_file.write_text(
+        '<ClinVarVariationRelease ReleaseDate="2024-01-01">'
+        '<VariationArchive RecordType="unknown"></VariationArchive>'
+        "</ClinVarVariationRelease>"
+    )
+    with pytest.raises(RuntimeError, match=r"Parse worker \d+ failed"):
+        parse_and_write_files(str(input_file), str(tmp_path / "out"), workers=2, ordered=ordered)
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_parse_and_write_files_interrupted(tmp_path, monkeypatch, ordered):
+    """
+    Workers which were not sent their stop value are stopped when the parse is
+    unwound by an exception that is not an Exception, like KeyboardInterrupt.
+    """
+    monkeypatch.setattr(parallel, "BATCH_BYTES", 16 * 1024)
+    started = []
+    original_start_workers = parallel._start_workers
+
+    def recording_start_workers(*args):
+        task_queue, result_queue, processes = original_start_workers(*args)
+        started.extend(processes)
+        return task_queue, result_queue, processes
+
+    def interrupted_batches(records, batch_bytes):
+        yield next(original_batches(records, batch_bytes))
+        raise KeyboardInterrupt
+
+    original_batches = parallel._batches
+    monkeypatch.setattr(parallel, "_start_workers", recording_start_workers)
+    monkeypatch.setattr(parallel, "_batches", interrupted_batches)
+    with pytest.raises(KeyboardInterrupt):
+        parse_and_write_files("test/data/combined.xml.gz", str(tmp_path / "out"), workers=2, ordered=ordered)
+    assert len(started) == 2
+    assert all(p.exitcode is not None for p in started)
+
+
+def test_merge_manifests():
+    manifests = {
+        1: {"gene": {"path": "out/gene/part-w01-00000.ndjson", "rows": 2}},
+        0: {
+            "variation": {"path": "out/variation/part-w00-00000.ndjson", "rows": 1},
+            "gene": {"path": "out/gene/part-w00-00000.ndjson", "rows": 3},
+        },
+    }
+    parsed_files, part_files = parallel.merge_manifests(manifests, "out", ".ndjson")
+    assert parsed_files == {
+        "variation": "out/variation/part-*.ndjson",
+        "gene": "out/gene/part-*.ndjson",
+    }
+    assert part_files == {
+        "variation": ["out/variation/part-w00-00000.ndjson"],
+        "gene": ["out/gene/part-w00-00000.ndjson", "out/gene/part-w01-00000.ndjson"],
+    }
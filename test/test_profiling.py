@@ -0,0 +1,78 @@
+import os
+import pstats
+import signal
+import time
+
+import pytest
+
+from clinvar_ingest.parse import parse_and_write_files
+from clinvar_ingest.profiling import ProfileConfig, profile_from_env
+
+
+def test_profile_config_from_env():
+    config = ProfileConfig.from_env(
+        {
+            "CLINVAR_INGEST_PROFILE": "cprofile, Stacks",
+            "CLINVAR_INGEST_PROFILE_SECONDS": "30",
+            "CLINVAR_INGEST_PROFILE_SIGNAL": "usr2",
+        }
+    )
+    assert config.modes == {"cprofile", "stacks"}
+    assert config.cprofile_seconds == 30
+    assert config.stack_signal == signal.SIGUSR2
+
+    assert ProfileConfig.from_env({}).modes == set()
+    with pytest.raises(ValueError, match="Unknown CLINVAR_INGEST_PROFILE modes"):
+        ProfileConfig.from_env({"CLINVAR_INGEST_PROFILE": "perf"})
+
+
+def test_profile_disabled(tmp_path):
+    with profile_from_env(str(tmp_path), ProfileConfig()) as session:
+        assert session is None
+    assert not (tmp_path / "profile").exists()
+
+
+def _inside_window():
+    pass
+
+
+def _after_window():
+    pass
+
+
+def test_cprofile_window(tmp_path):
+    with profile_from_env(str(tmp_path), ProfileConfig(modes={"cprofile"}, cprofile_seconds=0.05)):
+        _inside_window()
+        time.sleep(0.2)
+        _after_window()
+
+    stats = pstats.Stats(str(tmp_path / "profile" / f"cprofile-{os.getpid()}.prof"))
+    function_names = {name for _file, _line, name in stats.stats}
+    assert "_inside_window" in function_names
+    assert "_after_window" not in function_names
+    assert "_inside_window" in (tmp_path / "profile" / f"cprofile-{os.getpid()}.txt").read_text()
+
+
+def test_stack_dump(tmp_path):
+    with profile_from_env(str(tmp_path), ProfileConfig(modes={"stacks"})):
+        os.kill(os.getpid(), signal.SIGUSR1)
+    # The default handler is restored afterwards
+    assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
+
+    stacks = (tmp_path / "profile" / f"stacks-{os.getpid()}-000.txt").read_text()
+    assert "Thread MainThread:" in stacks
+    assert "test_stack_dump" in stacks
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_and_write_files_profile(tmp_path, monkeypatch, workers):
+    monkeypatch.setenv("CLINVAR_INGEST_PROFILE", "cprofile,tracemalloc")
+    parse_and_write_files("test/data/combined.xml.gz", str(tmp_path), file_format="vcv", workers=workers)
+
+    profile_dir = tmp_path / "profile"
+    assert sorted(p.name for p in profile_dir.iterdir()) == [
+        f"cprofile-{os.getpid()}.prof",
+        f"cprofile-{os.getpid()}.txt",
+        f"tracemalloc-{os.getpid()}-000.txt",
+    ]
+    assert "Top allocation sites:" in (profile_dir / f"tracemalloc-{os.getpid()}-000.txt").read_text()
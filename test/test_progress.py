@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from clinvar_ingest import progress as progress_module
+from clinvar_ingest.parse import parse_and_write_files, write_parse_progress
+from clinvar_ingest.progress import ParseProgress, ProgressTracker
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """
+    Replaces time.monotonic in clinvar_ingest.progress with a clock which only
+    moves when advanced.
+    """
+    clock = {"now": 0.0}
+    monkeypatch.setattr(progress_module.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+def test_progress_tracker_rates_and_eta(fake_clock):
+    reported = []
+    tracker = ProgressTracker(1000, callback=reported.append, interval=10, smoothing=0.5)
+
+    fake_clock["now"] = 5.0
+    # Not reported before the interval has passed
+    assert tracker.update(100, 1) is None
+
+    fake_clock["now"] = 10.0
+    progress = tracker.update(200, 2)
+    assert progress.bytes_per_second == 20.0
+    assert progress.records_per_second == 0.2
+    assert progress.percent == 20.0
+    assert progress.eta_seconds == 40.0
+
+    # The smoothed rate is halfway between the previous rate and the rate over the last interval
+    fake_clock["now"] = 20.0
+    progress = tracker.update(600, 4)
+    assert progress.bytes_per_second == 30.0
+    assert progress.eta_seconds == pytest.approx(400 / 30)
+
+    fake_clock["now"] = 25.0
+    progress = tracker.finish(1000, 5)
+    assert progress.done
+    assert progress.bytes_per_second == 40.0
+    assert progress.percent == 100.0
+    assert progress.eta_seconds == 0.0
+
+    assert [p.input_bytes for p in reported] == [200, 600, 1000]
+
+
+def test_progress_unknown_size():
+    progress = ParseProgress(
+        input_bytes=10, input_size=None, records=1, elapsed_seconds=1.0, bytes_per_second=10.0, records_per_second=1.0
+    )
+    assert progress.percent is None
+    assert progress.eta_seconds is None
+    assert "ETA: unknown" in str(progress)
+
+
+def test_progress_callback_errors_are_logged(fake_clock, caplog):
+    def callback(_progress):
+        raise RuntimeError("callback failed")
+
+    tracker = ProgressTracker(100, callback=callback)
+    fake_clock["now"] = 1.0
+    assert tracker.finish(100, 1).done
+    assert "Exception in parse progress callback" in caplog.text
+
+
+@pytest.mark.parametrize(("workers", "ordered"), [(1, False), (2, False), (2, True)])
+def test_parse_and_write_files_progress(tmp_path, workers, ordered):
+    input_filename = "test/data/combined.xml.gz"
+    reported = []
+    parse_and_write_files(
+        input_filename,
+        str(tmp_path),
+        file_format="vcv",
+        workers=workers,
+        ordered=ordered,
+        progress_callback=reported.append,
+    )
+
+    # Progress is measured in compressed bytes, so ends at the size of the file
+    final = reported[-1]
+    assert final.done
+    assert final.input_size == os.path.getsize(input_filename)
+    assert final.input_bytes == final.input_size
+    assert final.percent == 100.0
+    assert final.records == 15
+    assert final.entity_rows["variation_archive"] == 15
+    if workers > 1:
+        assert "tasks" in final.queue_depths
+
+    progress_path = write_parse_progress(final, str(tmp_path))
+    with open(progress_path) as f:
+        assert json.load(f) == final.as_dict()
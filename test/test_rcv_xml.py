@@ -1,5 +1,16 @@
+import gzip
+import io
+
+from clinvar_ingest.model.common import dictify
 from clinvar_ingest.model.rcv import RcvMapping
-from clinvar_ingest.reader import _parse_xml_document
+from clinvar_ingest.reader import (
+    _parse_xml_document,
+    _read_clinvar_xml,
+    frame_clinvar_xml_records,
+    read_clinvar_rcv_xml,
+    read_clinvar_rcv_xml_record,
+)
+from clinvar_ingest.stats import ParseStats
 
 
 def test_parse_10():
@@ -32,3 +43,39 @@ def test_parse_12():
     assert rcv_map.rcv_accession == "RCV000000012"
     assert rcv_map.scv_accessions == ["SCV000020155", "SCV001451119"]
     assert rcv_map.trait_set_id == "2"
+
+
+def test_read_clinvar_rcv_xml_matches_full_conversion():
+    """
+    The targeted RCV reader only converts the TraitSet, but must produce the same
+    RcvMapping objects as converting the whole ClinVarSet.
+    """
+    filenames = [
+        "test/data/rcv/RCV000000010.xml",
+        "test/data/rcv/RCV000000012.xml",
+        "test/data/rcv/combined.xml.gz",
+    ]
+    for filename in filenames:
+        open_fn = gzip.open if filename.endswith(".gz") else open
+        with open_fn(filename, "rb") as f:
+            expected = [dictify(o) for o in _read_clinvar_xml(f, "ClinVarSet")]
+        with open_fn(filename, "rb") as f:
+            actual = [dictify(o) for o in read_clinvar_rcv_xml(f)]
+        assert len(actual) > 0
+        assert expected == actual, filename
+
+
+def test_read_clinvar_rcv_xml_record():
+    """
+    Framed ClinVarSet records, as read by parse workers, give the same objects
+    as the targeted reader of the whole file.
+    """
+    with gzip.open("test/data/rcv/combined.xml.gz", "rb") as f:
+        doc = f.read()
+    expected = [dictify(o) for o in read_clinvar_rcv_xml(io.BytesIO(doc))]
+    stats = ParseStats()
+    records = frame_clinvar_xml_records(io.BytesIO(doc), "ClinVarSet")
+    actual = [dictify(o) for r in records for o in read_clinvar_rcv_xml_record(r, stats=stats)]
+    assert len(actual) > 0
+    assert expected == actual
+    assert {"xml", "model"} <= set(stats.summary()["stages"])
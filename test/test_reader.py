@@ -1,4 +1,27 @@
-from clinvar_ingest.reader import _parse_xml_document
+import gzip
+import io
+import json
+import pathlib
+
+import pytest
+import xmltodict
+
+from clinvar_ingest.fs import mmap_open
+from clinvar_ingest.model.common import dictify
+from clinvar_ingest.reader import (
+    _handle_text_nodes,
+    _parse_xml_document,
+    _read_clinvar_xml,
+    frame_clinvar_xml_record_spans,
+    frame_clinvar_xml_records,
+    read_clinvar_xml_record,
+)
+
+test_data_files = sorted(
+    str(p)
+    for p in pathlib.Path("test/data").rglob("*")
+    if p.name.endswith((".xml", ".xml.gz"))
+)
 
 
 def test_handle_text_nodes():
@@ -11,3 +34,94 @@ def test_handle_text_nodes():
     out = _parse_xml_document(inp)
     expected = {"foo": {"@bar": "baz", "$": "qux"}}
     assert expected == out
+
+
+def _xmltodict_parse(doc: str | bytes):
+    return xmltodict.parse(doc, postprocessor=_handle_text_nodes)
+
+
+@pytest.mark.parametrize(
+    "doc",
+    [
+        "<a/>",
+        "<a>  </a>",
+        "<a><b/><b>x</b><b y='1'/></a>",
+        "<a>one <b>two</b> three<c/> four</a>",
+        "<a x='1'><b>1</b><c>2</c><b>3</b>text</a>",
+        "<a>&lt;b&gt; &amp; &#233;</a>",
+        "<a><![CDATA[<raw>]]></a>",
+        "<?xml version='1.0'?><!DOCTYPE a [<!ENTITY e 'expanded'>]><a>&e;</a>",
+        "<a xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance' xsi:type='t'/>",
+    ],
+)
+def test_parse_xml_document_edge_cases(doc):
+    assert json.dumps(_parse_xml_document(doc)) == json.dumps(_xmltodict_parse(doc))
+
+
+@pytest.mark.parametrize("filename", test_data_files)
+def test_parse_xml_document_matches_xmltodict(filename):
+    """
+    _parse_xml_document must produce exactly what xmltodict did, including key
+    order, since content fields are serialized to JSON as-is.
+    """
+    open_fn = gzip.open if filename.endswith(".gz") else open
+    with open_fn(filename, "rb") as f:
+        doc = f.read()
+    assert json.dumps(_parse_xml_document(doc)) == json.dumps(_xmltodict_parse(doc))
+    doc_str = doc.decode("utf-8")
+    assert json.dumps(_parse_xml_document(doc_str)) == json.dumps(
+        _xmltodict_parse(doc_str)
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [3, 4096, 8 * 1024 * 1024])
+def test_frame_clinvar_xml_records(chunk_size):
+    """
+    Framed records converted one at a time must give the same objects as reading
+    the file with iterparse, wherever the chunk boundaries fall.
+    """
+    for filename, tag in [
+        ("test/data/combined.xml.gz", "VariationArchive"),
+        ("test/data/rcv/combined.xml.gz", "ClinVarSet"),
+    ]:
+        with gzip.open(filename, "rb") as f:
+            doc = f.read()
+        expected = [dictify(o) for o in _read_clinvar_xml(io.BytesIO(doc), tag)]
+        records = list(
+            frame_clinvar_xml_records(io.BytesIO(doc), tag, chunk_size=chunk_size)
+        )
+        actual = [dictify(o) for r in records for o in read_clinvar_xml_record(r)]
+        assert json.dumps(actual) == json.dumps(expected)
+
+
+def test_frame_clinvar_xml_records_similar_tags():
+    doc = (
+        b"<Root><VariationArchiveX/><VariationArchive A='1>'><B/></VariationArchive>"
+        b"<VariationArchives/><VariationArchive\nA='2'></VariationArchive></Root>"
+    )
+    records = list(frame_clinvar_xml_records(io.BytesIO(doc), "VariationArchive", 5))
+    assert records == [
+        b"<VariationArchive A='1>'><B/></VariationArchive>",
+        b"<VariationArchive\nA='2'></VariationArchive>",
+    ]
+
+
+def test_frame_clinvar_xml_record_spans(tmp_path):
+    """
+    Spans found in a memory-mapped file are the same records as the streaming framer finds.
+    """
+    path = tmp_path / "combined.xml"
+    with gzip.open("test/data/combined.xml.gz") as f:
+        path.write_bytes(f.read())
+    doc = path.read_bytes()
+    expected = list(frame_clinvar_xml_records(io.BytesIO(doc), "VariationArchive"))
+
+    with mmap_open(str(path)) as mm:
+        spans = list(frame_clinvar_xml_record_spans(mm, "VariationArchive"))
+        assert [mm[offset : offset + length] for offset, length in spans] == expected
+
+    doc = b"<Root><VariationArchiveX/><VariationArchive A='1'></VariationArchive><VariationArchive>"
+    spans = frame_clinvar_xml_record_spans(doc, "VariationArchive")
+    assert next(spans) == (26, 43)
+    with pytest.raises(ValueError, match="Unterminated VariationArchive"):
+        next(spans)
@@ -0,0 +1,152 @@
+"""
+Memory tests for the XML readers.
+
+Streams a synthetic release through the readers and checks that processed records
+are released, and that resident memory stays flat as records are processed.
+The default input size keeps the RSS test short, and at that size allocator noise
+is larger than what a leak of cleared elements would add. Set
+CLINVAR_INGEST_MEMORY_TEST_BYTES to run it over a multi-GB input, e.g.
+
+    CLINVAR_INGEST_MEMORY_TEST_BYTES=$((4 * 1024**3)) pytest test/test_reader_memory.py
+"""
+
+import io
+import os
+import pathlib
+import xml.etree.ElementTree as ET
+from unittest.mock import patch
+
+import pytest
+
+from clinvar_ingest.reader import _read_clinvar_xml, read_clinvar_rcv_xml
+
+DEFAULT_TEST_BYTES = 4 * 1024 * 1024
+# Allowed RSS growth between the baseline sample and the end of the input
+RSS_GROWTH_SLACK_BYTES = 4 * 1024 * 1024
+BASELINE_RECORD_COUNT = 2000
+
+reader_fns = pytest.mark.parametrize(
+    "reader_fn",
+    [
+        read_clinvar_rcv_xml,
+        lambda f: _read_clinvar_xml(f, "ClinVarSet"),
+    ],
+    ids=["rcv", "generic"],
+)
+
+_statm = pathlib.Path("/proc/self/statm")
+
+
+def _current_rss_bytes() -> int:
+    resident_pages = int(_statm.read_text().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class SyntheticRcvRelease(io.RawIOBase):
+    """
+    Readable binary stream of a ReleaseSet containing minimal ClinVarSet records,
+    generated on the fly until at least `total_bytes` of records have been produced.
+    """
+
+    header = b'<?xml version="1.0" encoding="UTF-8"?>\n<ReleaseSet Dated="2024-01-01">\n'
+    footer = b"</ReleaseSet>\n"
+    records_per_batch = 1000
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.bytes_generated = 0
+        self.record_count = 0
+        self.buf = memoryview(self.header)
+        self.done = False
+
+    def readable(self):
+        return True
+
+    @staticmethod
+    def _record(i: int) -> str:
+        return (
+            f'<ClinVarSet ID="{i}">'
+            f'<ReferenceClinVarAssertion ID="{i}">'
+            f'<ClinVarAccession Acc="RCV{i:09d}" Type="RCV"/>'
+            f'<TraitSet ID="{i}" Type="Disease"><Trait ID="{i}" Type="Disease">'
+            f'<Name><ElementValue Type="Preferred">Disease {i}</ElementValue></Name>'
+            "</Trait></TraitSet>"
+            "</ReferenceClinVarAssertion>"
+            f'<ClinVarAssertion ID="{i}">'
+            f'<ClinVarAccession Acc="SCV{i:09d}" Type="SCV"/>'
+            "</ClinVarAssertion>"
+            "</ClinVarSet>\n"
+        )
+
+    def _next_batch(self) -> bytes:
+        if self.bytes_generated >= self.total_bytes:
+            self.done = True
+            return self.footer
+        start = self.record_count
+        records = [self._record(i) for i in range(start, start + self.records_per_batch)]
+        self.record_count += self.records_per_batch
+        batch = "".join(records).encode("utf-8")
+        self.bytes_generated += len(batch)
+        return batch
+
+    def readinto(self, b):
+        if len(self.buf) == 0:
+            if self.done:
+                return 0
+            self.buf = memoryview(self._next_batch())
+        n = min(len(b), len(self.buf))
+        b[:n] = self.buf[:n]
+        self.buf = self.buf[n:]
+        return n
+
+
+@reader_fns
+def test_reader_detaches_processed_records(reader_fn):
+    """
+    The root element should never hold on to records that have been processed.
+    """
+    roots = []
+    iterparse = ET.iterparse
+
+    def recording_iterparse(*args, **kwargs):
+        for event, elem in iterparse(*args, **kwargs):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    stream = SyntheticRcvRelease(1024 * 1024)
+    count = 0
+    with patch("clinvar_ingest.reader.ET.iterparse", recording_iterparse):
+        for _ in reader_fn(io.BufferedReader(stream)):
+            count += 1
+            # iterparse reads ahead, so records not yet processed may be attached,
+            # but never more than fit in one read from the stream.
+            assert len(roots[0]) <= 100
+    assert count == stream.record_count
+    assert count > 1000
+    assert len(roots[0]) == 0
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not _statm.exists(), reason="requires /proc/self/statm")
+@reader_fns
+def test_reader_rss_stays_flat(reader_fn):
+    total_bytes = int(
+        os.environ.get("CLINVAR_INGEST_MEMORY_TEST_BYTES", DEFAULT_TEST_BYTES)
+    )
+    stream = SyntheticRcvRelease(total_bytes)
+
+    baseline_rss = None
+    count = 0
+    for _ in reader_fn(io.BufferedReader(stream, buffer_size=64 * 1024)):
+        count += 1
+        if count == BASELINE_RECORD_COUNT:
+            baseline_rss = _current_rss_bytes()
+    final_rss = _current_rss_bytes()
+
+    assert count == stream.record_count
+    assert count > BASELINE_RECORD_COUNT
+    growth = final_rss - baseline_rss
+    assert growth < RSS_GROWTH_SLACK_BYTES, (
+        f"RSS grew by {growth} bytes over {count - BASELINE_RECORD_COUNT} records"
+    )
@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import pytest
+
+from clinvar_ingest import stats as stats_module
+from clinvar_ingest.parse import parse_and_write_files, write_parse_stats
+from clinvar_ingest.stats import ParseStats
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """
+    Replaces time.perf_counter in clinvar_ingest.stats with a clock which only
+    moves when advanced.
+    """
+    clock = {"now": 0.0}
+    monkeypatch.setattr(stats_module.time, "perf_counter", lambda: clock["now"])
+    return clock
+
+
+def test_nested_stages_are_exclusive(fake_clock):
+    stats = ParseStats()
+
+    def read():
+        fake_clock["now"] += 1.0
+        return b"x"
+
+    def produce():
+        for _ in range(3):
+            stats.timed_call("read", read)
+            fake_clock["now"] += 2.0
+            yield "obj"
+
+    for _ in stats.timed_iter("xml", produce()):
+        # Time spent by the consumer is not counted
+        fake_clock["now"] += 10.0
+        stats.timed_call("encode", lambda: fake_clock.update(now=fake_clock["now"] + 0.5))
+
+    assert stats.seconds == {"read": 3.0, "xml": 6.0, "encode": 1.5}
+    assert stats.progress_line() == "read=3.0s xml=6.0s encode=1.5s"
+
+
+def test_merge():
+    stats = ParseStats()
+    stats.seconds = {"read": 1.0}
+    stats.count_row("gene", 10)
+    stats.merge(
+        {
+            "stages": {"read": 0.5, "encode": 2.0},
+            "entity_types": {"gene": {"rows": 2, "bytes": 30}, "trait": {"rows": 1, "bytes": 5}},
+        }
+    )
+    summary = stats.summary()
+    assert summary["stages"] == {"read": 1.5, "encode": 2.0}
+    assert summary["entity_types"] == {"gene": {"rows": 3, "bytes": 40}, "trait": {"rows": 1, "bytes": 5}}
+
+
+@pytest.mark.parametrize(("workers", "ordered"), [(1, False), (2, False), (2, True)])
+def test_parse_and_write_files_stats(tmp_path, workers, ordered):
+    filename = "test/data/combined.xml.gz"
+    output_files, summary = parse_and_write_files(
+        filename, str(tmp_path), workers=workers, ordered=ordered, return_stats=True
+    )
+
+    assert summary["records"] == 15
+    with gzip.open(filename) as f:
+        assert summary["bytes_read"] == len(f.read())
+    expected_stages = {"read", "xml", "model", "encode", "write"}
+    if workers > 1:
+        expected_stages |= {"frame", "wait"}
+    assert set(summary["stages"]) == expected_stages
+    assert all(seconds >= 0 for seconds in summary["stages"].values())
+
+    assert summary["entity_types"].keys() == output_files.keys()
+    assert summary["entity_types"]["variation_archive"]["rows"] == 15
+    if workers == 1 or ordered:
+        for entity_type, path in output_files.items():
+            with gzip.open(path) as f:
+                content = f.read()
+            assert summary["entity_types"][entity_type]["rows"] == content.count(b"\n")
+            assert summary["entity_types"][entity_type]["bytes"] == len(content)
+
+    stats_path = write_parse_stats(summary, str(tmp_path))
+    with open(stats_path, encoding="utf-8") as f:
+        assert json.load(f) == summary
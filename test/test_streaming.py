@@ -0,0 +1,322 @@
+import base64
+import functools
+import glob
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import google_crc32c
+import pytest
+import requests
+from google.api_core.exceptions import NotFound
+
+from clinvar_ingest.cloud import streaming
+from clinvar_ingest.fs import ChunkPipe
+from clinvar_ingest.parse import parse_and_write_files
+
+CHUNK_SIZE = streaming.UPLOAD_CHUNK_ALIGNMENT
+
+
+class ResumableUploadHandler(BaseHTTPRequestHandler):
+    """
+    A GCS resumable upload session, which appends the bytes of each PUT to
+    `server.received`. The PUTs numbered in `server.fail_puts` fail with a 503,
+    and bytes at the offsets in `server.corrupt` are flipped as they are received.
+    """
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_PUT(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.puts += 1
+        content_range = re.fullmatch(r"bytes (\*|(\d+)-(\d+))/(\d+)", self.headers["Content-Range"])
+        total = int(content_range.group(4))
+        if server.puts in server.fail_puts:
+            self._respond(503)
+            return
+        if content_range.group(1) != "*":
+            server.put_ranges.append((int(content_range.group(2)), int(content_range.group(3))))
+            if int(content_range.group(2)) == len(server.received):
+                server.received += body
+                for offset in server.corrupt:
+                    if len(server.received) - len(body) <= offset < len(server.received):
+                        server.received[offset] ^= 0xFF
+        if len(server.received) == total:
+            self._respond(200)
+        else:
+            headers = {"Range": f"bytes=0-{len(server.received) - 1}"} if server.received else {}
+            self._respond(308, headers)
+
+    def _respond(self, status, headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class FakeBlob:
+    """
+    The uploaded blob, with the checksums GCS would compute of the bytes received.
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def reload(self):
+        if self.server.deleted:
+            raise NotFound("deleted")
+        received = bytes(self.server.received)
+        self.size = len(received)
+        self.md5_hash = base64.b64encode(hashlib.md5(received).digest()).decode()  # noqa: S324
+        self.crc32c = base64.b64encode(google_crc32c.value(received).to_bytes(4, "big")).decode()
+
+    def delete(self):
+        self.server.deleted = True
+
+
+def _hex_digests(content: bytes) -> tuple[str, str]:
+    return f"{google_crc32c.value(content):08x}", hashlib.md5(content).hexdigest()  # noqa: S324
+
+
+@pytest.fixture
+def upload_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ResumableUploadHandler)
+    server.received = bytearray()
+    server.puts = 0
+    server.fail_puts = set()
+    server.put_ranges = []
+    server.corrupt = set()
+    server.deleted = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.sessions = []
+
+    def create_upload_session(destination_uri, size, client):
+        server.sessions.append(destination_uri)
+        return f"http://127.0.0.1:{server.server_port}/upload/{len(server.sessions)}"
+
+    monkeypatch.setattr(streaming, "_create_upload_session", create_upload_session)
+    monkeypatch.setattr(streaming, "parse_blob_uri", lambda *_args, **_kwargs: FakeBlob(server))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    return SimpleNamespace(_http=requests.Session())
+
+
+def test_stream_copy(http_server, upload_server, client):
+    http_server.content = os.urandom(2 * CHUNK_SIZE + 1000)
+    http_server.drop_ranges = {CHUNK_SIZE}
+    upload_server.fail_puts = {2}
+    chunks = []
+
+    result = streaming.stream_copy(
+        http_server.uri,
+        "gs://bucket/release.xml.gz",
+        len(http_server.content),
+        client=client,
+        chunk_size=CHUNK_SIZE,
+        buffers=2,
+        retry_delay=0,
+        on_chunk=lambda _offset, chunk: chunks.append(bytes(chunk)),
+    )
+
+    assert upload_server.received == http_server.content
+    assert b"".join(chunks) == http_server.content
+    assert result.resumed_from == 0
+    assert (result.crc32c, result.md5) == _hex_digests(http_server.content)
+    assert upload_server.sessions == ["gs://bucket/release.xml.gz"]
+    # The failed chunk is sent again after querying the session's offset
+    assert upload_server.put_ranges == [
+        (0, CHUNK_SIZE - 1),
+        (CHUNK_SIZE, 2 * CHUNK_SIZE - 1),
+        (2 * CHUNK_SIZE, 2 * CHUNK_SIZE + 999),
+    ]
+    assert upload_server.puts == 5
+    # The chunks are read with a Range request each, and the dropped one is
+    # resumed from the last byte received
+    assert sorted(r for command, r, _ in http_server.requests if command == "GET") == sorted(
+        [
+            f"bytes=0-{CHUNK_SIZE - 1}",
+            f"bytes={CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}",
+            f"bytes={CHUNK_SIZE + CHUNK_SIZE // 2}-{2 * CHUNK_SIZE - 1}",
+            f"bytes={2 * CHUNK_SIZE}-{2 * CHUNK_SIZE + 999}",
+        ]
+    )
+
+
+def test_stream_copy_without_ranges(http_server, upload_server, client):
+    http_server.content = os.urandom(2 * CHUNK_SIZE + 1000)
+    http_server.accept_ranges = False
+
+    result = streaming.stream_copy(
+        http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content), client=client, chunk_size=CHUNK_SIZE
+    )
+    assert upload_server.received == http_server.content
+    assert (result.crc32c, result.md5) == _hex_digests(http_server.content)
+    # The source is read over one connection
+    assert http_server.requests == [("HEAD", None, None), ("GET", None, None)]
+
+
+def test_stream_copy_resume(http_server, upload_server, client, tmp_path):
+    http_server.content = os.urandom(2 * CHUNK_SIZE + 1000)
+    http_server.drop_ranges = {CHUNK_SIZE}
+    checkpoint_path = str(tmp_path / "copy.json")
+    copy_args = (http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content))
+
+    with pytest.raises(streaming.SOURCE_READ_ERRORS):
+        streaming.stream_copy(
+            *copy_args, checkpoint_uri=checkpoint_path, client=client, chunk_size=CHUNK_SIZE, max_attempts=1
+        )
+    checkpoint = streaming._read_checkpoint(checkpoint_path)
+    assert checkpoint.offset == CHUNK_SIZE
+    assert checkpoint.source_validator == '"v1"'
+
+    http_server.requests.clear()
+    result = streaming.stream_copy(*copy_args, checkpoint_uri=checkpoint_path, client=client, chunk_size=CHUNK_SIZE)
+    assert result.resumed_from == CHUNK_SIZE
+    assert upload_server.received == http_server.content
+    # The same upload session is continued, reading the source from the checkpoint
+    assert len(upload_server.sessions) == 1
+    assert ("GET", f"bytes={CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}", '"v1"') in http_server.requests
+    assert not os.path.exists(checkpoint_path)
+    # The CRC32C is continued from the checkpoint, and the MD5 taken from GCS
+    assert (result.crc32c, result.md5) == _hex_digests(http_server.content)
+
+
+def test_stream_copy_resume_behind_session(http_server, upload_server, client, tmp_path):
+    http_server.content = os.urandom(2 * CHUNK_SIZE + 1000)
+    checkpoint_path = str(tmp_path / "copy.json")
+    copy_args = (http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content))
+    # GCS persisted a chunk after the checkpoint was written
+    upload_server.received += http_server.content[:CHUNK_SIZE]
+    streaming._write_checkpoint(
+        checkpoint_path,
+        streaming.CopyCheckpoint(
+            *copy_args, session_url=f"http://127.0.0.1:{upload_server.server_port}/upload/0", source_validator='"v1"'
+        ),
+    )
+
+    result = streaming.stream_copy(*copy_args, checkpoint_uri=checkpoint_path, client=client, chunk_size=CHUNK_SIZE)
+    # The source is read from the checkpoint for its checksums, but the
+    # persisted chunk is not uploaded again
+    assert ("GET", f"bytes=0-{CHUNK_SIZE - 1}", '"v1"') in http_server.requests
+    assert upload_server.put_ranges == [(CHUNK_SIZE, 2 * CHUNK_SIZE - 1), (2 * CHUNK_SIZE, 2 * CHUNK_SIZE + 999)]
+    assert upload_server.received == http_server.content
+    assert (result.crc32c, result.md5) == _hex_digests(http_server.content)
+
+
+def test_stream_copy_checksum_mismatch(http_server, upload_server, client):
+    http_server.content = os.urandom(CHUNK_SIZE + 1000)
+    copy_args = (http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content))
+    # The bytes GCS received differ from those read from the source
+    upload_server.corrupt = {CHUNK_SIZE + 10}
+    with pytest.raises(RuntimeError, match="Checksum mismatch.*CRC32C of source"):
+        streaming.stream_copy(*copy_args, client=client, chunk_size=CHUNK_SIZE)
+    assert upload_server.deleted
+
+    # The source differs from its published MD5
+    upload_server.received.clear()
+    upload_server.corrupt = set()
+    upload_server.deleted = False
+    with pytest.raises(RuntimeError, match=f"MD5 expected {'0' * 32}"):
+        streaming.stream_copy(*copy_args, client=client, chunk_size=CHUNK_SIZE, expected_md5="0" * 32)
+    assert upload_server.deleted
+
+
+def test_stream_copy_source_changed(http_server, upload_server, client, tmp_path):
+    http_server.content = os.urandom(CHUNK_SIZE + 1000)
+    checkpoint_path = str(tmp_path / "copy.json")
+    copy_args = (http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content))
+    streaming._write_checkpoint(
+        checkpoint_path,
+        streaming.CopyCheckpoint(*copy_args, session_url="http://127.0.0.1:1/old", source_validator='"v0"'),
+    )
+
+    # A checkpoint of an older version of the source is not resumed
+    result = streaming.stream_copy(*copy_args, checkpoint_uri=checkpoint_path, client=client, chunk_size=CHUNK_SIZE)
+    assert result.resumed_from == 0
+    assert upload_server.received == http_server.content
+    assert len(upload_server.sessions) == 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_copy_and_parse(http_server, upload_server, client, tmp_path, workers):
+    input_filename = "test/data/combined.xml.gz"
+    with open(input_filename, "rb") as f:
+        http_server.content = f.read()
+    parse_fn = functools.partial(
+        parse_and_write_files, output_directory=str(tmp_path / "tee"), gzip_output=False, workers=workers
+    )
+
+    result, output_files = streaming.stream_copy_and_parse(
+        http_server.uri,
+        "gs://bucket/combined.xml.gz",
+        len(http_server.content),
+        parse_fn,
+        client=client,
+        chunk_size=CHUNK_SIZE,
+    )
+    assert result.resumed_from == 0
+    assert upload_server.received == http_server.content
+    # The file was read once, by the copy
+    assert [command for command, _, _ in http_server.requests] == ["HEAD", "GET"]
+
+    expected_files = parse_and_write_files(
+        input_filename, str(tmp_path / "local"), gzip_output=False, workers=workers
+    )
+    assert output_files.keys() == expected_files.keys()
+    for entity_type, path in output_files.items():
+        assert sorted(_read_lines(path)) == sorted(_read_lines(expected_files[entity_type]))
+
+
+def _read_lines(path_pattern: str) -> list[bytes]:
+    lines = []
+    for path in glob.glob(path_pattern):
+        with open(path, "rb") as f:
+            lines += f.readlines()
+    return lines
+
+
+def test_stream_copy_and_parse_fallback(http_server, upload_server, client):
+    http_server.content = os.urandom(CHUNK_SIZE + 1000)
+    parse_inputs = []
+
+    def parse_fn(input_filename):
+        parse_inputs.append(input_filename)
+        if isinstance(input_filename, ChunkPipe):
+            input_filename.read(100)
+            raise ValueError("not XML")
+        return "parsed"
+
+    _, parsed = streaming.stream_copy_and_parse(
+        http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content), parse_fn, client=client
+    )
+    # The copy completes when the parse fails, and the parse is retried from the copied file
+    assert upload_server.received == http_server.content
+    assert parsed == "parsed"
+    assert parse_inputs[1:] == ["gs://bucket/release.xml.gz"]
+
+
+def test_existing_copy_checksums(http_server, upload_server, client):
+    http_server.content = os.urandom(CHUNK_SIZE + 1000)
+    copy_args = (http_server.uri, "gs://bucket/release.xml.gz", len(http_server.content))
+    streaming.stream_copy(*copy_args, client=client, chunk_size=CHUNK_SIZE)
+    crc32c, md5 = _hex_digests(http_server.content)
+
+    assert streaming.existing_copy_checksums(*copy_args, expected_md5=md5) == (crc32c, md5)
+    assert streaming.existing_copy_checksums(*copy_args) == (crc32c, md5)
+    # A copy of the same size with a different MD5 is copied again
+    assert streaming.existing_copy_checksums(*copy_args, expected_md5="0" * 32) is None
+    assert streaming.existing_copy_checksums(http_server.uri, copy_args[1], copy_args[2] + 1) is None
+    upload_server.deleted = True
+    assert streaming.existing_copy_checksums(*copy_args) is None
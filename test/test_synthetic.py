@@ -0,0 +1,101 @@
+import gzip
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from clinvar_ingest import synthetic
+from clinvar_ingest.model.trait import TraitMapping
+from clinvar_ingest.model.variation_archive import ClinicalAssertion, Variation, VariationArchive
+from clinvar_ingest.reader import read_clinvar_rcv_xml, read_clinvar_vcv_xml
+from clinvar_ingest.utils import ClinVarIngestFileFormat
+
+
+def test_parse_size():
+    assert synthetic.parse_size("1000") == 1000
+    assert synthetic.parse_size("2K") == 2048
+    assert synthetic.parse_size("1.5m") == 1572864
+    assert synthetic.parse_size("10GB") == 10 * 1024**3
+
+
+def test_write_synthetic_release_vcv(tmp_path, monkeypatch):
+    monkeypatch.setattr(synthetic, "GIANT_SCV_COUNT_RANGE", (60, 80))
+    path = str(tmp_path / "synthetic.xml.gz")
+    written = synthetic.write_synthetic_release(path, 2 * 1024 * 1024, seed=1, giant_every=10)
+    assert written["xml_bytes"] >= 2 * 1024 * 1024
+
+    with gzip.open(path) as f:
+        objects = list(read_clinvar_vcv_xml(f))
+    variation_archives = [o for o in objects if isinstance(o, VariationArchive)]
+    assert len(variation_archives) == written["records"]
+    assert len({va.id for va in variation_archives}) == written["records"]
+
+    scvs = [o for o in objects if isinstance(o, ClinicalAssertion)]
+    assert len({scv.id for scv in scvs}) == len(scvs)
+    # Every trait mapping refers to an SCV of the same record
+    scv_ids = {scv.id for scv in scvs}
+    assert all(tm.clinical_assertion_id in scv_ids for tm in objects if isinstance(tm, TraitMapping))
+
+    scv_counts = {va.id: va.num_submissions for va in variation_archives}
+    assert max(scv_counts.values()) >= 60
+    assert sum(1 for c in scv_counts.values() if c == 1) > len(scv_counts) / 3
+
+
+def nesting_shape(variation: ET.Element) -> tuple:
+    return (variation.tag, tuple(nesting_shape(c) for c in variation if c.tag in synthetic.MEMBER_TAGS))
+
+
+def test_variation_nesting():
+    templates = [
+        t
+        for t in synthetic.load_templates(synthetic.DEFAULT_TEMPLATES_DIR, ClinVarIngestFileFormat.VCV)
+        if synthetic.variation_type(t) != "SimpleAllele"
+    ]
+    template_shapes = {nesting_shape(synthetic._variation(synthetic._interp_record(t))) for t in templates}
+    shapes = set()
+    scv_shapes = set()
+    for seed in range(10):
+        generator = synthetic.SyntheticReleaseGenerator(templates, ClinVarIngestFileFormat.VCV, seed=seed)
+        records = [generator.variation_archive(i) for i in range(len(templates))]
+        for va in records:
+            record = synthetic._interp_record(va)
+            shapes.add(nesting_shape(synthetic._variation(record)))
+            scv_shapes.update(nesting_shape(synthetic._variation(scv)) for scv in record.iter("ClinicalAssertion"))
+
+        # Copied members get their own IDs, and the records still parse
+        xml = b"".join(ET.tostring(va) for va in records)
+        objects = list(read_clinvar_vcv_xml(io.BytesIO(b"<ClinVarVariationRelease>" + xml + b"</ClinVarVariationRelease>")))
+        descendant_ids = [i for o in objects if isinstance(o, Variation) for i in o.descendant_ids]
+        variations = [synthetic._variation(synthetic._interp_record(va)) for va in records]
+        member_ids = [m.get("VariationID") for v in variations for m in v.iter() if m is not v and m.get("VariationID")]
+        assert sorted(descendant_ids) == sorted(member_ids)
+        allele_ids = [e.get("VariationID") for va in records for e in va.iter("SimpleAllele") if e.get("VariationID")]
+        assert len(allele_ids) == len(set(allele_ids))
+
+    # Seeds vary both the number of members and the depth of their nesting
+    assert len(shapes - template_shapes) > 1
+    assert len(scv_shapes) > len(templates)
+    depths = {str(shape).count("Haplotype") for shape in shapes if shape[0] == "Genotype"}
+    assert len(depths) > 1
+
+
+@pytest.mark.parametrize("file_format", [ClinVarIngestFileFormat.VCV, ClinVarIngestFileFormat.RCV])
+def test_write_synthetic_release_deterministic(tmp_path, file_format):
+    def generate(name, seed):
+        path = tmp_path / name
+        synthetic.write_synthetic_release(str(path), 512 * 1024, file_format=file_format, seed=seed)
+        return path.read_bytes()
+
+    first = generate("a.xml", 1)
+    assert generate("b.xml", 1) == first
+    assert generate("c.xml", 2) != first
+
+
+def test_write_synthetic_release_rcv(tmp_path):
+    path = tmp_path / "synthetic.xml"
+    written = synthetic.write_synthetic_release(str(path), 256 * 1024, file_format=ClinVarIngestFileFormat.RCV)
+    with open(path, "rb") as f:
+        rcv_mappings = list(read_clinvar_rcv_xml(f))
+    assert len(rcv_mappings) == written["records"]
+    assert len({m.rcv_accession for m in rcv_mappings}) == written["records"]
+    assert all(m.scv_accessions for m in rcv_mappings)
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from clinvar_ingest.cloud import gcs
+
+
+class FakeBlob:
+    def __init__(self, uri):
+        self.uri = uri
+        self.chunk_size = None
+        self.uploaded = None
+
+    def upload_from_filename(self, client, filename, checksum=None):
+        self.uploaded = (client, filename, checksum)
+
+
+def test_upload_files_retries_and_reports(monkeypatch, caplog):
+    attempts = {}
+    threads = set()
+    barrier = threading.Barrier(2)
+
+    def fake_upload_file(local, remote, client, **kwargs):
+        threads.add(threading.current_thread().name)
+        attempts[local] = attempts.get(local, 0) + 1
+        if local == "a" and attempts[local] == 1:
+            # Both files are uploading at once
+            barrier.wait(timeout=5)
+            raise api_exceptions.ServiceUnavailable("try again")
+        if local == "b":
+            barrier.wait(timeout=5)
+        return 100
+
+    monkeypatch.setattr(gcs, "_upload_file", fake_upload_file)
+    caplog.set_level("INFO", logger="clinvar_ingest")
+    results = gcs.upload_files(
+        [("a", "gs://bucket/a"), ("b", "gs://bucket/b")],
+        client=object(),
+        concurrency=2,
+        retry_delay=0,
+    )
+
+    assert sorted((r.local_file_uri, r.remote_blob_uri, r.size, r.attempts) for r in results) == [
+        ("a", "gs://bucket/a", 100, 2),
+        ("b", "gs://bucket/b", 100, 1),
+    ]
+    assert len(threads) == 2
+    assert "Attempt 1 of uploading a to gs://bucket/a failed" in caplog.text
+    assert "Uploaded 2 files, 200 bytes" in caplog.text
+
+
+def test_upload_files_gives_up(monkeypatch):
+    calls = []
+
+    def fake_upload_file(local, remote, client, **kwargs):
+        calls.append(local)
+        raise api_exceptions.ServiceUnavailable("down")
+
+    monkeypatch.setattr(gcs, "_upload_file", fake_upload_file)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        gcs.upload_files([("a", "gs://bucket/a")], client=object(), max_attempts=3, retry_delay=0)
+    assert calls == ["a", "a", "a"]
+
+
+@pytest.mark.parametrize(("size", "multipart"), [(10, False), (1000, True)])
+def test_upload_file_multipart_threshold(monkeypatch, tmp_path, size, multipart):
+    path = tmp_path / "rows.ndjson"
+    path.write_bytes(b"x" * size)
+    blob = FakeBlob("gs://bucket/rows.ndjson")
+    chunks_uploaded = []
+    monkeypatch.setattr(gcs, "parse_blob_uri", lambda *_args, **_kwargs: blob)
+    monkeypatch.setattr(
+        gcs.transfer_manager,
+        "upload_chunks_concurrently",
+        lambda filename, blob, **kwargs: chunks_uploaded.append((filename, blob, kwargs)),
+    )
+
+    client = object()
+    assert gcs._upload_file(
+        str(path), blob.uri, client, chunk_size=256 * 1024, multipart_threshold=100, multipart_workers=4
+    ) == size
+    if multipart:
+        assert chunks_uploaded == [
+            (str(path), blob, {"chunk_size": 256 * 1024, "max_workers": 4, "worker_type": gcs.transfer_manager.THREAD})
+        ]
+        assert blob.uploaded is None
+    else:
+        assert chunks_uploaded == []
+        assert blob.uploaded == (client, str(path), "crc32c")
+        assert blob.chunk_size == 256 * 1024
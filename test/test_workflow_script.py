@@ -0,0 +1,71 @@
+import runpy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from clinvar_ingest import parse, slack
+from clinvar_ingest.cloud import gcs, streaming
+from clinvar_ingest.cloud.bigquery import processing_history
+
+WORKFLOW_SCRIPT = Path(__file__).parent.parent / "misc" / "bin" / "workflow.py"
+
+
+@pytest.fixture
+def workflow(monkeypatch):
+    """
+    Patches the services the workflow script calls, and returns a function that
+    runs the script, along with the parsed files it is given.
+    """
+    for name, value in {
+        "Host": "https://ftp.ncbi.nlm.nih.gov",
+        "Directory": "/pub/clinvar/xml/clinvar_variation/weekly_release",
+        "Name": "ClinVarVariationRelease_2024-02.xml.gz",
+        "Size": "10",
+        "Released": "2024-02-01 15:47:16",
+        "Last Modified": "2024-02-01 15:47:16",
+        "Release Date": "2024-02-01",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    monkeypatch.setattr("google.cloud.bigquery.Client", MagicMock())
+    monkeypatch.setattr("google.cloud.storage.Client", MagicMock())
+    for fn in ("ensure_initialized", "ensure_history_view_exists", "write_started", "write_finished", "delete"):
+        monkeypatch.setattr(processing_history, fn, MagicMock())
+    monkeypatch.setattr(slack, "send_slack_message", MagicMock())
+    monkeypatch.setattr(gcs, "http_get_md5", MagicMock(return_value=None))
+    monkeypatch.setattr(parse, "get_release_date_and_iterate_type", MagicMock(return_value={"release_date": "2024-02-01"}))
+    monkeypatch.setattr(parse, "write_parse_stats", MagicMock())
+    parsed_files = {"gene": "gs://bucket/parsed/gene.ndjson.gz"}
+    monkeypatch.setattr(parse, "parse_and_write_files", MagicMock(return_value=(parsed_files, {})))
+
+    copy_result = streaming.StreamCopyResult("source", "destination", 10, 1.0, 0, crc32c="00000000")
+    monkeypatch.setattr(streaming, "existing_copy_checksums", MagicMock(return_value=None))
+    monkeypatch.setattr(streaming, "stream_copy", MagicMock(return_value=copy_result))
+
+    def stream_copy_and_parse(parse_fn, **kwargs):
+        streaming.stream_copy(**kwargs)
+        return copy_result, parse_fn(object())
+
+    monkeypatch.setattr(streaming, "stream_copy_and_parse", MagicMock(side_effect=stream_copy_and_parse))
+
+    def run(tee_parse: bool):
+        monkeypatch.setenv("CLINVAR_INGEST_TEE_PARSE", str(tee_parse).lower())
+        runpy.run_path(str(WORKFLOW_SCRIPT), run_name="workflow")
+
+    return SimpleNamespace(run=run, parsed_files=parsed_files)
+
+
+@pytest.mark.parametrize("tee_parse", [False, True])
+def test_workflow_copies_and_parses_once(workflow, tee_parse):
+    workflow.run(tee_parse)
+
+    assert streaming.stream_copy.call_count == 1
+    assert parse.parse_and_write_files.call_count == 1
+    assert streaming.stream_copy_and_parse.call_count == int(tee_parse)
+    assert processing_history.write_started.call_count == 1
+    processing_history.write_finished.assert_called_once()
+    parsed_files = processing_history.write_finished.call_args.kwargs["parsed_files"]
+    assert {name: path.root for name, path in parsed_files.items()} == workflow.parsed_files